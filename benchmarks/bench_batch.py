@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Time reading many synthetic NMRPipe .tab peak lists
+
+Write several 3D peak lists, then print the time taken to read them one
+after another and with read_many, and the size of one parsed peak list
+when pickled as objects and as packed arrays.
+
+Usage:
+python benchmarks/bench_batch.py [num_files [num_peaks [workers]]]
+"""
+from __future__ import division, absolute_import, print_function
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+import pickle
+import nmrpeaklists as npl
+from bench_read import write_tab
+
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    num_peaks = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    directory = tempfile.mkdtemp()
+    try:
+        paths = [os.path.join(directory, 'bench{:d}.tab'.format(i))
+                 for i in range(num_files)]
+        for path in paths:
+            write_tab(path, num_peaks)
+        print('Read time ({:d} files of {:d} 3D peaks)'.format(num_files,
+                                                              num_peaks))
+        for name, columnar in (('PipeFile', False),
+                               ('PipeFile(columnar=True)', True)):
+            serial = lambda: [npl.PipeFile(columnar=columnar).read_peaklist(
+                path, cache=False) for path in paths]
+            pool = lambda: npl.read_many(
+                paths, npl.PipeFile(columnar=columnar), workers)
+            for label, reader in (('serial', serial), ('read_many', pool)):
+                time = min(timeit.repeat(reader, number=1, repeat=3))
+                print('{:>25s} {:>10s} {:8.3f} s'.format(name, label, time))
+        peaklist = npl.PipeFile().read_peaklist(paths[0], cache=False)
+        objects = len(pickle.dumps(peaklist, protocol=2))
+        arrays = len(pickle.dumps(npl.pack_peaklist(peaklist), protocol=2))
+        print('Transfer size of one peak list')
+        print('{:>25s} {:8.1f} MB'.format('Peak objects', objects / 2**20))
+        print('{:>25s} {:8.1f} MB'.format('Packed arrays', arrays / 2**20))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Compare copy.deepcopy with the clone methods
+
+Time resolving an nlinLS template from a header and from a peak list,
+which now share or clone columns, against the same resolution after deep
+copying the columns of the template, as was done before. Then time copying
+synthetic peak lists of Peak, CompactPeak and ArrayPeakList objects with
+copy.deepcopy and with PeakList.clone, and print the speedups.
+
+Usage:
+python benchmarks/bench_clone.py [num_peaks]
+"""
+from __future__ import division, absolute_import, print_function
+import sys
+import timeit
+from copy import deepcopy
+import nmrpeaklists as npl
+
+
+NUM_PLANES = 64
+
+
+def build_peaklist(num_peaks, compact=False):
+    peak_type = npl.CompactPeak if compact else npl.Peak
+    spin_type = npl.CompactSpin if compact else npl.Spin
+    peaklist = npl.PeakList()
+    for i in range(num_peaks):
+        res_type = 'ACDEFGHIKLMNPQRSTVWY'[i % 20]
+        res_num = i % 150 + 1
+        spins = [spin_type(res_type, res_num, 'H', shift=8.0 + i * 1e-4),
+                 spin_type(res_type, res_num, 'N', shift=120.0 + i * 1e-3)]
+        peak = peak_type(spins=spins, number=i + 1, volume=1e5 + i)
+        peak.profile = [1.0 - 0.01 * j for j in range(NUM_PLANES)]
+        peaklist.append(peak)
+    return peaklist
+
+
+def get_template():
+    profile_names = ['Z_A%d' % i for i in range(NUM_PLANES)]
+    template = npl.PipeTemplate()
+    template.append(npl.PeakAttrColumn('VOL', '%9.3e', 'volume'))
+    template.append(npl.PeakAttrListGroup(profile_names, '%7.4f', 'profile'))
+    return template
+
+
+def deep_copied(template):
+    return npl.ColumnTemplate([deepcopy(column)
+                               if isinstance(column, npl.Column) else column
+                               for column in template])
+
+
+def compare(name, deep, clone, number):
+    deep_time = min(timeit.repeat(deep, number=number, repeat=3)) / number
+    clone_time = min(timeit.repeat(clone, number=number, repeat=3)) / number
+    print('{:>24s} {:10.6f} s {:10.6f} s {:7.1f}x'.format(
+        name, deep_time, clone_time, deep_time / clone_time))
+
+
+def main():
+    num_peaks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    peaklist = build_peaklist(num_peaks)
+    compact = build_peaklist(num_peaks, compact=True)
+    array_peaklist = npl.ArrayPeakList(peaklist)
+    template = get_template()
+    resolved = npl.ColumnTemplate(template.resolve_from_peaklist(peaklist))
+    names = [column.name for column in resolved]
+    formats = [column.fmt for column in resolved]
+    sample = peaklist[:20]
+
+    print('Copy time ({:d} peaks, {:d} columns)'.format(num_peaks,
+                                                       len(resolved)))
+    print('{:>24s} {:>12s} {:>12s} {:>8s}'.format('', 'deepcopy', 'clone',
+                                                 'speedup'))
+    compare('Template from header',
+            lambda: deep_copied(resolved).resolve_from_header(names, formats),
+            lambda: resolved.resolve_from_header(names, formats), 100)
+    compare('Template from peak list',
+            lambda: deep_copied(resolved).resolve_from_peaklist(sample),
+            lambda: resolved.resolve_from_peaklist(sample), 20)
+    compare('PeakList of Peak',
+            lambda: deepcopy(peaklist), peaklist.clone, 1)
+    compare('PeakList of CompactPeak',
+            lambda: deepcopy(compact), compact.clone, 1)
+    compare('ArrayPeakList',
+            lambda: deepcopy(array_peaklist), array_peaklist.clone, 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Compare the per-row cost of column dispatch and a compiled RowCodec
+
+Parse and format the rows of a synthetic nlinLS .tab peak list, first
+with one Column.set_string/get_string call per cell and then with the
+RowCodec compiled from the same resolved template, and print the time per
+row in microseconds.
+
+Usage:
+python benchmarks/bench_codec.py [num_peaks]
+"""
+from __future__ import division, absolute_import, print_function
+import sys
+import timeit
+import nmrpeaklists as npl
+
+
+NUM_PLANES = 16
+
+
+def make_rows(num_peaks):
+    rows = []
+    for i in range(num_peaks):
+        res = 'ACDEFGHIKLMNPQRSTVWY'[i % 20] + str(i % 150 + 1)
+        row = ['%d' % (i + 1), res + '-H', res + '-N',
+               '%.3f' % (8.0 + i * 1e-4), '%.3f' % (120.0 + i * 1e-3),
+               '%.3e' % (1e5 + i)]
+        row += ['%.4f' % (1.0 - 0.01 * j) for j in range(NUM_PLANES)]
+        rows.append(row)
+    return rows
+
+
+def get_columns():
+    names = (['INDEX', 'X_NAME', 'Y_NAME', 'X_PPM', 'Y_PPM', 'VOL'] +
+             ['Z_A%d' % j for j in range(NUM_PLANES)])
+    formats = ['%4d', '%7s', '%7s', '%7.3f', '%7.3f', '%9.3e']
+    formats += ['%7.4f'] * NUM_PLANES
+    template = npl.PipeTemplate()
+    template.append(npl.PeakAttrListGroup(names[6:], '%7.4f', 'profile'))
+    return template.resolve_from_header(names, formats)
+
+
+def parse_dispatch(columns, rows, peaklist):
+    for peak, row in zip(peaklist, rows):
+        for column, string in zip(columns, row):
+            column.set_string(peak, string)
+
+
+def parse_codec(codec, rows, peaklist):
+    parse = codec.parse
+    for peak, row in zip(peaklist, rows):
+        parse(peak, row)
+
+
+def format_dispatch(columns, peaklist):
+    return [' ' + ' '.join(column.get_string(peak) for column in columns) +
+            '\n' for peak in peaklist]
+
+
+def main():
+    num_peaks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rows = make_rows(num_peaks)
+    columns = get_columns()
+    codec = npl.ColumnTemplate(columns).compile()
+    empty = lambda: npl.get_empty_peaklist(num_peaks, 2)
+    peaklist = empty()
+    parse_codec(codec, rows, peaklist)
+    assert format_dispatch(columns, peaklist) == codec.format_rows(peaklist)
+    tests = [
+        ('parse, per-column dispatch', lambda pl: parse_dispatch(columns, rows,
+                                                                 pl)),
+        ('parse, RowCodec', lambda pl: parse_codec(codec, rows, pl)),
+        ('format, per-column dispatch',
+         lambda pl: format_dispatch(columns, peaklist)),
+        ('format, RowCodec', lambda pl: codec.format_rows(peaklist))]
+    print('Time per row ({:d} rows, {:d} columns)'.format(num_peaks,
+                                                         len(columns)))
+    for name, func in tests:
+        times = []
+        for _ in range(3):
+            pl = empty()
+            times.append(timeit.timeit(lambda: func(pl), number=1))
+        print('{:>30s} {:8.2f} us'.format(name, 1e6 * min(times) / num_peaks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Report the memory used per peak by each peak list representation
+
+Build synthetic 2D, 3D and 4D peak lists with the attributes found in
+typical NOESY and fit peak lists, and print the number of bytes allocated
+per peak for ordinary Spin/Peak objects, CompactSpin/CompactPeak objects
+and an ArrayPeakList.
+
+Usage:
+python benchmarks/bench_memory.py [num_peaks]
+"""
+from __future__ import division, absolute_import, print_function
+import sys
+import gc
+import tracemalloc
+import nmrpeaklists as npl
+
+
+ATOMS = ['H', 'N', 'HA', 'CA', 'HB2', 'CB', 'HD1', 'CD1']
+
+
+def spin_values(i, dim):
+    return {'res_type': 'ACDEFGHIKLMNPQRSTVWY'[i % 20],
+            'res_num': i % 150,
+            'atom': ATOMS[(i + dim) % len(ATOMS)],
+            'shift': 1.0 + i * 1e-3,
+            'shift_pts': 100.0 + i * 1e-2,
+            'spin_id': 2 * i + dim,
+            'width': 2.0}
+
+
+def peak_values(i):
+    return {'volume': 1e5 + i, 'height': 1e4 + i, 'number': i + 1,
+            'commented': False}
+
+
+def build_objects(num_peaks, dims, peak_type, spin_type):
+    peaklist = npl.PeakList()
+    for i in range(num_peaks):
+        spins = [spin_type(**spin_values(i, d)) for d in range(dims)]
+        peaklist.append(peak_type(spins=spins, **peak_values(i)))
+    return peaklist
+
+
+def build_arrays(num_peaks, dims):
+    peaklist = npl.ArrayPeakList.empty(num_peaks, dims)
+    for i, peak in enumerate(peaklist):
+        for key, val in peak_values(i).items():
+            setattr(peak, key, val)
+        for d, spin in enumerate(peak):
+            for key, val in spin_values(i, d).items():
+                setattr(spin, key, val)
+    return peaklist
+
+
+def bytes_per_peak(build, num_peaks):
+    gc.collect()
+    tracemalloc.start()
+    peaklist = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del peaklist
+    return size / num_peaks
+
+
+def main():
+    num_peaks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    builds = [
+        ('Spin/Peak', lambda n, d: build_objects(n, d, npl.Peak, npl.Spin)),
+        ('CompactSpin/CompactPeak',
+         lambda n, d: build_objects(n, d, npl.CompactPeak, npl.CompactSpin)),
+        ('ArrayPeakList', build_arrays)]
+    print('Bytes per peak ({:d} peaks)'.format(num_peaks))
+    print('{:>25s} {:>9s} {:>9s} {:>9s}'.format('', '2D', '3D', '4D'))
+    for name, build in builds:
+        sizes = []
+        for dims in (2, 3, 4):
+            size = bytes_per_peak(lambda: build(num_peaks, dims), num_peaks)
+            sizes.append(size)
+        print('{:>25s} {:9.0f} {:9.0f} {:9.0f}'.format(name, *sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Time reading a synthetic NMRPipe .tab peak list
+
+Write a 3D peak list with assignment, shift, spin ID and volume columns,
+then print the time taken to read it with the ordinary reader and with
+the columnar reader, uncached and from a warm sidecar cache.
+
+Usage:
+python benchmarks/bench_read.py [num_peaks]
+"""
+from __future__ import division, absolute_import, print_function
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+import nmrpeaklists as npl
+
+
+ATOMS = ['H', 'N', 'HA', 'CA', 'HB2', 'CB', 'HD1', 'CD1']
+
+
+def write_tab(filename, num_peaks, dims=3):
+    letters = 'XYZA'[:dims]
+    names = (['INDEX'] + [d + '_NAME' for d in letters] +
+             [d + '_PPM' for d in letters] + [d + '_ID' for d in letters] +
+             ['VOL'])
+    formats = (['%6d'] + ['%9s'] * dims + ['%8.3f'] * dims +
+               ['%6d'] * dims + ['%10.3e'])
+    with open(filename, 'w') as tab:
+        tab.write('VARS ' + ' '.join(names) + '\n')
+        tab.write('FORMAT ' + ' '.join(formats) + '\n\n')
+        for i in range(num_peaks):
+            res = 'ACDEFGHIKLMNPQRSTVWY'[i % 20] + str(i % 150 + 1)
+            row = ['%6d' % (i + 1)]
+            row += ['%9s' % (res + '-' + ATOMS[(i + d) % len(ATOMS)])
+                    for d in range(dims)]
+            row += ['%8.3f' % (1.0 + i * 1e-3 + d) for d in range(dims)]
+            row += ['%6d' % (dims * i + d) for d in range(dims)]
+            row += ['%10.3e' % (1e5 + i)]
+            com = '#' if i % 10 == 0 else ' '
+            tab.write(com + ' '.join(row) + '\n')
+
+
+def main():
+    num_peaks = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'bench.tab')
+        write_tab(filename, num_peaks)
+        cache = npl.PeakListCache(os.path.join(directory, 'cache'))
+        print('Read time ({:d} 3D peaks)'.format(num_peaks))
+        for name, columnar, cached in (
+                ('PipeFile', False, False),
+                ('PipeFile(columnar=True)', True, False),
+                ('PipeFile, cached', False, cache),
+                ('PipeFile(columnar=True), cached', True, cache)):
+            reader = lambda: npl.PipeFile(columnar=columnar).read_peaklist(
+                filename, cache=cached)
+            if cached:
+                reader()
+            time = min(timeit.repeat(reader, number=1, repeat=3))
+            print('{:>33s} {:8.3f} s'.format(name, time))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
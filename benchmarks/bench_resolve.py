@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Time reading many small NMRPipe .tab peak lists with the same header
+
+Write small 3D peak lists that share one VARS/FORMAT header, then print
+the time taken to read them one after another with a fresh reader for
+each file, with and without the template resolution cache.
+
+Usage:
+python benchmarks/bench_resolve.py [num_files [num_peaks]]
+"""
+from __future__ import division, absolute_import, print_function
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+import nmrpeaklists as npl
+from nmrpeaklists import columns
+from bench_read import write_tab
+
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_peaks = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    directory = tempfile.mkdtemp()
+    try:
+        paths = [os.path.join(directory, 'bench{:d}.tab'.format(i))
+                 for i in range(num_files)]
+        for path in paths:
+            write_tab(path, num_peaks)
+
+        def read(clear):
+            for path in paths:
+                if clear:
+                    columns._RESOLUTIONS.clear()
+                npl.PipeFile().read_peaklist(path, cache=False)
+
+        print('Read time ({:d} files of {:d} 3D peaks)'.format(num_files,
+                                                              num_peaks))
+        for label, clear in (('uncached', True), ('cached', False)):
+            time = min(timeit.repeat(lambda: read(clear), number=1, repeat=3))
+            print('{:>12s} {:8.3f} s {:8.1f} us/file'.format(
+                label, time, 1e6 * time / num_files))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Time writing a synthetic nlinLS CEST/RD .tab peak list
+
+Build a 2D peak list with 64 Z_A%d profile columns, then print the time
+taken to format it one cell at a time with Column.get_string and with the
+vectorized Column.get_strings used by PipeFile.write_peaklist.
+
+Usage:
+python benchmarks/bench_write.py [num_peaks]
+"""
+from __future__ import division, absolute_import, print_function
+import sys
+import timeit
+import nmrpeaklists as npl
+
+
+NUM_PLANES = 64
+
+
+def build_peaklist(num_peaks):
+    peaklist = npl.PeakList()
+    for i in range(num_peaks):
+        res = 'ACDEFGHIKLMNPQRSTVWY'[i % 20] + str(i % 150 + 1)
+        spins = [npl.Spin(name=res + '-H', shift=8.0 + i * 1e-4),
+                 npl.Spin(name=res + '-N', shift=120.0 + i * 1e-3)]
+        profile = [1.0 - 0.01 * j + 1e-6 * i for j in range(NUM_PLANES)]
+        peaklist.append(npl.Peak(spins=spins, number=i + 1, volume=1e5 + i,
+                                 profile=profile))
+    return peaklist
+
+
+def get_template(peaklist):
+    profile_names = ['Z_A%d' % i for i in range(NUM_PLANES)]
+    template = npl.PipeTemplate()
+    template.append(npl.PeakAttrColumn('VOL', '%9.3e', 'volume'))
+    template.append(npl.PeakAttrListGroup(profile_names, '%7.4f', 'profile'))
+    return npl.ColumnTemplate(template.resolve_from_peaklist(peaklist))
+
+
+def main():
+    num_peaks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    peaklist = build_peaklist(num_peaks)
+    template = get_template(peaklist)
+    per_cell = lambda: [[column.get_string(peak) for peak in peaklist]
+                        for column in template]
+    per_column = lambda: [column.get_strings(peaklist) for column in template]
+    assert per_cell() == per_column()
+    print('Format time ({:d} peaks, {:d} columns)'.format(num_peaks,
+                                                         len(template)))
+    for name, func in (('Column.get_string', per_cell),
+                       ('Column.get_strings', per_column)):
+        time = min(timeit.repeat(func, number=1, repeat=3))
+        print('{:>25s} {:8.3f} s'.format(name, time))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,67 @@
 """
 """
 from __future__ import division, absolute_import, print_function
-from .columns import *
-from .files import *
-from .peaklist import *
-from .utils import *
+import sys
+from importlib import import_module
 
 __author__ = 'Bradley J. Harden <bradleyharden@gmail.com>'
 __version__ = '0.9'
+
+# Public names of each submodule. On Python 3.7 and later, a submodule is
+# imported the first time one of its names is used, so that importing the
+# package does not import NumPy or any reader that is not needed.
+_SUBMODULE_NAMES = {
+    'arrays': ['ArrayPeakList', 'ArrayPeak', 'ArraySpin', 'pack_peaklist',
+               'unpack_peaklist'],
+    'batch': ['read_many'],
+    'cache': ['PeakListCache', 'default_cache'],
+    'columnar': ['format_dtype', 'parse_table', 'read_columnar'],
+    'columns': ['Column', 'IgnoreColumn', 'PeakAttrColumn',
+                'PeakAttrListColumn', 'SpinAttrColumn', 'Res3LetterColumn',
+                'PipeNameColumn', 'PipeAnchorColumn', 'SparkyNameColumn',
+                'ColumnGroup', 'PeakAttrListGroup', 'SpinAttrGroup',
+                'PipeNameGroup', 'ColumnTemplate', 'RowCodec', 'PipeTemplate',
+                'SparkyTemplate', 'UplTemplate', 'XeasyTemplate'],
+    'compression': ['open_file', 'compression_of'],
+    'files': ['PipeFile', 'XeasyFile', 'UplFile', 'SparkyFile',
+              'CaraSpinsFile', 'CaraAnchorFile', 'PipeSpectrumHeader'],
+    'formats': ['FileFormat', 'register_format', 'sniff_format', 'get_reader',
+                'reader_for', 'read_any', 'read_schema'],
+    'peaklist': ['Assignment', 'Spin', 'CompactSpin', 'Peak', 'CompactPeak',
+                 'PeakList', 'PeakListView', 'ViewPeak', 'PeakIndex',
+                 'calibrate_peaklist',
+                 'get_empty_peaklist', 'get_spin_link_dict',
+                 'intern_assignment', 'renumber_peaklist', 'reorder_dims',
+                 'sort_by_assignments'],
+    'predicates': ['Predicate'],
+    'spectra': ['PipeSpectrum'],
+    'utils': ['argsort', 'flatten', 'parse_list_literal'],
+}
+_NAME_MODULES = dict((name, module)
+                     for module, names in _SUBMODULE_NAMES.items()
+                     for name in names)
+
+__all__ = sorted(_NAME_MODULES)
+
+
+def _load(name):
+    module = import_module('.' + _NAME_MODULES[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name in _SUBMODULE_NAMES:
+            return import_module('.' + name, __name__)
+        if name not in _NAME_MODULES:
+            err = 'module {!r} has no attribute {!r}'.format(__name__, name)
+            raise AttributeError(err)
+        return _load(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
+else:
+    for _name in __all__:
+        _load(_name)
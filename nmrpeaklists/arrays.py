@@ -0,0 +1,1315 @@
+"""
+Classes
+-------
+
+:class:`ArrayPeakList` objects are peak lists that store the common spin
+and peak attributes in typed NumPy arrays rather than in individual
+:class:`~.peaklist.Spin` and :class:`~.peaklist.Peak` objects.
+
+:class:`ArrayPeak` and :class:`ArraySpin` objects are lightweight proxies
+handed out when indexing an :class:`ArrayPeakList`. They behave like
+ordinary Peak and Spin objects, but read and write the underlying arrays.
+
+Documentation
+-------------
+
+"""
+from __future__ import division, absolute_import, print_function
+import json
+from itertools import combinations
+import numpy as np
+from .peaklist import (Spin, Peak, PeakList, _SHARED, _assignment_sort_key,
+                       _clone_list_attrs, _copy_values)
+
+
+__all__ = ['ArrayPeakList', 'ArrayPeak', 'ArraySpin', 'pack_peaklist',
+           'unpack_peaklist']
+
+
+MISSING_INT = np.iinfo(np.int32).min
+
+
+def _spin_field(name):
+    """Forward a Spin property to the arrays of the parent peak list."""
+    def fget(self):
+        return self._peaklist._get_spin_attr(self._row, self._dim, name)
+
+    def fset(self, value):
+        self._peaklist._set_spin_attr(self._row, self._dim, name, value)
+
+    return property(fget, fset)
+
+
+class ArraySpin(Spin):
+    """
+    Proxy for a single spin stored in an :class:`ArrayPeakList`.
+
+    Attribute access is forwarded to the arrays of the parent peak list.
+    A proxy refers to a fixed row of the parent, so it should not be kept
+    across operations that insert, delete or reorder peaks.
+
+    See Also
+    --------
+    ArrayPeak, ArrayPeakList
+    """
+    __slots__ = ('_peaklist', '_row', '_dim')
+
+    def __init__(self, peaklist, row, dim):
+        object.__setattr__(self, '_peaklist', peaklist)
+        object.__setattr__(self, '_row', row)
+        object.__setattr__(self, '_dim', dim)
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ArraySpin.__slots__:
+            raise AttributeError(name)
+        return self._peaklist._get_spin_attr(self._row, self._dim, name)
+
+    def __setattr__(self, name, value):
+        if isinstance(getattr(type(self), name, None), property):
+            object.__setattr__(self, name, value)
+        else:
+            self._peaklist._set_spin_attr(self._row, self._dim, name, value)
+
+    def __delattr__(self, name):
+        self._peaklist._del_spin_attr(self._row, self._dim, name)
+
+    res_type = _spin_field('res_type')
+    res_num = _spin_field('res_num')
+    atom = _spin_field('atom')
+
+    # Changes are recorded by the parent peak list, so a proxy is never
+    # adopted by a peak
+    _owner = property(lambda self: _SHARED, lambda self, owner: None)
+
+    def __copy__(self):
+        return self.detach()
+
+    def __deepcopy__(self, memo):
+        return self.detach()
+
+    def _attrs(self):
+        return self._peaklist._spin_attrs(self._row, self._dim)
+
+    def detach(self):
+        """Return an independent :class:`~.peaklist.Spin` with the same
+        attributes."""
+        spin = Spin.__new__(Spin)
+        vars(spin).update(_copy_values(self._attrs()))
+        return spin
+
+    clone = detach
+
+
+class ArrayPeak(Peak):
+    """
+    Proxy for a single peak stored in an :class:`ArrayPeakList`.
+
+    Indexing returns :class:`ArraySpin` proxies for each dimension. The
+    number of spins is fixed by the parent peak list, so spins may be
+    replaced but not inserted or deleted. Copying an ArrayPeak with
+    :func:`copy.copy` or :func:`copy.deepcopy` returns an independent
+    :class:`~.peaklist.Peak`.
+
+    See Also
+    --------
+    ArraySpin, ArrayPeakList
+    """
+    __slots__ = ('_peaklist', '_row')
+
+    def __init__(self, peaklist, row):
+        object.__setattr__(self, '_peaklist', peaklist)
+        object.__setattr__(self, '_row', row)
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ArrayPeak.__slots__:
+            raise AttributeError(name)
+        return self._peaklist._get_peak_attr(self._row, name)
+
+    def __setattr__(self, name, value):
+        if isinstance(getattr(type(self), name, None), property):
+            object.__setattr__(self, name, value)
+        else:
+            self._peaklist._set_peak_attr(self._row, name, value)
+
+    def __delattr__(self, name):
+        self._peaklist._del_peak_attr(self._row, name)
+
+    # Changes are recorded by the parent peak list, so a proxy is never
+    # adopted by another peak list
+    _owner = property(lambda self: _SHARED, lambda self, owner: None)
+
+    def __len__(self):
+        return self._peaklist._dims
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        dims = len(self)
+        if i < 0:
+            i += dims
+        if not 0 <= i < dims:
+            raise IndexError('spin index out of range')
+        return ArraySpin(self._peaklist, self._row, i)
+
+    def __iter__(self):
+        peaklist = self._peaklist
+        row = self._row
+        return (ArraySpin(peaklist, row, dim) for dim in range(len(self)))
+
+    def __setitem__(self, i, v):
+        if isinstance(i, slice):
+            indices = range(*i.indices(len(self)))
+            records = [_spin_record(spin) for spin in v]
+            if len(records) != len(indices):
+                err = 'ArrayPeak has a fixed number of spins'
+                raise ValueError(err)
+        else:
+            indices = [i if i >= 0 else i + len(self)]
+            records = [_spin_record(v)]
+        for dim, record in zip(indices, records):
+            self._peaklist._write_spin(self._row, dim, record)
+
+    def __delitem__(self, i):
+        raise TypeError('ArrayPeak has a fixed number of spins')
+
+    def insert(self, i, v):
+        raise TypeError('ArrayPeak has a fixed number of spins')
+
+    def __copy__(self):
+        return self.detach()
+
+    def __deepcopy__(self, memo):
+        return self.detach()
+
+    def _attrs(self):
+        return self._peaklist._peak_attrs(self._row)
+
+    def sort(self, **kwargs):
+        spins = [spin.detach() for spin in self]
+        spins.sort(**kwargs)
+        self[:] = spins
+
+    def detach(self):
+        """Return an independent :class:`~.peaklist.Peak` with the same
+        spins and attributes."""
+        peak = Peak(spins=[spin.detach() for spin in self])
+        vars(peak).update(_copy_values(self._attrs()))
+        return peak
+
+    clone = detach
+
+
+def _peak_record(peak):
+    """Snapshot the attributes and spins of any Peak as plain dicts."""
+    attrs = dict(peak._attrs())
+    spins = [_spin_record(spin) for spin in peak]
+    return attrs, spins
+
+
+def _spin_record(spin):
+    return dict(spin._attrs())
+
+
+class ArrayPeakList(PeakList):
+    """
+    A peak list backed by typed NumPy arrays.
+
+    The spin attributes listed in :attr:`SPIN_FIELDS` and the peak
+    attributes listed in :attr:`PEAK_FIELDS` are stored column-wise, one
+    array per attribute. Residue types and atom names are stored as codes
+    into a table of unique strings. Any other attribute is kept in a
+    per-peak or per-spin dictionary, so arbitrary columns still work.
+
+    Indexing returns :class:`ArrayPeak` proxies, so existing code that
+    operates on Peak and Spin objects works unchanged. Peaks are stored by
+    value: inserting a Peak copies its data into the arrays, and later
+    changes to the original Peak are not reflected in the peak list.
+
+    Parameters
+    ----------
+    peaks : list of Peak objects, optional
+        Each peak must have the same number of spins
+    dims : int, optional
+        Number of spins in each peak. If not given, it is taken from the
+        first peak inserted.
+
+    Raises
+    ------
+    ValueError
+        If attempting to insert a peak with a different number of spins than
+        those currently populating the peak list.
+
+    Examples
+    --------
+    >>> peaklist = ArrayPeakList(PipeFile().read_peaklist('fit.tab'))
+    >>> peaklist.spin_array('shift')[:, 0]
+    array([ 8.124,  7.589,  6.923, ...])
+    >>> peaklist[0][0].shift
+    8.124
+
+    See Also
+    --------
+    ArrayPeak, ArraySpin
+    """
+    SPIN_FIELDS = (('shift', np.float64), ('shift_pts', np.float64),
+                   ('spin_id', np.int32), ('width', np.float64),
+                   ('res_num', np.int32))
+    PEAK_FIELDS = (('volume', np.float64), ('height', np.float64),
+                   ('number', np.int32), ('commented', np.bool_))
+    STRING_FIELDS = ('res_type', 'atom')
+
+    def __init__(self, peaks=None, dims=None):
+        self._dims = dims
+        self._version = 0
+        self._cache = {}
+        self._size = 0
+        self._capacity = 0
+        self._spin_data = {}
+        self._peak_data = {}
+        self._peak_present = {}
+        self._strings = []
+        self._string_codes = {}
+        self._peak_extra = []
+        self._spin_extra = []
+        self._allocate(0)
+        if peaks is not None:
+            self.extend(peaks)
+
+    @classmethod
+    def empty(cls, num_peaks, num_dims):
+        """Create a peak list of ``num_peaks`` peaks with no attributes."""
+        peaklist = cls(dims=num_dims)
+        peaklist._insert_rows(0, num_peaks)
+        return peaklist
+
+    # Storage management
+
+    def _allocate(self, capacity):
+        dims = self._dims if self._dims is not None else 0
+        spin_data = {}
+        for name, dtype in ArrayPeakList.SPIN_FIELDS:
+            spin_data[name] = _missing_array((capacity, dims), dtype)
+        for name in ArrayPeakList.STRING_FIELDS:
+            spin_data[name] = _missing_array((capacity, dims), np.int32,
+                                             name)
+        peak_data = {}
+        peak_present = {}
+        for name, dtype in ArrayPeakList.PEAK_FIELDS:
+            peak_data[name] = _missing_array((capacity,), dtype)
+            if dtype == np.bool_:
+                # Flags have no missing value, so record which are set
+                peak_present[name] = _missing_array((capacity,), np.bool_)
+        size = self._size
+        for name, arr in spin_data.items():
+            old = self._spin_data.get(name)
+            if old is not None and old.shape[1] == arr.shape[1]:
+                arr[:size] = old[:size]
+        for name, arr in peak_data.items():
+            if name in self._peak_data:
+                arr[:size] = self._peak_data[name][:size]
+        for name, arr in peak_present.items():
+            if name in self._peak_present:
+                arr[:size] = self._peak_present[name][:size]
+        self._spin_data = spin_data
+        self._peak_data = peak_data
+        self._peak_present = peak_present
+        self._capacity = capacity
+
+    def _reserve(self, size):
+        if size > self._capacity:
+            self._allocate(max(size, 2 * self._capacity, 16))
+
+    def _insert_rows(self, i, count):
+        size = self._size
+        self._reserve(size + count)
+        for arrays in (self._spin_data, self._peak_data, self._peak_present):
+            for name, arr in arrays.items():
+                arr[i + count:size + count] = arr[i:size]
+                arr[i:i + count] = _missing_value(arr.dtype, name)
+        self._peak_extra[i:i] = [None] * count
+        self._spin_extra[i:i] = [None] * count
+        self._size = size + count
+        self._version += 1
+
+    def _take(self, rows):
+        """Keep only the given rows, in the given order."""
+        rows = np.asarray(rows, dtype=np.intp)
+        count = len(rows)
+        for arrays in (self._spin_data, self._peak_data, self._peak_present):
+            for name, arr in arrays.items():
+                arr[:count] = arr[:self._size][rows]
+                arr[count:self._size] = _missing_value(arr.dtype, name)
+        self._peak_extra = [self._peak_extra[r] for r in rows]
+        self._spin_extra = [self._spin_extra[r] for r in rows]
+        self._size = count
+        self._version += 1
+
+    def _intern(self, string):
+        if string is None:
+            return -1
+        try:
+            return self._string_codes[string]
+        except KeyError:
+            code = len(self._strings)
+            self._strings.append(string)
+            self._string_codes[string] = code
+            return code
+
+    def _check_dims(self, dims):
+        if self._dims is None:
+            self._dims = dims
+            self._allocate(self._capacity)
+        elif dims != self._dims:
+            err = ('expected peak with {:d} spins, '
+                   'found {:d}'.format(self._dims, dims))
+            raise ValueError(err)
+
+    # Attribute access used by the proxies
+
+    def _get_spin_attr(self, row, dim, name):
+        if name in self._spin_data:
+            value = self._spin_data[name][row, dim]
+            if name in ArrayPeakList.STRING_FIELDS:
+                return self._strings[value] if value >= 0 else None
+            value = _to_python(value)
+            if value is None and name != 'res_num':
+                raise AttributeError(name)
+            return value
+        extra = self._spin_extra[row]
+        try:
+            return extra[dim][name]
+        except (TypeError, KeyError):
+            raise AttributeError(name)
+
+    def _set_spin_attr(self, row, dim, name, value):
+        if name in ArrayPeakList.STRING_FIELDS:
+            self._spin_data[name][row, dim] = self._intern(value)
+            self._version += 1
+        elif name in self._spin_data:
+            arr = self._spin_data[name]
+            if value is None:
+                value = _missing_value(arr.dtype)
+            arr[row, dim] = value
+            if name == 'res_num':
+                self._version += 1
+        else:
+            extra = self._spin_extra[row]
+            if extra is None:
+                extra = [{} for _ in range(self._dims)]
+                self._spin_extra[row] = extra
+            extra[dim][name] = value
+
+    def _del_spin_attr(self, row, dim, name):
+        if name in self._spin_data:
+            self._set_spin_attr(row, dim, name, None)
+            return
+        try:
+            del self._spin_extra[row][dim][name]
+        except (TypeError, KeyError):
+            raise AttributeError(name)
+
+    def _spin_attrs(self, row, dim):
+        attrs = {}
+        for name in ArrayPeakList.STRING_FIELDS + ('res_num',):
+            attrs[name] = self._get_spin_attr(row, dim, name)
+        for name, _ in ArrayPeakList.SPIN_FIELDS:
+            value = _to_python(self._spin_data[name][row, dim])
+            if value is not None:
+                attrs[name] = value
+        extra = self._spin_extra[row]
+        if extra is not None:
+            attrs.update(extra[dim])
+        return attrs
+
+    def _write_spin(self, row, dim, record):
+        for name, arr in self._spin_data.items():
+            arr[row, dim] = _missing_value(arr.dtype, name)
+        self._version += 1
+        extra = self._spin_extra[row]
+        if extra is not None:
+            extra[dim].clear()
+        for name, value in record.items():
+            self._set_spin_attr(row, dim, name, value)
+
+    def _get_peak_attr(self, row, name):
+        if name in self._peak_data:
+            value = _to_python(self._peak_data[name][row])
+            if value is None or not self._has_peak_attr(row, name):
+                raise AttributeError(name)
+            return value
+        try:
+            return self._peak_extra[row][name]
+        except (TypeError, KeyError):
+            raise AttributeError(name)
+
+    def _set_peak_attr(self, row, name, value):
+        if name in self._peak_data:
+            arr = self._peak_data[name]
+            if name in self._peak_present:
+                self._peak_present[name][row] = value is not None
+            if value is None:
+                value = _missing_value(arr.dtype)
+            arr[row] = value
+        else:
+            extra = self._peak_extra[row]
+            if extra is None:
+                extra = {}
+                self._peak_extra[row] = extra
+            extra[name] = value
+
+    def _del_peak_attr(self, row, name):
+        if name in self._peak_data:
+            self._set_peak_attr(row, name, None)
+            return
+        try:
+            del self._peak_extra[row][name]
+        except (TypeError, KeyError):
+            raise AttributeError(name)
+
+    def _has_peak_attr(self, row, name):
+        present = self._peak_present.get(name)
+        return present is None or bool(present[row])
+
+    def _peak_attrs(self, row):
+        attrs = {}
+        for name, _ in ArrayPeakList.PEAK_FIELDS:
+            value = _to_python(self._peak_data[name][row])
+            if value is not None and self._has_peak_attr(row, name):
+                attrs[name] = value
+        extra = self._peak_extra[row]
+        if extra is not None:
+            attrs.update(extra)
+        return attrs
+
+    def _write_peak(self, row, record):
+        attrs, spins = record
+        self._check_dims(len(spins))
+        for name, arr in self._peak_data.items():
+            arr[row] = _missing_value(arr.dtype)
+        for arr in self._peak_present.values():
+            arr[row] = False
+        self._peak_extra[row] = None
+        self._spin_extra[row] = None
+        for name, value in attrs.items():
+            self._set_peak_attr(row, name, value)
+        for dim, spin in enumerate(spins):
+            self._write_spin(row, dim, spin)
+
+    # MutableSequence interface
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('peak index out of range')
+        return ArrayPeak(self, i)
+
+    def __iter__(self):
+        return (ArrayPeak(self, row) for row in range(self._size))
+
+    def __setitem__(self, i, v):
+        if isinstance(i, slice):
+            records = [_peak_record(peak) for peak in v]
+            start, stop, step = i.indices(len(self))
+            if step == 1:
+                del self[start:stop]
+                self._insert_records(start, records)
+                return
+            rows = range(start, stop, step)
+            if len(rows) != len(records):
+                err = ('attempt to assign sequence of size {:d} to extended '
+                       'slice of size {:d}'.format(len(records), len(rows)))
+                raise ValueError(err)
+        else:
+            rows = [i if i >= 0 else i + self._size]
+            if not 0 <= rows[0] < self._size:
+                raise IndexError('peak index out of range')
+            records = [_peak_record(v)]
+        for row, record in zip(rows, records):
+            self._write_peak(row, record)
+
+    def __delitem__(self, i):
+        keep = np.ones(self._size, dtype=np.bool_)
+        if isinstance(i, slice):
+            keep[i] = False
+        else:
+            row = i if i >= 0 else i + self._size
+            if not 0 <= row < self._size:
+                raise IndexError('peak index out of range')
+            keep[row] = False
+        self._take(np.flatnonzero(keep))
+
+    def insert(self, i, v):
+        size = self._size
+        i = max(0, min(i + size if i < 0 else i, size))
+        self._insert_records(i, [_peak_record(v)])
+
+    def extend(self, values):
+        self._insert_records(self._size, [_peak_record(v) for v in values])
+
+    def _insert_records(self, i, records):
+        for attrs, spins in records:
+            self._check_dims(len(spins))
+        count = len(records)
+        self._insert_rows(i, count)
+        rows = slice(i, i + count)
+        # Fill each array in bulk, leaving the other attributes as extras
+        for name, arr in self._peak_data.items():
+            values = [attrs.pop(name, None) for attrs, _ in records]
+            arr[rows] = self._encode_column(name, arr.dtype, values, None)
+            if name in self._peak_present:
+                self._peak_present[name][rows] = [value is not None
+                                                  for value in values]
+        for dim in range(self._dims if count else 0):
+            for name, arr in self._spin_data.items():
+                values = [spins[dim].pop(name, None) for _, spins in records]
+                arr[rows, dim] = self._encode_column(name, arr.dtype, values,
+                                                     None)
+        for row, (attrs, spins) in enumerate(records, i):
+            if attrs:
+                self._peak_extra[row] = attrs
+            if any(spins):
+                self._spin_extra[row] = spins
+
+    def __repr__(self):
+        return 'ArrayPeakList(' + repr(list(self)) + ')'
+
+    def __str__(self):
+        string = super(ArrayPeakList, self).__str__()
+        return 'Array' + string
+
+    def __nonzero__(self):
+        return self._size > 0
+
+    def sort(self, key=None, reverse=False):
+        peaks = list(self)
+        keys = peaks if key is None else [key(peak) for peak in peaks]
+        order = sorted(range(len(peaks)), key=keys.__getitem__,
+                       reverse=reverse)
+        self._take(order)
+
+    def reorder(self, indices):
+        self._take(indices)
+
+    def _cache_key(self):
+        return self._version
+
+    def _dims_key(self):
+        return self._version
+
+    def _find_anchors(self):
+        res_num = self.spin_array('res_num')
+        atom = self.spin_array('atom')
+        signatures, decode = anchor_signatures(res_num, atom, self._strings)
+        # Visit each distinct signature in order of its first peak
+        distinct, first = np.unique(signatures, return_index=True)
+        anchors = []
+        for signature in distinct[np.argsort(first, kind='mergesort')]:
+            for poss_anc in decode[signature]:
+                if poss_anc not in anchors:
+                    anchors.append(poss_anc)
+        return tuple(anchors)
+
+    def sort_keys(self, order, commented_at_end=False):
+        """
+        Return the assignment sort keys of all peaks as an integer array.
+
+        Row ``i`` of the ``(len(self), k)`` array compares lexicographically
+        in the same order as the tuple key returned by
+        :meth:`~.peaklist.PeakList.sort_keys` for peak ``i``.
+        """
+        size = self._size
+        strings = self._strings
+        # Rank each distinct string by the corresponding part of its key,
+        # with the last element of each table for None (code -1)
+        parts = [_assignment_sort_key(s, None, s) for s in strings]
+        type_ranks = _rank_table([part[0][1] for part in parts])
+        side_ranks = _rank_table([part[2][1] for part in parts])
+        atom_ranks = _rank_table(strings)
+        columns = []
+        if commented_at_end:
+            columns.append(self._peak_data['commented'][:size])
+        for dim in order:
+            res_type = self._spin_data['res_type'][:size, dim]
+            atom = self._spin_data['atom'][:size, dim]
+            res_num = self._spin_data['res_num'][:size, dim].astype(np.int64)
+            res_num[res_num == MISSING_INT] = np.iinfo(np.int64).max
+            columns.extend([type_ranks[res_type], res_num, side_ranks[atom],
+                            atom_ranks[atom]])
+        keys = np.empty((size, len(columns)), dtype=np.int64)
+        for i, column in enumerate(columns):
+            keys[:, i] = column
+        return keys
+
+    def argsort_by_assignments(self, order, commented_at_end=False):
+        keys = self.sort_keys(order, commented_at_end)
+        return np.lexsort(keys.T[::-1])
+
+    @property
+    def dims(self):
+        if self._dims is None:
+            raise AttributeError('peaklist is empty')
+        return self._dims
+
+    # Array access
+
+    def spin_array(self, attr):
+        """
+        Return the array of a spin attribute for all peaks.
+
+        The array has shape ``(len(self), self.dims)`` and is a view into
+        the storage of the peak list, so modifying it modifies the peaks.
+        Missing floats are NaN and missing integers are :data:`MISSING_INT`.
+        Residue types and atom names are returned as codes into
+        :meth:`strings`, with -1 for None. Use :meth:`set_spin_column`
+        rather than writing to the array to change assignments, so cached
+        properties such as :attr:`anchors` are updated.
+        """
+        return self._spin_data[attr][:self._size]
+
+    def peak_array(self, attr):
+        """
+        Return the array of a peak attribute for all peaks.
+
+        The array has shape ``(len(self),)`` and is a view into the storage
+        of the peak list. See :meth:`spin_array` for missing values. Flags
+        such as ``commented`` are False when missing; see
+        :meth:`peak_mask`.
+        """
+        return self._peak_data[attr][:self._size]
+
+    def peak_mask(self, attr):
+        """
+        Return a boolean array of which peaks have a peak attribute.
+
+        The attribute must have array storage, as for :meth:`peak_array`.
+        """
+        if attr in self._peak_present:
+            return self._peak_present[attr][:self._size].copy()
+        return ~_missing_mask(self.peak_array(attr))
+
+    def set_spin_column(self, attr, dim, values, index=None, rows=None):
+        """
+        Set a spin attribute in one dimension of every peak.
+
+        Attributes with array storage are assigned in bulk; residue types
+        and atom names are given as strings. Other attributes are set peak
+        by peak.
+
+        Parameters
+        ----------
+        attr : str
+            Spin attribute to set
+        dim : int
+            Dimension of the spins to set
+        values : sequence
+            Value for each peak, or a table of values if ``index`` is given.
+            None marks a missing value.
+        index : array of int, optional
+            Index into ``values`` for each peak
+        rows : array of bool or int, optional
+            Peaks to set, if not every peak. ``values`` or ``index`` then
+            has one entry per selected peak.
+        """
+        if attr in self._spin_data:
+            arr = self.spin_array(attr)
+            selected = slice(None) if rows is None else rows
+            arr[selected, dim] = self._encode_column(attr, arr.dtype, values,
+                                                     index)
+        else:
+            extras = self._spin_extra
+            selected = np.arange(self._size)
+            if rows is not None:
+                selected = selected[rows]
+            for row, value in zip(selected.tolist(), _expand(values, index)):
+                extra = extras[row]
+                if extra is None:
+                    extra = [{} for _ in range(self._dims)]
+                    extras[row] = extra
+                extra[dim][attr] = value
+        self._version += 1
+
+    def set_peak_column(self, attr, values, index=None):
+        """
+        Set a peak attribute of every peak.
+
+        Attributes with array storage are assigned in bulk, others are set
+        peak by peak. See :meth:`set_spin_column` for the parameters.
+        """
+        if attr in self._peak_data:
+            arr = self.peak_array(attr)
+            arr[:] = self._encode_column(attr, arr.dtype, values, index)
+            if attr in self._peak_present:
+                present = self._peak_present[attr][:self._size]
+                if isinstance(values, np.ndarray) and values.dtype != object:
+                    present[:] = True
+                else:
+                    present[:] = [value is not None
+                                  for value in _expand(values, index)]
+        else:
+            for row, value in enumerate(_expand(values, index)):
+                self._set_peak_attr(row, attr, value)
+        self._version += 1
+
+    def _encode_column(self, attr, dtype, values, index):
+        if attr in ArrayPeakList.STRING_FIELDS:
+            if index is None:
+                try:
+                    values, index = np.unique(np.asarray(values, dtype=object),
+                                              return_inverse=True)
+                except TypeError:  # None can't be sorted with strings
+                    pass
+            table = np.array([self._intern(value) for value in values],
+                             dtype=np.int32)
+        elif isinstance(values, np.ndarray) and values.dtype != object:
+            table = values
+        else:
+            missing = _missing_value(dtype)
+            table = np.array([missing if value is None else value
+                              for value in values], dtype=dtype)
+        return table if index is None else table[np.ravel(index)]
+
+    def peak_values(self, attr):
+        """
+        Return a list of the values of a peak attribute for all peaks.
+
+        Raises
+        ------
+        AttributeError
+            If any peak lacks the attribute
+        """
+        if attr not in self._peak_data:
+            return [self._get_peak_attr(row, attr)
+                    for row in range(self._size)]
+        arr = self.peak_array(attr)
+        if not self.peak_mask(attr).all():
+            raise AttributeError(attr)
+        return arr.tolist()
+
+    def spin_values(self, attr, dim):
+        """
+        Return a list of the values of a spin attribute in one dimension.
+
+        Residue types and atom names are returned as strings. Missing
+        assignment values are None, as for a :class:`~.peaklist.Spin`.
+
+        Raises
+        ------
+        AttributeError
+            If any other spin attribute is missing
+        """
+        if attr in ArrayPeakList.STRING_FIELDS:
+            table = self._strings + [None]
+            return [table[code] for code in self.spin_array(attr)[:, dim]]
+        if attr not in self._spin_data:
+            return [self._get_spin_attr(row, dim, attr)
+                    for row in range(self._size)]
+        arr = self.spin_array(attr)[:, dim]
+        if attr == 'res_num':
+            return [None if value == MISSING_INT else value
+                    for value in arr.tolist()]
+        if _any_missing(arr):
+            raise AttributeError(attr)
+        return arr.tolist()
+
+    def _row_slice(self, start, stop):
+        """
+        Return a peak list of the rows from ``start`` to ``stop``.
+
+        The arrays are copied, but the per-peak dictionaries of other
+        attributes are shared, so the result is meant for reading only.
+        """
+        stop = min(stop, self._size)
+        chunk = ArrayPeakList(dims=self._dims)
+        chunk._strings = self._strings
+        chunk._string_codes = self._string_codes
+        chunk._allocate(stop - start)
+        for name, arr in self._spin_data.items():
+            chunk._spin_data[name][:] = arr[start:stop]
+        for name, arr in self._peak_data.items():
+            chunk._peak_data[name][:] = arr[start:stop]
+        for name, arr in self._peak_present.items():
+            chunk._peak_present[name][:] = arr[start:stop]
+        chunk._peak_extra = self._peak_extra[start:stop]
+        chunk._spin_extra = self._spin_extra[start:stop]
+        chunk._size = stop - start
+        return chunk
+
+    def select(self, predicate):
+        """
+        Return a peak list of the peaks for which a predicate is true
+
+        The selected rows of the arrays are copied into a new
+        ArrayPeakList, without creating Peak or Spin objects. Public
+        attributes of the peak list are copied as by :meth:`clone`.
+
+        Parameters
+        ----------
+        predicate : str, :class:`~.predicates.Predicate` or array of bool
+            Expression as for :meth:`where`, or a mask it returned
+
+        Returns
+        -------
+        peaklist : ArrayPeakList
+        """
+        if isinstance(predicate, str) or hasattr(predicate, 'evaluate'):
+            predicate = self.where(predicate)
+        mask = np.asarray(predicate, dtype=np.bool_)
+        if mask.shape != (self._size,):
+            err = 'mask has {:d} entries for {:d} peaks'
+            raise ValueError(err.format(mask.size, self._size))
+        selected = self._take_rows(np.flatnonzero(mask), copy_extra=True)
+        _clone_list_attrs(self, selected)
+        return selected
+
+    def clone(self):
+        """
+        Return an independent copy of the peak list.
+
+        The arrays are copied without creating Peak or Spin objects.
+        """
+        peaklist = self._take_rows(np.arange(self._size), copy_extra=True)
+        _clone_list_attrs(self, peaklist)
+        return peaklist
+
+    def _take_rows(self, rows, copy_extra=False):
+        """
+        Return a peak list of the given rows, in order.
+
+        The arrays are copied. Unless ``copy_extra`` is True, the per-peak
+        dictionaries of other attributes are shared, so the result is meant
+        for reading only.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        selected = ArrayPeakList(dims=self._dims)
+        if copy_extra:
+            selected._strings = list(self._strings)
+            selected._string_codes = dict(self._string_codes)
+        else:
+            selected._strings = self._strings
+            selected._string_codes = self._string_codes
+        selected._allocate(len(rows))
+        for name, arr in self._spin_data.items():
+            selected._spin_data[name][:] = arr[rows]
+        for name, arr in self._peak_data.items():
+            selected._peak_data[name][:] = arr[rows]
+        for name, arr in self._peak_present.items():
+            selected._peak_present[name][:] = arr[rows]
+        peak_extra = self._peak_extra
+        spin_extra = self._spin_extra
+        rows = rows.tolist()
+        if copy_extra:
+            selected._peak_extra = [
+                None if peak_extra[row] is None else
+                _copy_values(peak_extra[row]) for row in rows]
+            selected._spin_extra = [
+                None if spin_extra[row] is None else
+                [_copy_values(extra) for extra in spin_extra[row]]
+                for row in rows]
+        else:
+            selected._peak_extra = [peak_extra[row] for row in rows]
+            selected._spin_extra = [spin_extra[row] for row in rows]
+        selected._size = len(rows)
+        return selected
+
+    def to_arrays(self):
+        """
+        Return the contents of the peak list as a dictionary of arrays.
+
+        Spin and peak attributes with array storage are stored under
+        ``'spin_' + name`` and ``'peak_' + name``, unless no peak has them,
+        with a mask under ``'present_' + name`` for flags only some peaks
+        have, and the string table under ``'strings'``. The per-peak
+        dictionaries of other attributes are encoded as JSON into the byte
+        array ``'extra'``. The result can be saved with :func:`numpy.savez`
+        and restored with :meth:`from_arrays`.
+
+        Raises
+        ------
+        TypeError
+            If an attribute without array storage holds a value other than
+            a string, number, bool, None, list or dictionary with string
+            keys, which would not survive the JSON round trip
+        """
+        size = self._size
+        arrays = {}
+        for name, arr in self._spin_data.items():
+            if not _all_missing(arr[:size], name):
+                arrays['spin_' + name] = arr[:size]
+        for name, arr in self._peak_data.items():
+            present = self.peak_mask(name)
+            if present.any():
+                arrays['peak_' + name] = arr[:size]
+                if name in self._peak_present and not present.all():
+                    arrays['present_' + name] = present
+        arrays['strings'] = np.array(self._strings, dtype=np.str_)
+        arrays['dims'] = np.array(-1 if self._dims is None else self._dims)
+        extra = [self._peak_extra, self._spin_extra]
+        arrays['extra'] = _json_array(extra)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Create a peak list from the arrays returned by :meth:`to_arrays`.
+        """
+        dims = int(arrays['dims'])
+        peaklist = cls(dims=dims if dims >= 0 else None)
+        peak_extra, spin_extra = _from_json_array(arrays['extra'])
+        size = len(peak_extra)
+        peaklist._allocate(size)
+        for name, arr in peaklist._spin_data.items():
+            if 'spin_' + name in arrays:
+                arr[:] = arrays['spin_' + name]
+        for name, arr in peaklist._peak_data.items():
+            if 'peak_' + name in arrays:
+                arr[:] = arrays['peak_' + name]
+                if name in peaklist._peak_present:
+                    peaklist._peak_present[name][:] = arrays.get(
+                        'present_' + name, True)
+        for string in arrays['strings'].tolist():
+            peaklist._intern(str(string))
+        peaklist._peak_extra = peak_extra
+        peaklist._spin_extra = spin_extra
+        peaklist._size = size
+        return peaklist
+
+    def strings(self):
+        """Return the table of strings indexed by residue type and atom
+        codes."""
+        return tuple(self._strings)
+
+    def to_peaklist(self):
+        """Return an independent :class:`~.peaklist.PeakList` of
+        :class:`~.peaklist.Peak` objects."""
+        size = self._size
+        assignment = ArrayPeakList.STRING_FIELDS + ('res_num',)
+        peak_columns = []
+        for name, arr in self._peak_data.items():
+            values = self._column_values(arr[:size])
+            if name in self._peak_present:
+                values = [value if present else None for value, present
+                          in zip(values, self.peak_mask(name).tolist())]
+            peak_columns.append((name, values))
+        spin_columns = []
+        for dim in range(self._dims if size else 0):
+            required = [(name, self.spin_values(name, dim))
+                        for name in assignment]
+            optional = [(name, self._column_values(arr[:size, dim]))
+                        for name, arr in self._spin_data.items()
+                        if name not in assignment]
+            spin_columns.append((required, optional))
+        # Build the objects directly; the values are already normalized
+        new_spin = Spin.__new__
+        new_peak = Peak.__new__
+        peaks = []
+        for row in range(size):
+            spins = []
+            extra = self._spin_extra[row]
+            for dim, (required, optional) in enumerate(spin_columns):
+                spin = new_spin(Spin)
+                attrs = vars(spin)
+                for name, values in required:
+                    attrs[name] = values[row]
+                for name, values in optional:
+                    if values[row] is not None:
+                        attrs[name] = values[row]
+                if extra is not None:
+                    attrs.update(_copy_values(extra[dim]))
+                spins.append(spin)
+            peak = new_peak(Peak)
+            attrs = vars(peak)
+            for name, values in peak_columns:
+                if values[row] is not None:
+                    attrs[name] = values[row]
+            if self._peak_extra[row] is not None:
+                attrs.update(_copy_values(self._peak_extra[row]))
+            peak._owner = None
+            peak._spins = spins
+            for spin in spins:
+                spin._owner = peak
+            peaks.append(peak)
+        return PeakList(peaks)
+
+    @staticmethod
+    def _column_values(arr):
+        """Return a list of Python values with None for missing values."""
+        values = arr.tolist()
+        if arr.dtype == np.bool_:
+            return values
+        if arr.dtype.kind == 'f':
+            return [None if value != value else value for value in values]
+        missing = _missing_value(arr.dtype)
+        return [None if value == missing else value for value in values]
+
+
+def anchor_signatures(res_num, atom, strings):
+    """
+    Detect the spin anchors in every peak with array operations.
+
+    Each pair of dimensions is tested in every peak at once, using a table
+    of which pairs of atom names can form an anchor. The rules are the
+    same as for :attr:`~.peaklist.PeakList.anchors`: a proton and a
+    nitrogen or carbon in the same residue with matching positions, and
+    peaks with overlapping anchors are ignored.
+
+    Parameters
+    ----------
+    res_num : array of int, shape (num_peaks, dims)
+        Residue numbers, :data:`MISSING_INT` for None
+    atom : array of int, shape (num_peaks, dims)
+        Atom names as codes into ``strings``, -1 for None
+    strings : list of str
+        Table of strings indexed by the atom codes
+
+    Returns
+    -------
+    signatures : array of int, shape (num_peaks,)
+        A code for the anchors found in each peak
+    decode : dict
+        Maps each signature to the tuple of anchors it represents
+    """
+    num_peaks, dims = atom.shape
+    pairs = list(combinations(range(dims), 2))
+    forward, backward = _anchor_pair_tables(strings)
+    assigned = (atom >= 0) & (res_num != MISSING_INT)
+    found = np.zeros((num_peaks, len(pairs)), dtype=np.int64)
+    for p, (i, j) in enumerate(pairs):
+        same_res = assigned[:, i] & assigned[:, j]
+        same_res &= res_num[:, i] == res_num[:, j]
+        found[:, p] = np.where(forward[atom[:, i], atom[:, j]], 1, 0)
+        found[:, p] += np.where(backward[atom[:, i], atom[:, j]], 2, 0)
+        found[:, p] *= same_res
+    # Ignore peaks with more than one anchor sharing a dimension
+    count = np.count_nonzero(found, axis=1)
+    for d in range(dims):
+        has_dim = [p for p, pair in enumerate(pairs) if d in pair]
+        in_all = np.count_nonzero(found[:, has_dim], axis=1) == count
+        found[(count > 1) & in_all] = 0
+    signatures = np.zeros(num_peaks, dtype=np.int64)
+    for p in range(len(pairs)):
+        signatures += found[:, p] * 3 ** p
+    decode = {}
+    for signature in np.unique(signatures).tolist():
+        anchors = []
+        for p, pair in enumerate(pairs):
+            code = signature // 3 ** p % 3
+            if code:
+                anchors.append(pair if code == 1 else pair[::-1])
+        decode[signature] = tuple(anchors)
+    return signatures, decode
+
+
+def _anchor_pair_tables(strings):
+    """
+    Tabulate which pairs of atom names form an anchor.
+
+    Return two boolean tables indexed by atom codes, with a final row and
+    column for None (code -1). ``forward[a, b]`` is True when the proton is
+    atom ``a`` and ``backward[a, b]`` when the proton is atom ``b``.
+    """
+    size = len(strings) + 1
+    forward = np.zeros((size, size), dtype=np.bool_)
+    backward = np.zeros((size, size), dtype=np.bool_)
+    protons = [(c, s[1:]) for c, s in enumerate(strings) if s[:1] == 'H']
+    heavy = [(c, s[0], s[1:]) for c, s in enumerate(strings)
+             if s[:1] in ('N', 'C')]
+    for h_code, h_position in protons:
+        for x_code, element, x_position in heavy:
+            same_position = all(a == b for a, b in zip(h_position, x_position))
+            if not same_position:
+                continue
+            if '' in (h_position, x_position) and element != 'N':
+                # Of 'H', 'N' and 'C', only the amide proton anchor is valid
+                continue
+            forward[h_code, x_code] = True
+            backward[x_code, h_code] = True
+    return forward, backward
+
+
+def encode_assignments(peaklist):
+    """
+    Encode the residue numbers and atom names of any peak list as arrays.
+
+    Return the ``res_num`` and ``atom`` arrays and string table expected
+    by :func:`anchor_signatures`.
+    """
+    if isinstance(peaklist, ArrayPeakList):
+        return (peaklist.spin_array('res_num'), peaklist.spin_array('atom'),
+                peaklist._strings)
+    strings = []
+    codes = {None: -1}
+    res_nums = []
+    atoms = []
+    for peak in peaklist:
+        for spin in peak:
+            res_num = spin.res_num
+            res_nums.append(MISSING_INT if res_num is None else res_num)
+            atom = spin.atom
+            try:
+                atoms.append(codes[atom])
+            except KeyError:
+                codes[atom] = len(strings)
+                atoms.append(len(strings))
+                strings.append(atom)
+    shape = (len(peaklist), peaklist.dims)
+    res_num = np.array(res_nums, dtype=np.int32).reshape(shape)
+    atom = np.array(atoms, dtype=np.int32).reshape(shape)
+    return res_num, atom, strings
+
+
+def _rank_table(values):
+    """
+    Return the rank of each value among the distinct values, followed by a
+    final rank for None that sorts after all others.
+    """
+    distinct = sorted(set(value for value in values if value is not None))
+    ranks = dict((value, rank) for rank, value in enumerate(distinct))
+    none_rank = len(distinct)
+    table = [ranks.get(value, none_rank) for value in values] + [none_rank]
+    return np.array(table, dtype=np.int64)
+
+
+def _expand(values, index):
+    """Return a list of Python values, looked up in a table if indexed."""
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    if index is not None:
+        return [values[i] for i in np.ravel(index).tolist()]
+    return values
+
+
+def pack_peaklist(peaklist):
+    """
+    Convert a peak list to a compact dictionary of arrays
+
+    The arrays are those of :meth:`ArrayPeakList.to_arrays`, plus the flag
+    ``'columnar'`` recording whether the peak list was an ArrayPeakList.
+    They can be pickled or saved with :func:`numpy.savez` much more cheaply
+    than a graph of Peak and Spin objects.
+
+    Parameters
+    ----------
+    peaklist : :class:`~.peaklist.PeakList`
+
+    Returns
+    -------
+    arrays : dict or None
+        None if the peak list can't be stored as an ArrayPeakList, for
+        example because its peaks have different numbers of spins
+    """
+    columnar = isinstance(peaklist, ArrayPeakList)
+    try:
+        arrays = (peaklist if columnar else
+                  ArrayPeakList(peaklist)).to_arrays()
+    except (ValueError, TypeError):
+        return None
+    arrays['columnar'] = np.array(columnar)
+    return arrays
+
+
+def unpack_peaklist(arrays):
+    """
+    Restore a peak list from the arrays returned by :func:`pack_peaklist`
+
+    Returns
+    -------
+    peaklist : :class:`~.peaklist.PeakList`
+        An ArrayPeakList if one was packed, otherwise a PeakList
+    """
+    arrays = dict(arrays)
+    columnar = bool(arrays.pop('columnar'))
+    peaklist = ArrayPeakList.from_arrays(arrays)
+    return peaklist if columnar else peaklist.to_peaklist()
+
+
+try:
+    _JSON_STRINGS = (str, unicode)
+    _JSON_SCALARS = (bool, int, long, float, str, unicode)
+except NameError:
+    _JSON_STRINGS = (str,)
+    _JSON_SCALARS = (bool, int, float, str)
+
+
+def _json_array(obj):
+    """Encode an object as JSON into an array of bytes."""
+    _check_json(obj)
+    text = json.dumps(obj, separators=(',', ':'))
+    return np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+
+
+def _from_json_array(arr):
+    """Restore an object encoded by :func:`_json_array`."""
+    return json.loads(arr.tobytes().decode('utf-8'))
+
+
+def _check_json(obj):
+    """
+    Raise TypeError unless an object is restored unchanged from JSON
+
+    Tuples, for example, would come back as lists.
+    """
+    if isinstance(obj, _JSON_SCALARS) or obj is None:
+        return
+    if isinstance(obj, list):
+        for value in obj:
+            _check_json(value)
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            if not isinstance(key, _JSON_STRINGS):
+                raise TypeError('non-string key {!r}'.format(key))
+            _check_json(value)
+    else:
+        raise TypeError('{!r} is not stored as JSON'.format(obj))
+
+
+def _any_missing(arr):
+    """Return True if any element of an array is a missing value."""
+    if arr.dtype == np.bool_:
+        return False
+    return bool(_missing_mask(arr).any())
+
+
+def _missing_mask(arr):
+    """Return a mask of the missing values in an array of numbers."""
+    if arr.dtype == np.bool_:
+        return np.zeros(arr.shape, dtype=np.bool_)
+    if arr.dtype.kind == 'f':
+        return np.isnan(arr)
+    return arr == _missing_value(arr.dtype)
+
+
+def _all_missing(arr, name=None):
+    """Return True if every element of an array is a missing value."""
+    if arr.dtype.kind == 'f':
+        return bool(np.isnan(arr).all())
+    return bool((arr == _missing_value(arr.dtype, name)).all())
+
+
+def _missing_value(dtype, name=None):
+    if name in ArrayPeakList.STRING_FIELDS:
+        return -1  # Code for None in the string table
+    if dtype == np.bool_:
+        return False
+    if np.issubdtype(dtype, np.integer):
+        return MISSING_INT
+    return np.nan
+
+
+def _missing_array(shape, dtype, name=None):
+    return np.full(shape, _missing_value(np.dtype(dtype), name), dtype=dtype)
+
+
+def _to_python(value):
+    """Convert a NumPy scalar to a Python value, or None if missing."""
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return None if value == MISSING_INT else int(value)
+    value = float(value)
+    return None if value != value else value
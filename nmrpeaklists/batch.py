@@ -0,0 +1,101 @@
+"""
+Functions
+---------
+
+Read many peak list files in parallel. Each file is parsed in a worker
+process, and the peak list is sent back as the compact arrays of
+:func:`~.arrays.pack_peaklist` rather than as a pickled graph of
+:class:`~.peaklist.Peak` and :class:`~.peaklist.Spin` objects.
+
+Documentation
+-------------
+
+"""
+from __future__ import division, absolute_import, print_function
+import multiprocessing
+from .arrays import ArrayPeakList, pack_peaklist, unpack_peaklist
+from .peaklist import PeakList
+
+
+__all__ = ['read_many']
+
+
+def read_many(paths, reader, workers=None, merge=False, add_unknown=True):
+    """
+    Read many peak list files with a pool of worker processes
+
+    Each file is read with a copy of the reader, as if by
+    ``reader.read_peaklist(path, add_unknown)``. Afterwards, the reader is
+    left in the state it would have after reading the last file serially.
+
+    Parameters
+    ----------
+    paths : list of str
+        Peak list files to read
+    reader : :class:`~.files.PeakListFile`
+        Reader for the files, such as ``XeasyFile()``
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs. With
+        one worker, or a single file, the files are read in this process.
+    merge : bool, optional
+        If True, return a single peak list with the peaks of every file
+    add_unknown : bool, optional
+        Read columns that are not in the template as peak attributes
+
+    Returns
+    -------
+    peaklists : list of :class:`~.peaklist.PeakList` or PeakList
+        One peak list per file, in the order of ``paths``, or the merged
+        peak list if ``merge`` is True
+
+    Examples
+    --------
+    >>> peaklist = read_many(glob('*.peaks'), XeasyFile(), merge=True)
+    """
+    paths = list(paths)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(paths))
+    if workers > 1:
+        tasks = [(reader, path, add_unknown) for path in paths]
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(_read_packed, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        peaklists = []
+        for packed, state in results:
+            peaklists.append(packed if isinstance(packed, PeakList) else
+                             unpack_peaklist(packed))
+        vars(reader).update(state)
+    else:
+        peaklists = [reader.read_peaklist(path, add_unknown)
+                     for path in paths]
+    if merge:
+        return _merge(peaklists)
+    return peaklists
+
+
+def _read_packed(task):
+    """Read a peak list in a worker process and pack it for transfer."""
+    reader, path, add_unknown = task
+    peaklist = reader.read_peaklist(path, add_unknown)
+    packed = pack_peaklist(peaklist)
+    return (peaklist if packed is None else packed), vars(reader)
+
+
+def _merge(peaklists):
+    """Concatenate peak lists, keeping columnar storage if all are
+    columnar."""
+    if peaklists and all(isinstance(peaklist, ArrayPeakList)
+                         for peaklist in peaklists):
+        merged = ArrayPeakList()
+    else:
+        merged = PeakList()
+    for peaklist in peaklists:
+        if (isinstance(peaklist, ArrayPeakList) and
+                not isinstance(merged, ArrayPeakList)):
+            peaklist = peaklist.to_peaklist()
+        merged.extend(peaklist)
+    return merged
@@ -0,0 +1,239 @@
+"""
+Classes
+-------
+
+:class:`PeakListCache` objects store parsed peak lists in a directory of
+binary .npz files, so that a peak list file that has not changed since it
+was last read can be loaded without parsing the text again.
+
+Set the ``NMRPEAKLISTS_CACHE`` environment variable to a directory to
+cache every call to :meth:`~.files.PeakListFile.read_peaklist`.
+
+Documentation
+-------------
+
+"""
+from __future__ import division, absolute_import, print_function
+import os
+import time
+import hashlib
+import tempfile
+
+
+__all__ = ['PeakListCache', 'default_cache']
+
+
+CACHE_ENV = 'NMRPEAKLISTS_CACHE'
+CACHE_VERSION = '2'
+# Files modified more recently than this many seconds ago may change again
+# without a change to their size or modification time
+MTIME_RESOLUTION = 2.0
+
+
+class PeakListCache(object):
+    """
+    A size-bounded directory of parsed peak lists
+
+    Each entry holds the arrays of an :class:`~.arrays.ArrayPeakList`
+    along with the header of the file, from which the state of the reader
+    after parsing, such as its resolved template, is rebuilt. Entries hold
+    no pickled objects, so loading one can't run code. Entries are keyed
+    on the absolute path, size and modification time of the peak list
+    file, and on the reader and its settings. The contents of the file are
+    hashed only if it was modified too recently for its modification time
+    to tell later changes apart. When the directory grows beyond
+    ``max_size`` bytes, the least recently used entries are removed.
+
+    Parameters
+    ----------
+    directory : str
+        Directory in which to store the entries. It is created if needed.
+    max_size : int, optional
+        Maximum total size of the entries in bytes
+
+    Examples
+    --------
+    >>> cache = PeakListCache('~/.cache/nmrpeaklists')
+    >>> peaklist = PipeFile().read_peaklist('fit.tab', cache=cache)
+    """
+    def __init__(self, directory, max_size=256 * 2**20):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+
+    def __repr__(self):
+        rpr = '{}({!r}, max_size={!r})'.format(type(self).__name__,
+                                               self.directory, self.max_size)
+        return rpr
+
+    def key(self, reader, filename, add_unknown=True, columns=None,
+            where=None):
+        """
+        Return the cache key for reading a file with a reader
+
+        Parameters
+        ----------
+        reader : :class:`~.files.PeakListFile`
+            Reader, in the state it will be in when reading the file
+        filename : str
+            Peak list file
+        add_unknown : bool, optional
+            Argument passed to the reader
+        columns : list of str, optional
+            Argument passed to the reader
+        where : :class:`~.predicates.Predicate`, optional
+            Argument passed to the reader
+
+        Returns
+        -------
+        key : str
+        """
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        # The template is not always an argument shown by repr(reader)
+        parts = [CACHE_VERSION, path, str(stat.st_size), repr(stat.st_mtime),
+                 type(reader).__name__, repr(reader),
+                 repr(reader.template._signature()), repr(add_unknown)]
+        if abs(time.time() - stat.st_mtime) < MTIME_RESOLUTION:
+            digest = hashlib.sha1()
+            with open(path, 'rb') as plf:
+                for block in iter(lambda: plf.read(2**20), b''):
+                    digest.update(block)
+            parts.append(digest.hexdigest())
+        if columns is not None:
+            parts.append(repr(sorted(columns)))
+        if where is not None:
+            parts.append(repr(where))
+        return hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def entry(self, key):
+        """Return the path of the entry for a key."""
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key, reader):
+        """
+        Load a peak list from the cache
+
+        Restore the state of the reader as it was after parsing the file,
+        by reading the cached header of the file again.
+
+        Parameters
+        ----------
+        key : str
+            Key from :meth:`key`
+        reader : :class:`~.files.PeakListFile`
+            Reader to restore
+
+        Returns
+        -------
+        peaklist : :class:`~.peaklist.PeakList` or None
+            The cached peak list, of the same type as originally read, or
+            None if the key is not in the cache
+        """
+        import numpy as np
+        from .arrays import unpack_peaklist, _from_json_array
+        path = self.entry(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = dict(npz.items())
+            state = _from_json_array(arrays.pop('state'))
+            peaklist = unpack_peaklist(arrays)
+            _, names, formats = reader.read_header(state['header'])
+            reader._resolve_header(names, formats, state['add_unknown'],
+                                   state['columns'])
+        except (IOError, OSError):
+            return None
+        except Exception:
+            # A damaged entry is treated as a miss and replaced
+            self._remove(path)
+            return None
+        try:
+            os.utime(path, None)  # Mark as recently used
+        except OSError:
+            pass
+        return peaklist
+
+    def store(self, key, peaklist, header, add_unknown=True, columns=None):
+        """
+        Add a peak list and the header of its file to the cache
+
+        Peak lists that can't be stored as an
+        :class:`~.arrays.ArrayPeakList`, for example because their peaks
+        have different numbers of spins, are not cached.
+
+        Parameters
+        ----------
+        key : str
+            Key from :meth:`key`
+        peaklist : :class:`~.peaklist.PeakList`
+            Peak list to store
+        header : list of str
+            Header lines of the file, as returned by
+            :meth:`~.files.PeakListFile.split_header`
+        add_unknown : bool, optional
+            Argument passed to the reader
+        columns : list of str, optional
+            Argument passed to the reader
+        """
+        import numpy as np
+        from .arrays import pack_peaklist, _json_array
+        arrays = pack_peaklist(peaklist)
+        if arrays is None:
+            return
+        state = {'header': list(header), 'add_unknown': bool(add_unknown),
+                 'columns': None if columns is None else list(columns)}
+        arrays['state'] = _json_array(state)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        handle, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as npz:
+                np.savez(npz, **arrays)
+            os.rename(temp, self.entry(key))
+        except Exception:
+            self._remove(temp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits
+        within its maximum size."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.npz'):
+                    self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def default_cache():
+    """
+    Return the cache named by the ``NMRPEAKLISTS_CACHE`` environment
+    variable, or None if it is not set.
+    """
+    directory = os.environ.get(CACHE_ENV)
+    return PeakListCache(directory) if directory else None
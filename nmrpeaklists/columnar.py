@@ -0,0 +1,204 @@
+"""
+Functions
+---------
+
+Bulk parsing of peak list data sections with NumPy. The column formats
+given in a peak list header determine a structured dtype, the whole data
+section is converted in one call, and the resulting columns are copied
+directly into the arrays of an :class:`~.arrays.ArrayPeakList`.
+
+Documentation
+-------------
+
+"""
+from __future__ import division, absolute_import, print_function
+try:
+    from itertools import izip as zip
+except ImportError:
+    pass
+import numpy as np
+from .arrays import ArrayPeakList
+from .columns import (PeakAttrColumn, SpinAttrColumn, PipeAnchorColumn,
+                      SparkyNameColumn)
+from .peaklist import get_empty_peaklist
+from .predicates import COMMENTED
+
+
+__all__ = ['format_dtype', 'parse_table', 'read_columnar']
+
+
+FORMAT_DTYPES = {'d': np.int64, 'e': np.float64, 'f': np.float64,
+                 's': object}
+
+# Columns whose set_string result depends only on the string, so that each
+# distinct string needs to be parsed only once
+DISTINCT_STRING_COLUMNS = (SpinAttrColumn, PipeAnchorColumn, SparkyNameColumn)
+
+
+def format_dtype(names, formats):
+    """
+    Map peak list column names and printf-style formats to a NumPy dtype
+
+    Parameters
+    ----------
+    names : list of str
+        Column names
+    formats : list of str
+        printf-style format string of each column
+
+    Returns
+    -------
+    dtype : :class:`numpy.dtype`
+        Structured dtype with one field per column. Integer and float
+        columns are typed, string columns are Python objects.
+
+    Raises
+    ------
+    ValueError
+        If a format is not one of the types understood by
+        :class:`~.columns.Column`
+    """
+    fields = []
+    for name, fmt in zip(names, formats):
+        try:
+            fields.append((name, FORMAT_DTYPES[fmt[-1]]))
+        except (KeyError, IndexError, TypeError):
+            err = 'invalid format string {!r}'.format(fmt)
+            raise ValueError(err)
+    return np.dtype(fields)
+
+
+def parse_table(lines, names, formats, usecols=None):
+    """
+    Parse the data section of a peak list in a single vectorized call
+
+    Parameters
+    ----------
+    lines : list of str
+        Data lines, one peak per line. Lines starting with '#' are commented
+        peaks.
+    names : list of str
+        Column names
+    formats : list of str
+        printf-style format string of each column
+    usecols : list of int, optional
+        Indices of the columns to parse. Other columns are skipped without
+        being converted.
+
+    Returns
+    -------
+    commented : array of bool
+        Whether each peak is commented
+    data : structured array
+        One field per parsed column, as given by :func:`format_dtype`
+
+    Raises
+    ------
+    ValueError
+        If any line does not match the columns of the header
+    """
+    if usecols is not None:
+        names = [names[i] for i in usecols]
+        formats = [formats[i] for i in usecols]
+    dtype = format_dtype(names, formats)
+    lines = [line.strip() for line in lines]
+    commented = np.array([line.startswith('#') for line in lines],
+                         dtype=np.bool_)
+    lines = [line.lstrip(' #') for line in lines]
+    data = np.loadtxt(lines, dtype=dtype, comments=None, ndmin=1,
+                      usecols=usecols)
+    return commented, data
+
+
+def read_columnar(lines, num_dims, names, formats, resolved, where=None):
+    """
+    Read the data section of a peak list into an ArrayPeakList
+
+    Typed columns mapped to array storage are copied in bulk. String
+    columns, such as assignment names, are passed to
+    :meth:`~.columns.Column.set_string` once per distinct string, and the
+    resulting attributes are copied in bulk. Ignored columns are not
+    parsed. A predicate is evaluated on the parsed columns, and only the
+    rows it selects are copied into the peak list.
+
+    Parameters
+    ----------
+    lines : list of str
+        Data lines, one peak per line
+    num_dims : int
+        Number of spins in each peak
+    names : list of str
+        Column names from the header
+    formats : list of str
+        Column formats from the header
+    resolved : list of Column objects
+        Column for each name, or None to ignore the column
+    where : :class:`~.predicates.Predicate`, optional
+        Keep only the rows for which the predicate is true
+
+    Returns
+    -------
+    peaklist : :class:`~.arrays.ArrayPeakList`
+
+    Raises
+    ------
+    ValueError
+        If the data section can't be parsed with the header formats
+    """
+    used = set(where.names) if where is not None else set()
+    usecols = [i for i, (name, column) in enumerate(zip(names, resolved))
+               if column is not None or name in used]
+    if len(usecols) == len(names):
+        usecols = None
+    commented, data = parse_table(lines, names, formats, usecols)
+    if where is not None:
+        values = dict((name, data[name]) for name in where.names)
+        values[COMMENTED] = commented
+        mask = where.mask(values)
+        commented = commented[mask]
+        data = data[mask]
+    peaklist = ArrayPeakList.empty(len(data), num_dims)
+    peaklist.set_peak_column('commented', commented)
+    for name, column in zip(names, resolved):
+        if column is None:
+            continue
+        values = data[name]
+        fmt = column.fmt
+        if values.dtype == object or fmt is None or fmt[-1] == 's':
+            if isinstance(column, DISTINCT_STRING_COLUMNS):
+                _set_distinct_strings(peaklist, column, values)
+            else:
+                for peak, string in zip(peaklist, values.tolist()):
+                    column.set_string(peak, string)
+        elif type(column) is SpinAttrColumn:
+            peaklist.set_spin_column(column.attr, column.index, values)
+        elif type(column) is PeakAttrColumn:
+            peaklist.set_peak_column(column.attr, values)
+        else:
+            for peak, value in zip(peaklist, values.tolist()):
+                column.set_value(peak, value)
+    return peaklist
+
+
+def _set_distinct_strings(peaklist, column, strings):
+    """
+    Set a string column by parsing each distinct string once
+
+    Apply the column to one scratch peak per distinct string, then copy
+    each attribute it set to every peak with that string.
+    """
+    distinct, index = np.unique(strings, return_inverse=True)
+    scratch = get_empty_peaklist(len(distinct), peaklist.dims)
+    for peak, string in zip(scratch, distinct.tolist()):
+        column.set_string(peak, string)
+    attrs = set(attr for peak in scratch for attr in peak._attrs())
+    for attr in attrs:
+        table = [getattr(peak, attr, None) for peak in scratch]
+        if any(value is not None for value in table):
+            peaklist.set_peak_column(attr, table, index)
+    for dim, spins in enumerate(zip(*scratch)):
+        attrs = set(attr for spin in spins for attr in spin._attrs())
+        for attr in attrs:
+            table = [getattr(spin, attr, None) for spin in spins]
+            if any(value is not None for value in table):
+                peaklist.set_spin_column(attr, dim, table, index)
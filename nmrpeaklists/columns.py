@@ -5,22 +5,28 @@ try:
     from itertools import izip as zip
     from itertools import izip_longest as zip_longest
 except ImportError:
-    pass
+    from itertools import zip_longest
 import re
 from sys import stderr
 from inspect import getargspec
-from copy import deepcopy
 from itertools import permutations
-from collections import Iterable, MutableSequence
-from .utils import ANCHOR_NAME_PATTERN, AA_1TO3, AA_3TO1
+from collections import Iterable, MutableSequence, OrderedDict
+from .peaklist import _is_array_peaklist
+from .utils import ANCHOR_NAME_PATTERN, AA_1TO3, AA_3TO1, FORMAT_STRING_PATTERN
 
 
 __all__ = ['Column', 'IgnoreColumn', 'PeakAttrColumn', 'PeakAttrListColumn',
            'SpinAttrColumn', 'Res3LetterColumn', 'PipeNameColumn',
            'PipeAnchorColumn', 'SparkyNameColumn', 'ColumnGroup',
            'PeakAttrListGroup', 'SpinAttrGroup', 'PipeNameGroup',
-           'ColumnTemplate', 'PipeTemplate', 'SparkyTemplate', 'UplTemplate',
-           'XeasyTemplate']
+           'ColumnTemplate', 'RowCodec', 'PipeTemplate', 'SparkyTemplate',
+           'UplTemplate', 'XeasyTemplate']
+
+
+# Resolved columns and codecs of recently read headers, keyed by the columns
+# of the template and the header. See ColumnTemplate.compile_header.
+RESOLUTION_CACHE_SIZE = 128
+_RESOLUTIONS = OrderedDict()
 
 
 class Column(object):
@@ -52,6 +58,37 @@ class Column(object):
         rpr = name + '(' + ', '.join(pairs) + ')'
         return rpr
 
+    def __eq__(self, other):
+        return type(self) is type(other) and vars(self) == vars(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def clone(self, **changes):
+        """
+        Return a copy of the column, with some attributes changed
+
+        The attributes of a column, such as its name, format string and
+        peak attribute, are immutable values, so they are shared with the
+        copy instead of being deep copied.
+
+        Parameters
+        ----------
+        **changes
+            New values of attributes of the copy, such as ``fmt``
+
+        Returns
+        -------
+        column : Column
+        """
+        column = type(self).__new__(type(self))
+        vars(column).update(vars(self))
+        for key, val in changes.items():
+            setattr(column, key, val)
+        return column
+
     def get_value(self, peak, default=_sentinel):
         """
         get_value(peak[, default])
@@ -113,6 +150,41 @@ class Column(object):
         """
         return self.fmt % self.get_value(peak)
 
+    def get_values(self, peaks):
+        """
+        Get the column data from a sequence of Peak objects
+
+        Parameters
+        ----------
+        peaks : :class:`~.peaklist.PeakList` or list of Peak objects
+            Peaks containing the corresponding column data
+
+        Returns
+        -------
+        values : list
+            The column value taken from each Peak object
+        """
+        return [self.get_value(peak) for peak in peaks]
+
+    def get_strings(self, peaks):
+        """
+        Get column data from a sequence of Peak objects as formatted strings
+
+        Format the whole column at once. The strings are identical to those
+        returned by :meth:`get_string` for each peak.
+
+        Parameters
+        ----------
+        peaks : :class:`~.peaklist.PeakList` or list of Peak objects
+            Peaks containing the corresponding column data
+
+        Returns
+        -------
+        strings : list of str
+            A formatted string of the column data for each Peak object
+        """
+        return format_values(self.fmt, self.get_values(peaks))
+
     def set_string(self, peak, string):
         """
         Set the appropriate value in a Peak object from a formatted string
@@ -141,6 +213,34 @@ class Column(object):
         return self
 
 
+def format_values(fmt, values):
+    """
+    Format a sequence of values with a printf-style format string
+
+    Numeric columns are formatted with a single ``%`` operation on a
+    repeated format string, rather than one operation per value. The
+    result is identical to ``[fmt % value for value in values]``.
+
+    Parameters
+    ----------
+    fmt : str
+        printf-style format string for a single value
+    values : sequence
+        Values to format
+
+    Returns
+    -------
+    strings : list of str
+    """
+    values = tuple(values)
+    match = re.match(FORMAT_STRING_PATTERN, fmt) if fmt else None
+    if not values or match is None or match.group(3) == 's':
+        return [fmt % value for value in values]
+    # Numeric formats never produce newlines, so they can separate values
+    block = '\n'.join([fmt] * len(values)) % values
+    return block.split('\n')
+
+
 class IgnoreColumn(Column):
     """
     """
@@ -158,6 +258,9 @@ class IgnoreColumn(Column):
     def get_string(self, peak):
         return self.string
 
+    def get_strings(self, peaks):
+        return [self.string] * len(peaks)
+
     def set_string(self, peak, string):
         pass
 
@@ -180,6 +283,11 @@ class PeakAttrColumn(Column):
         else:
             return value
 
+    def get_values(self, peaks):
+        if _is_array_peaklist(peaks):
+            return peaks.peak_values(self.attr)
+        return [getattr(peak, self.attr) for peak in peaks]
+
     def set_value(self, peak, value):
         setattr(peak, self.attr, value)
 
@@ -204,6 +312,11 @@ class PeakAttrListColumn(Column):
         else:
             return value
 
+    def get_values(self, peaks):
+        attr = self.attr
+        index = self.index
+        return [getattr(peak, attr)[index] for peak in peaks]
+
     def set_value(self, peak, value):
         try:
             getattr(peak, self.attr)[self.index] = value
@@ -237,6 +350,11 @@ class SpinAttrColumn(Column):
         else:
             return value
 
+    def get_values(self, peaks):
+        if _is_array_peaklist(peaks):
+            return peaks.spin_values(self.attr, self.index)
+        return [getattr(peak[self.index], self.attr) for peak in peaks]
+
     def set_value(self, peak, value):
         setattr(peak[self.index], self.attr, value)
 
@@ -259,6 +377,9 @@ class Res3LetterColumn(SpinAttrColumn):
             raise ValueError(err)
         return string
 
+    def get_strings(self, peaks):
+        return [self.get_string(peak) for peak in peaks]
+
     def set_string(self, peak, string):
         try:
             value = AA_3TO1[string]
@@ -310,6 +431,9 @@ class PipeNameColumn(SpinAttrColumn):
         string = (' ' * pad_left) + value + (' ' * pad_right)
         return string
 
+    def get_strings(self, peaks):
+        return [self.get_string(peak) for peak in peaks]
+
     def update_from_peaklist(self, peaklist):
         spins = [peak[self.index] for peak in peaklist]
         self.res_width = max(len(spin.res_name) for spin in spins)
@@ -372,6 +496,9 @@ class PipeAnchorColumn(Column):
         string = (' ' * pad_left) + value + (' ' * pad_right)
         return string
 
+    def get_strings(self, peaks):
+        return [self.get_string(peak) for peak in peaks]
+
     def update_from_peaklist(self, peaklist):
         dims = [dim for dim in zip(*peaklist)]
         dims = [dims[i] for i in self.indices]
@@ -579,20 +706,128 @@ class ColumnTemplate(MutableSequence):
     def sort(self, **kwargs):
         self._columns.sort(**kwargs)
 
-    def resolve_from_header(self, names, formats, add_unknown=True):
+    def compile(self):
+        """
+        Compile a resolved template into a :class:`RowCodec`
+
+        The template must contain only Column objects, in the order of the
+        fields in each row. None entries mark fields to ignore when parsing.
+
+        Returns
+        -------
+        codec : :class:`RowCodec`
+        """
+        return RowCodec(self._columns)
+
+    def resolve_from_header(self, names, formats, add_unknown=True,
+                            columns=None):
+        """
+        Resolve the template from the column names and formats of a header
+
+        Parameters
+        ----------
+        names, formats : sequence of str
+            Column names and formats of the header
+        add_unknown : bool, optional
+            Resolve columns that are not in the template as peak attributes
+        columns : sequence of str, optional
+            Names of the columns to resolve. Other columns are None.
+
+        Returns
+        -------
+        resolved : list
+            A Column, or None for a column that is not read, for each name
+
+        Raises
+        ------
+        ValueError
+            If a name in ``columns`` is not in ``names``
+
+        See Also
+        --------
+        compile_header
+        """
+        entry = self._resolution(names, formats, add_unknown, columns)
+        return _clone_columns(entry[0])
+
+    def compile_header(self, names, formats, add_unknown=True, columns=None):
+        """
+        Resolve the template from a header and compile a :class:`RowCodec`
+
+        Resolutions are cached, keyed by the type and the columns of the
+        template, the header and the other arguments, so that reading many
+        files with the same header resolves the template and compiles the
+        codec only once. Templates with equal columns, such as those of
+        new readers of the same class, share the cache. The cache holds
+        prototype columns, and each call returns copies of them, so the
+        resolved columns may be changed freely.
+
+        Parameters
+        ----------
+        names, formats, add_unknown, columns
+            As for :meth:`resolve_from_header`
+
+        Returns
+        -------
+        resolved : list
+            As for :meth:`resolve_from_header`
+        codec : :class:`RowCodec`
+        """
+        entry = self._resolution(names, formats, add_unknown, columns)
+        if entry[1] is None:
+            entry[1] = RowCodec(entry[0])
+        return _clone_columns(entry[0]), entry[1]
+
+    def _resolution(self, names, formats, add_unknown, columns):
+        """Return the cached ``[resolved, codec]`` entry for a header."""
+        names = tuple(names)
+        formats = tuple(formats)
+        if columns is not None:
+            columns = frozenset(columns)
+        try:
+            key = (self._signature(), names, formats, bool(add_unknown),
+                   columns)
+            entry = _RESOLUTIONS.get(key)
+        except TypeError:
+            # A column has an unhashable attribute, so don't cache
+            key = entry = None
+        if entry is None:
+            resolved = self._resolve_header(names, formats, add_unknown,
+                                            columns)
+            entry = [resolved, None]
+            if key is not None:
+                if len(_RESOLUTIONS) >= RESOLUTION_CACHE_SIZE:
+                    _RESOLUTIONS.popitem(last=False)
+                _RESOLUTIONS[key] = entry
+        return entry
+
+    def _signature(self):
+        """Return a hashable description of the columns of the template."""
+        return (type(self),) + tuple(
+            (type(column), tuple(sorted(vars(column).items())))
+            for column in self._columns)
+
+    def _resolve_header(self, names, formats, add_unknown, columns):
+        if columns is not None:
+            missing = columns.difference(names)
+            if missing:
+                err = 'columns not in the peak list: {}'
+                raise ValueError(err.format(', '.join(sorted(missing))))
         column_map = {}
         for column in self:
             if isinstance(column, Column):
-                column_map[column.name] = deepcopy(column)
+                column_map[column.name] = column
             elif isinstance(column, ColumnGroup):
-                columns = column.resolve_from_names(names)
-                column_map.update({column.name: column for column in columns})
+                group = column.resolve_from_names(names)
+                column_map.update({column.name: column for column in group})
         resolved = []
         for name, fmt in zip(names, formats):
-            if name in column_map:
-                column = column_map[name]
-                column.fmt = fmt
-                resolved.append(column)
+            if columns is not None and name not in columns:
+                resolved.append(None)
+            elif name in column_map:
+                # Resolve to a copy, so that changing the resolved column
+                # leaves the template unchanged
+                resolved.append(column_map[name].clone(fmt=fmt))
             elif add_unknown:
                 column = PeakAttrColumn(name, fmt, name)
                 resolved.append(column)
@@ -615,7 +850,9 @@ class ColumnTemplate(MutableSequence):
                         print(warn, file=stderr)
                     continue
                 else:
-                    resolved.append(deepcopy(column))
+                    # Copy the column, since update_from_peaklist may
+                    # change it
+                    resolved.append(column.clone())
             elif isinstance(column, ColumnGroup):
                 columns = column.resolve_from_peaklist(peaklist)
                 resolved.extend(columns)
@@ -623,6 +860,164 @@ class ColumnTemplate(MutableSequence):
         return resolved
 
 
+class RowCodec(object):
+    """
+    Parse and format peak list rows for a fixed sequence of columns
+
+    The dispatch from each column to its peak attribute is worked out once,
+    rather than for every cell. Rows are parsed with a list of
+    ``(index, converter, setter)`` triples, and formatted with a single
+    format string covering the whole row. Use
+    :meth:`ColumnTemplate.compile` to create a codec.
+
+    Parameters
+    ----------
+    columns : list of Column objects
+        Columns in the order of the fields in each row. None entries mark
+        fields to ignore when parsing.
+    """
+    def __init__(self, columns):
+        self.columns = list(columns)
+        for column in self.columns:
+            if column is not None and not isinstance(column, Column):
+                err = 'template must be resolved: {!r}'.format(column)
+                raise TypeError(err)
+        self.parsers = []
+        self.lists = {}
+        for index, column in enumerate(self.columns):
+            if column is not None:
+                self._add_parser(index, column)
+        self.row_format, self.getters = self._row_format()
+
+    def __repr__(self):
+        return type(self).__name__ + '(' + repr(self.columns) + ')'
+
+    def _add_parser(self, index, column):
+        if isinstance(column, IgnoreColumn):
+            return
+        if _overrides(column, 'set_string', Column):
+            self.parsers.append((index, _identity, column.set_string))
+            return
+        converter = _identity
+        if column.fmt is not None:
+            try:
+                converter = Column.types[column.fmt[-1]]
+            except KeyError:
+                err = 'invalid format string {!r}'.format(column.fmt)
+                raise AttributeError(err)
+        if not _overrides(column, 'set_value', PeakAttrColumn):
+            setter = _peak_setter(column.attr)
+        elif not _overrides(column, 'set_value', SpinAttrColumn):
+            setter = _spin_setter(column.attr, column.index)
+        elif not _overrides(column, 'set_value', PeakAttrListColumn):
+            length = max(self.lists.get(column.attr, 0), column.length)
+            self.lists[column.attr] = length
+            setter = _list_setter(column.attr, column.index)
+        else:
+            setter = column.set_value
+        self.parsers.append((index, converter, setter))
+
+    def _row_format(self):
+        formats = []
+        getters = []
+        for column in self.columns:
+            if column is None:
+                continue
+            if isinstance(column, IgnoreColumn):
+                formats.append(column.string.replace('%', '%%'))
+                continue
+            fmt = column.fmt
+            if (_overrides(column, 'get_string', Column) or fmt is None or
+                    not re.match(FORMAT_STRING_PATTERN, fmt)):
+                formats.append('%s')
+                getters.append(column.get_strings)
+            else:
+                formats.append(fmt)
+                getters.append(column.get_values)
+        return ' '.join(formats), getters
+
+    def parse(self, peak, fields):
+        """
+        Set the attributes of a Peak from the fields of one row
+
+        Parameters
+        ----------
+        peak : :class:`~.peaklist.Peak`
+            Empty peak with the right number of spins
+        fields : list of str
+            Fields of the row, split on whitespace
+        """
+        if len(fields) < len(self.columns):
+            # Short rows leave the missing columns unset
+            for column, string in zip(self.columns, fields):
+                if column is not None:
+                    column.set_string(peak, string)
+            return
+        for attr, length in self.lists.items():
+            setattr(peak, attr, [None] * length)
+        for index, converter, setter in self.parsers:
+            setter(peak, converter(fields[index]))
+
+    def format_rows(self, peaks, commented=None):
+        """
+        Format peaks as rows of a peak list
+
+        Parameters
+        ----------
+        peaks : :class:`~.peaklist.PeakList` or list of Peak objects
+            Peaks to format
+        commented : list of bool, optional
+            Whether to comment out each row with '#'
+
+        Returns
+        -------
+        lines : list of str
+            One line per peak, including the comment prefix and newline
+        """
+        if commented is None:
+            commented = [False] * len(peaks)
+        row_format = self.row_format
+        values = zip(*[getter(peaks) for getter in self.getters])
+        if not self.getters:
+            values = [()] * len(peaks)
+        lines = [('#' if com else ' ') + row_format % row + '\n'
+                 for com, row in zip(commented, values)]
+        return lines
+
+
+def _clone_columns(columns):
+    """Return copies of resolved columns, keeping None for those that are
+    not read."""
+    return [None if column is None else column.clone() for column in columns]
+
+
+def _identity(value):
+    return value
+
+
+def _overrides(column, method, base):
+    """Return True if a column replaces a method defined by ``base``."""
+    return getattr(type(column), method) != getattr(base, method)
+
+
+def _peak_setter(attr):
+    def setter(peak, value):
+        setattr(peak, attr, value)
+    return setter
+
+
+def _spin_setter(attr, index):
+    def setter(peak, value):
+        setattr(peak[index], attr, value)
+    return setter
+
+
+def _list_setter(attr, index):
+    def setter(peak, value):
+        getattr(peak, attr)[index] = value
+    return setter
+
+
 class PipeTemplate(ColumnTemplate):
     """
     """
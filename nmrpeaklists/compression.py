@@ -0,0 +1,138 @@
+"""
+Functions
+---------
+
+Open peak list files that may be compressed with gzip, bzip2, xz or
+Zstandard. Compressed files are read and written as streams, without
+decompressing them to temporary files. Files are recognized by their
+magic bytes when read and by their extension when written.
+
+Documentation
+-------------
+
+"""
+from __future__ import division, absolute_import, print_function
+import io
+import sys
+import gzip
+import bz2
+try:
+    import lzma
+except ImportError:
+    lzma = None
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+
+__all__ = ['open_file', 'compression_of']
+
+
+COMPRESSIONS = {
+    'gzip': {'magic': b'\x1f\x8b', 'extensions': ('.gz',)},
+    'bzip2': {'magic': b'BZh', 'extensions': ('.bz2',)},
+    'xz': {'magic': b'\xfd7zXZ\x00', 'extensions': ('.xz',)},
+    'zstd': {'magic': b'\x28\xb5\x2f\xfd', 'extensions': ('.zst', '.zstd')},
+}
+
+
+def _open_gzip(filename, mode):
+    return gzip.GzipFile(filename, mode, compresslevel=6)
+
+
+def _open_bzip2(filename, mode):
+    return bz2.BZ2File(filename, mode)
+
+
+def _open_xz(filename, mode):
+    if lzma is None:
+        raise ImportError('reading or writing .xz files requires lzma')
+    return lzma.LZMAFile(filename, mode)
+
+
+def _open_zstd(filename, mode):
+    if zstd is None:
+        err = 'reading or writing .zst files requires the zstandard package'
+        raise ImportError(err)
+    return zstd.open(filename, mode)
+
+
+_OPENERS = {'gzip': _open_gzip, 'bzip2': _open_bzip2, 'xz': _open_xz,
+            'zstd': _open_zstd}
+
+
+def compression_of(filename, mode='r'):
+    """
+    Return the compression of a file
+
+    Parameters
+    ----------
+    filename : str
+        File name
+    mode : {'r', 'w'}, optional
+        For reading, the compression is found from the magic bytes at the
+        start of the file. For writing, it is found from the extension.
+
+    Returns
+    -------
+    compression : str or None
+        One of 'gzip', 'bzip2', 'xz' and 'zstd', or None for an
+        uncompressed file
+    """
+    if 'r' in mode:
+        with open(filename, 'rb') as stream:
+            start = stream.read(6)
+        for name, compression in COMPRESSIONS.items():
+            if start.startswith(compression['magic']):
+                return name
+    else:
+        lower = filename.lower()
+        for name, compression in COMPRESSIONS.items():
+            if lower.endswith(compression['extensions']):
+                return name
+    return None
+
+
+def strip_extension(filename):
+    """Return a file name without its compression extension, if any."""
+    lower = filename.lower()
+    for compression in COMPRESSIONS.values():
+        for extension in compression['extensions']:
+            if lower.endswith(extension):
+                return filename[:-len(extension)]
+    return filename
+
+
+def open_file(filename, mode='r'):
+    """
+    Open a text file that may be compressed
+
+    Parameters
+    ----------
+    filename : str
+        File name
+    mode : {'r', 'w'}, optional
+        Open the file for reading or writing
+
+    Returns
+    -------
+    stream : file object
+        A text stream, which decompresses or compresses as it is read or
+        written
+
+    Examples
+    --------
+    >>> with open_file('fit.tab.gz') as plf:
+    ...     lines = plf.readlines()
+    """
+    compression = compression_of(filename, mode)
+    if compression is None:
+        return open(filename, mode)
+    stream = _OPENERS[compression](filename, mode[0] + 'b')
+    if sys.version_info[0] < 3:
+        return stream
+    return io.TextIOWrapper(stream)
@@ -3,17 +3,23 @@
 from __future__ import division, absolute_import, print_function
 try:
     from itertools import izip as zip
-    from itertools import izip_longest as zip_longest
 except ImportError:
     pass
+import os
 import re
+from itertools import chain, compress, islice
 from sys import stderr
+from tempfile import mkstemp
 from inspect import getargspec
 from struct import unpack
 from math import ceil, floor
-from collections import Mapping
-from .peaklist import Assignment, get_empty_peaklist
+from collections import Mapping, namedtuple
+from numbers import Integral
+from .cache import default_cache
+from .peaklist import (Assignment, PeakListView, get_empty_peaklist,
+                       _is_array_peaklist)
 from .columns import PipeTemplate, XeasyTemplate, UplTemplate, SparkyTemplate
+from .compression import open_file
 from .utils import FORMAT_STRING_PATTERN
 
 
@@ -43,106 +49,374 @@ class PeakListFile(object):
         rpr = name + '(' + ''.join(attr) + 'template=' + template + ')'
         return rpr
 
-    def read_data(self, lines):
-        commented = []
-        row_data = []
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            com = True if line.startswith('#') else False
-            commented.append(com)
-            row = line.lstrip(' #').split()
-            row_data.append(row)
-        num_peaks = len(commented)
-        commented = tuple(commented)
-        column_data = tuple(column for column in zip_longest(*row_data))
-        return num_peaks, commented, column_data
+    def parse_row(self, line):
+        """
+        Split a line of the data section into fields
+
+        Return a ``(commented, fields)`` tuple, or None if the line does not
+        hold a peak.
+        """
+        line = line.strip()
+        if not line:
+            return None
+        com = True if line.startswith('#') else False
+        row = line.lstrip(' #').split()
+        return com, row
+
+    def _data_rows(self, lines):
+        """Yield the ``(commented, fields)`` row of each peak in the data
+        lines."""
+        rows = (self.parse_row(line) for line in lines)
+        return (row for row in rows if row is not None)
 
     def read_header(self, lines):
         raise NotImplementedError
 
-    def read_peaklist(self, filename, add_unknown=True):
-        with open(filename, 'r') as plf:
+    def split_header(self, lines):
+        """
+        Separate the header from the data section of a peak list
+
+        Consume lines from an iterator up to the first peak and return the
+        header lines along with an iterator over the remaining lines.
+        """
+        lines = iter(lines)
+        header = []
+        for line in lines:
+            if self.parse_row(line) is not None:
+                return header, chain([line], lines)
+            header.append(line)
+        return header, lines
+
+    def read_schema(self, filename):
+        """
+        Read the dimensions and columns of a peak list file
+
+        Only the header is read, up to the first peak, so this is fast
+        even for very large files.
+
+        Parameters
+        ----------
+        filename : str
+            Peak list file to read
+
+        Returns
+        -------
+        num_dims : int
+            Number of dimensions
+        column_names : tuple of str
+            Column names, in the order of the fields of each row
+        column_formats : tuple of str
+            printf-style format string of each column
+
+        Examples
+        --------
+        >>> num_dims, names, formats = PipeFile().read_schema('fit.tab')
+        """
+        with open_file(filename) as plf:
+            header, _ = self.split_header(plf)
+        num_dims, names, formats = self.read_header(header)
+        return num_dims, tuple(names), tuple(formats)
+
+    def read_peaklist(self, filename, add_unknown=True, cache=None,
+                      columns=None, where=None):
+        """
+        Read a peak list file
+
+        Parameters
+        ----------
+        filename : str
+            Peak list file to read
+        add_unknown : bool, optional
+            Read columns that are not in the template as peak attributes
+        cache : :class:`~.cache.PeakListCache`, optional
+            Load the peak list from this cache if the file is unchanged,
+            otherwise parse it and add it to the cache. Defaults to the
+            cache named by the ``NMRPEAKLISTS_CACHE`` environment variable,
+            if any. Pass False to disable caching.
+        columns : list of str, optional
+            Names of the columns to read, as given by :meth:`read_schema`.
+            The fields of other columns are not converted, and the peaks
+            lack their attributes. By default every column is read.
+        where : str or :class:`~.predicates.Predicate`, optional
+            Read only the rows for which this predicate is true, such as
+            ``'VOL > 1e4 and not commented'``. It is evaluated on the
+            fields of each row before the peak is built, and may use
+            columns that are not read.
+
+        Returns
+        -------
+        peaklist : :class:`~.peaklist.PeakList`
+
+        Raises
+        ------
+        ValueError
+            If a requested column, or a column used by the predicate, is
+            not in the file
+
+        Examples
+        --------
+        >>> peaklist = PipeFile().read_peaklist('fit.tab',
+        ...                                     columns=['VOL', 'X_PPM'])
+        >>> peaklist = PipeFile().read_peaklist('fit.tab',
+        ...                                     where='XW between 0.5 and 20')
+        """
+        where = _as_predicate(where)
+        if cache is None:
+            cache = default_cache()
+        if cache:
+            key = cache.key(self, filename, add_unknown, columns, where)
+            peaklist = cache.load(key, self)
+            if peaklist is not None:
+                return peaklist
+        with open_file(filename) as plf:
             lines = plf.readlines()
-        peaklist = self.read_peaklist_lines(lines, add_unknown)
+        peaklist = self.read_peaklist_lines(lines, add_unknown, columns,
+                                            where)
+        if cache:
+            header, _ = self.split_header(lines)
+            cache.store(key, peaklist, header, add_unknown, columns)
         return peaklist
 
-    def read_peaklist_lines(self, lines, add_unknown=True):
+    def iter_peaklist(self, filename, chunksize=None, add_unknown=True,
+                      columns=None, where=None):
+        """
+        Read a peak list file incrementally
+
+        Parse the header once, then read the data section a chunk at a
+        time, so that memory use does not depend on the size of the file.
+
+        Parameters
+        ----------
+        filename : str
+            Peak list file to read
+        chunksize : int, optional
+            If given, yield :class:`~.peaklist.PeakList` objects of up to
+            ``chunksize`` peaks. Otherwise, yield individual peaks.
+        add_unknown : bool, optional
+            Read columns that are not in the template as peak attributes
+        columns : list of str, optional
+            Names of the columns to read. See :meth:`read_peaklist`.
+        where : str or :class:`~.predicates.Predicate`, optional
+            Read only the rows for which this predicate is true. See
+            :meth:`read_peaklist`.
+
+        Yields
+        ------
+        :class:`~.peaklist.Peak` or :class:`~.peaklist.PeakList`
+        """
+        if chunksize is not None and chunksize < 1:
+            raise ValueError('chunksize must be a positive integer')
+        size = chunksize if chunksize is not None else 1000
+        where = _as_predicate(where)
+        with open_file(filename) as plf:
+            header, lines = self.split_header(plf)
+            num_dims, names, formats = self.read_header(header)
+            resolved, codec = self._resolve_header(names, formats,
+                                                   add_unknown, columns)
+            rows = self._data_rows(lines)
+            if where is not None:
+                rows = self._filter_rows(rows, where, names, formats)
+            while True:
+                chunk = list(islice(rows, size))
+                if not chunk:
+                    break
+                peaklist = self._build_peaklist(num_dims, codec, chunk)
+                if chunksize is None:
+                    for peak in peaklist:
+                        yield peak
+                else:
+                    yield peaklist
+
+    def read_peaklist_lines(self, lines, add_unknown=True, columns=None,
+                            where=None):
+        where = _as_predicate(where)
         num_dims, names, formats = self.read_header(lines)
-        num_peaks, commented, column_data = self.read_data(lines)
-        template = self.template
-        resolved = template.resolve_from_header(names, formats, add_unknown)
-        self.template[:] = [col for col in resolved if col is not None]
-        peaklist = get_empty_peaklist(num_peaks, num_dims)
-        for com, peak in zip(commented, peaklist):
+        _, data = self.split_header(lines)
+        rows = self._data_rows(data)
+        if where is not None:
+            rows = self._filter_rows(rows, where, names, formats)
+        rows = list(rows)
+        _, codec = self._resolve_header(names, formats, add_unknown, columns)
+        return self._build_peaklist(num_dims, codec, rows)
+
+    @staticmethod
+    def _filter_rows(rows, where, names, formats):
+        """Yield the rows for which a predicate is true."""
+        test = where.row_filter(names, formats)
+        return (row for row in rows if test(row[0], row[1]))
+
+    def _resolve_header(self, names, formats, add_unknown, columns=None):
+        """
+        Resolve the template from the header, with None for each column
+        that is not read, and return the resolved columns and their codec
+
+        Resolutions are cached by
+        :meth:`~.columns.ColumnTemplate.compile_header`, so files with the
+        same header are resolved only once. Each read gets its own copies
+        of the resolved columns.
+        """
+        resolved, codec = self.template.compile_header(names, formats,
+                                                       add_unknown, columns)
+        kept = [col for col in resolved if col is not None]
+        # Leave the template unchanged if it already holds equal columns,
+        # as it does after reading a file with the same header
+        if (len(kept) != len(self.template) or
+                any(a != b for a, b in zip(kept, self.template))):
+            self.template[:] = kept
+        return resolved, codec
+
+    @staticmethod
+    def _build_peaklist(num_dims, codec, rows):
+        peaklist = get_empty_peaklist(len(rows), num_dims)
+        parse = codec.parse
+        for (com, fields), peak in zip(rows, peaklist):
             peak.commented = com
-        for data, column in zip(column_data, resolved):
-            if column is None:
-                continue
-            for peak, string in zip(peaklist, data):
-                if string is None:
-                    continue
-                column.set_string(peak, string)
+            parse(peak, fields)
         return peaklist
 
-    def write_data(self, lines, num_peaks, commented, column_data):
-        comments = ['#' if c else ' ' for c in commented]
-        data_rows = [' '.join(row) + '\n' for row in zip(*column_data)]
-        rows = [com + row for com, row in zip(comments, data_rows)]
-        lines += rows
-        return lines
-
     def write_header(self, lines, num_dims, column_names, column_formats):
         raise NotImplementedError
 
-    def write_peaklist(self, peaklist, filename):
-        lines = self.write_peaklist_lines(peaklist)
-        with open(filename, 'w') as plf:
-            plf.writelines(lines)
+    def write_peaklist(self, peaklist, filename, chunksize=1000):
+        """
+        Write a peak list to a file
+
+        The peak list is written to a temporary file in the same directory,
+        which then replaces ``filename``. If writing fails, an existing
+        file is left unchanged.
+        """
+        target = os.path.realpath(filename)
+        if os.path.exists(target) and not os.path.isfile(target):
+            # Devices and pipes can't be replaced
+            with open_file(filename, 'w') as plf:
+                self.write_peaklist_stream(peaklist, plf, chunksize)
+            return
+        directory, name = os.path.split(target)
+        # Keep the extension, which gives the compression
+        fd, temp = mkstemp(prefix='.', suffix='-' + name, dir=directory)
+        os.close(fd)
+        try:
+            with open_file(temp, 'w') as plf:
+                self.write_peaklist_stream(peaklist, plf, chunksize)
+            _copy_file_mode(target, temp)
+            _replace(temp, target)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+    def write_peaklist_stream(self, peaklist, stream, chunksize=1000):
+        """
+        Write a peak list to an open file object
+
+        Resolve the template and column widths in one pass over the peak
+        list, then format and write the peaks in chunks, so that only
+        ``chunksize`` rows of strings are held in memory at once.
+
+        Parameters
+        ----------
+        peaklist : :class:`~.peaklist.PeakList`
+            Peak list to write. A :class:`~.peaklist.PeakListView` is
+            written without copying its peaks.
+        stream : file
+            Writable text file object
+        chunksize : int, optional
+            Number of peaks to format per write
+        """
+        for lines in self.iter_peaklist_lines(peaklist, chunksize):
+            stream.writelines(lines)
 
     def write_peaklist_lines(self, peaklist):
+        lines = []
+        for chunk in self.iter_peaklist_lines(peaklist, len(peaklist) or 1):
+            lines += chunk
+        return lines
+
+    def iter_peaklist_lines(self, peaklist, chunksize=1000):
+        """
+        Yield the lines of a peak list file in chunks
+
+        The first chunk is the header. Each following chunk holds the
+        lines for up to ``chunksize`` peaks.
+        """
+        if chunksize < 1:
+            raise ValueError('chunksize must be a positive integer')
+        yield self.write_peaklist_header(peaklist)
+        codec = self.template.compile()
+        has_commented = all(hasattr(peak, 'commented') for peak in peaklist)
+        for start in range(0, len(peaklist), chunksize):
+            if (isinstance(peaklist, PeakListView) or
+                    _is_array_peaklist(peaklist)):
+                chunk = peaklist._row_slice(start, start + chunksize)
+            else:
+                chunk = peaklist[start:start + chunksize]
+            if has_commented:
+                commented = [peak.commented for peak in chunk]
+            else:
+                commented = [False] * len(chunk)
+            yield codec.format_rows(chunk, commented)
+
+    def write_peaklist_header(self, peaklist):
+        """
+        Resolve the template from a peak list and return the header lines
+        """
         num_dims = peaklist.dims
-        num_peaks = len(peaklist)
         self.template[:] = self.template.resolve_from_peaklist(peaklist)
         column_names = [column.name for column in self.template]
         column_formats = [column.fmt for column in self.template]
-        try:
-            commented = [peak.commented for peak in peaklist]
-        except AttributeError:
-            commented = [False] * len(peaklist)
-        column_data = []
-        for column in self.template:
-            data = [column.get_string(peak) for peak in peaklist]
-            column_data.append(data)
         lines = self.write_header([], num_dims, column_names, column_formats)
-        lines = self.write_data(lines, num_peaks, commented, column_data)
-        lines[-1].rstrip('\n')
         return lines
 
 
 class PipeFile(PeakListFile):
     """
+    Read and write NMRPipe .tab peak lists
+
+    Parameters
+    ----------
+    template : :class:`~.columns.PipeTemplate`, optional
+        Columns to read and write
+    columnar : bool, optional
+        Read into an :class:`~.arrays.ArrayPeakList`, parsing the data
+        section in bulk with the types given by the FORMAT line. Falls back
+        to the ordinary reader if the data can't be parsed in bulk.
     """
-    def __init__(self, template=None):
+    IGNORE = ('REMARK', 'DATA', 'NULL', '***', 'VARS', 'FORMAT')
+
+    def __init__(self, template=None, columnar=False):
         template = template if template is not None else PipeTemplate()
         super(PipeFile, self).__init__(template)
-
-    def read_data(self, lines):
-        ignore = set(['REMARK', 'DATA', 'NULL', '***', 'VARS', 'FORMAT'])
-        row_data = []
-        commented = []
-        for line in lines:
-            line = line.strip()
-            if not line or any(line.startswith(s) for s in ignore):
-                continue
-            commented.append(True if line.startswith('#') else False)
-            row = line.lstrip(' #').split()
-            row_data.append(row)
-        num_peaks = len(commented)
-        commented = tuple(commented)
-        column_data = tuple(column for column in zip_longest(*row_data))
-        return num_peaks, commented, column_data
+        self.columnar = columnar
+
+    def read_peaklist_lines(self, lines, add_unknown=True, columns=None,
+                            where=None):
+        where = _as_predicate(where)
+        if self.columnar:
+            num_dims, names, formats = self.read_header(lines)
+            resolved, _ = self._resolve_header(names, formats, add_unknown,
+                                               columns)
+            if where is not None:
+                where.check_names(names)
+            data = [line for line in lines if self.is_data_line(line)]
+            from .columnar import read_columnar
+            try:
+                return read_columnar(data, num_dims, names, formats,
+                                     resolved, where)
+            except ValueError:
+                pass
+        spr = super(PipeFile, self)
+        return spr.read_peaklist_lines(lines, add_unknown, columns, where)
+
+    def is_data_line(self, line):
+        line = line.strip()
+        return bool(line) and not line.startswith(PipeFile.IGNORE)
+
+    def parse_row(self, line):
+        if not self.is_data_line(line):
+            return None
+        line = line.strip()
+        com = True if line.startswith('#') else False
+        row = line.lstrip(' #').split()
+        return com, row
 
     def read_header(self, lines):
         column_names = column_formats = None
@@ -187,14 +461,12 @@ class SparkyFile(PeakListFile):
         column_formats = tuple(self.template.get_formats(column_names))
         return num_dims, column_names, column_formats
 
-    def read_data(self, lines):
-        if lines[0].endswith('peaks\n'):
-            lines = lines[2:]
-        else:
-            lines = lines[1:]
-        spr = super(SparkyFile, self)
-        num_peaks, commented, column_data = spr.read_data(lines)
-        return num_peaks, commented, column_data
+    def split_header(self, lines):
+        lines = iter(lines)
+        header = list(islice(lines, 1))
+        if header and header[0].endswith('peaks\n'):
+            header.extend(islice(lines, 1))
+        return header, lines
 
     def write_header(self, lines, num_dims, column_names, column_formats):
         pattern = FORMAT_STRING_PATTERN
@@ -230,13 +502,31 @@ class UplFile(PeakListFile):
 
 class XeasyFile(PeakListFile):
     """
+    Read and write XEASY peak lists
+
+    Parameters
+    ----------
+    inames : list of str, optional
+        INAME header lines
+    cyana_format : str, optional
+        CYANAFORMAT header line
+    cara_anchors : bool, optional
+        Read a CARA anchor peak list, in which each data line is followed
+        by a comment line such as ``# H/N I15`` with the assignment of the
+        peak. The peaks are assigned as they are read, in a single pass
+        over the file, so no separate :class:`CaraAnchorFile` is needed.
+
+    Examples
+    --------
+    >>> peaklist = XeasyFile(cara_anchors=True).read_peaklist('anchor.peaks')
     """
     INAME_DICT = {'H': 'H1', 'N': 'N15', 'C': 'C13'}
 
-    def __init__(self, inames=None, cyana_format=None):
+    def __init__(self, inames=None, cyana_format=None, cara_anchors=False):
         super(XeasyFile, self).__init__(XeasyTemplate())
         self.inames = inames
         self.cyana_format = cyana_format
+        self.cara_anchors = cara_anchors
 
     @staticmethod
     def inames_cyfmt_from_lines(lines):
@@ -272,28 +562,68 @@ class XeasyFile(PeakListFile):
             cyana_format = '#CYANAFORMAT {}\n'.format(cy_fmt)
         return inames, cyana_format
 
-    def read_data(self, lines):
-        commented = []
-        row_data = []
+    def parse_row(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        com = True if line.startswith('#') else False
+        row = line.lstrip(' #').split()
+        # Data rows start with integer index and have at least 10 fields
+        if len(row) > 9:
+            try:
+                int(row[0])
+            except ValueError:
+                return None
+            else:
+                return com, row
+        return None
+
+    def _data_rows(self, lines):
+        if not self.cara_anchors:
+            return super(XeasyFile, self)._data_rows(lines)
+        return self._anchor_rows(lines)
+
+    def _anchor_rows(self, lines):
+        """
+        Yield ``(commented, fields, assignment)`` rows, pairing each data
+        line with the CARA assignment comment that follows it, if any
+        """
+        row = None
         for line in lines:
-            line = line.strip()
-            if not line:
+            parsed = self.parse_row(line)
+            if parsed is not None:
+                if row is not None:
+                    yield row + (None,)
+                row = parsed
+            elif row is not None:
+                fields = line.lstrip('# ').split()
+                if len(fields) == 2 and '/' in fields[0]:
+                    yield row + (fields,)
+                    row = None
+        if row is not None:
+            yield row + (None,)
+
+    def _build_peaklist(self, num_dims, codec, rows):
+        spr = super(XeasyFile, self)
+        if not self.cara_anchors:
+            return spr._build_peaklist(num_dims, codec, rows)
+        peaklist = spr._build_peaklist(num_dims, codec,
+                                       [row[:2] for row in rows])
+        for peak, (_, _, assignment) in zip(peaklist, rows):
+            if assignment is None:
                 continue
-            com = True if line.startswith('#') else False
-            row = line.lstrip(' #').split()
-            # Data rows start with integer index and have at least 10 fields
-            if len(row) > 9:
-                try:
-                    int(row[0])
-                except ValueError:
-                    continue
-                else:
-                    commented.append(com)
-                    row_data.append(row)
-        num_peaks = len(commented)
-        commented = tuple(commented)
-        column_data = tuple(column for column in zip_longest(*row_data))
-        return num_peaks, commented, column_data
+            anchor, res_name = assignment
+            if res_name[0].isalpha():
+                res_type = res_name[0]
+                res_num = int(res_name[1:])
+            else:
+                res_type = '+'
+                res_num = int(res_name)
+            for spin, atom in zip(peak, anchor.split('/')):
+                spin.res_type = res_type
+                spin.res_num = res_num
+                spin.atom = atom
+        return peaklist
 
     def read_header(self, lines):
         self.inames, self.cyana_format = self.inames_cyfmt_from_lines(lines)
@@ -319,19 +649,35 @@ class XeasyFile(PeakListFile):
         lines += header
         return lines
 
-    def write_peaklist_lines(self, peaklist):
+    def write_peaklist_header(self, peaklist):
         inames, cy_fmt = self.inames_cyfmt_from_peaklist(peaklist)
         self.inames = inames if inames is not None else self.inames
         self.cyana_format = cy_fmt if cy_fmt is not None else self.cyana_format
-        lines = super(XeasyFile, self).write_peaklist_lines(peaklist)
+        lines = super(XeasyFile, self).write_peaklist_header(peaklist)
         return lines
 
 
+AssignmentArrays = namedtuple('AssignmentArrays', ['known', 'res_type',
+                                                   'res_num', 'atom',
+                                                   'strings'])
+
+
 class AssignmentFile(Mapping):
     """
+    A mapping from spin IDs to :class:`~.peaklist.Assignment` objects
+
+    Attributes
+    ----------
+    arrays : AssignmentArrays or None
+        Lookup arrays built by :meth:`build_arrays`
+    missing : list
+        Sorted spin IDs that had no assignment in the last call to
+        :meth:`assign_peaklist`
     """
     def __init__(self, mapping=None):
         self._map = mapping if mapping is not None else {}
+        self.arrays = None
+        self.missing = []
 
     def __getitem__(self, key):
         try:
@@ -357,29 +703,177 @@ class AssignmentFile(Mapping):
     def read_file(self):
         raise NotImplementedError
 
+    def build_arrays(self):
+        """
+        Build arrays that look up assignments by spin ID
+
+        The arrays are indexed by spin ID, so the IDs should be dense, as
+        CARA spin IDs are. Residue types and atom names are stored as codes
+        into a table of unique strings, with -1 for None, and missing
+        residue numbers as :data:`~.arrays.MISSING_INT`.
+
+        Returns
+        -------
+        self : AssignmentFile
+
+        Raises
+        ------
+        ValueError
+            If a spin ID is not a non-negative integer
+        """
+        spin_ids = list(self._map)
+        if not all(isinstance(spin_id, Integral) and spin_id >= 0
+                   for spin_id in spin_ids):
+            err = 'spin IDs must be non-negative integers to build arrays'
+            raise ValueError(err)
+        import numpy as np
+        from .arrays import MISSING_INT
+        size = max(spin_ids) + 1 if spin_ids else 0
+        known = np.zeros(size, dtype=np.bool_)
+        res_type = np.full(size, -1, dtype=np.int32)
+        res_num = np.full(size, MISSING_INT, dtype=np.int32)
+        atom = np.full(size, -1, dtype=np.int32)
+        strings = []
+        codes = {None: -1}
+
+        def intern(string):
+            try:
+                return codes[string]
+            except KeyError:
+                codes[string] = len(strings)
+                strings.append(string)
+                return codes[string]
+
+        assignments = [self._map[spin_id] for spin_id in spin_ids]
+        index = np.array(spin_ids, dtype=np.intp)
+        known[index] = True
+        res_type[index] = [intern(a.res_type) for a in assignments]
+        res_num[index] = [MISSING_INT if a.res_num is None else a.res_num
+                          for a in assignments]
+        atom[index] = [intern(a.atom) for a in assignments]
+        self.arrays = AssignmentArrays(known, res_type, res_num, atom, strings)
+        return self
+
     def assign_peaklist(self, peaklist, warn=True):
+        """
+        Assign the spins of a peak list from their spin IDs
+
+        Spins whose ID has no assignment are left unchanged. Their IDs are
+        stored in :attr:`missing` and, if ``warn`` is True, reported in a
+        single warning. If :meth:`build_arrays` has been called, each
+        assignment attribute is looked up for every spin at once.
+
+        Parameters
+        ----------
+        peaklist : :class:`~.peaklist.PeakList`
+            Peak list whose spins have a ``spin_id`` attribute
+        warn : bool, optional
+            Print a warning to stderr if any spin ID has no assignment
+
+        Returns
+        -------
+        peaklist : :class:`~.peaklist.PeakList`
+            The peak list, assigned in place
+        """
+        if self.arrays is None:
+            missing = self._assign_spins(peaklist)
+        elif _is_array_peaklist(peaklist):
+            missing = self._assign_columns(peaklist)
+        else:
+            missing = self._assign_gathered(peaklist)
+        self.missing = sorted(set(missing))
+        if warn and self.missing:
+            shown = ', '.join(repr(spin_id) for spin_id in self.missing[:20])
+            if len(self.missing) > 20:
+                shown += ', ...'
+            err = 'Warning: No assignment found for {:d} spin IDs: {}'
+            print(err.format(len(self.missing), shown), file=stderr)
+        return peaklist
+
+    def _assign_spins(self, peaklist):
+        """Assign spin by spin from the mapping. Return the missing IDs."""
+        missing = []
         for peak in peaklist:
             for spin in peak:
                 spin_id = getattr(spin, 'spin_id')
                 try:
-                    spin.res_type, spin.res_num, spin.atom = self[spin_id]
+                    spin.res_type, spin.res_num, spin.atom = self._map[spin_id]
                 except KeyError:
-                    if warn:
-                        err = ('Warning: No assignment found for spin ID '
-                               '{!r}'.format(spin_id))
-                        print(err, file=stderr)
-        return peaklist
+                    missing.append(spin_id)
+        return missing
+
+    def _find(self, spin_ids):
+        """Return a mask of the spin IDs that have an assignment."""
+        known = self.arrays.known
+        found = (spin_ids >= 0) & (spin_ids < len(known))
+        found[found] = known[spin_ids[found]]
+        return found
+
+    def _assign_gathered(self, peaklist):
+        """Assign the spins of a peak list with one lookup per attribute."""
+        import numpy as np
+        from .arrays import MISSING_INT
+        arrays = self.arrays
+        spins = [spin for peak in peaklist for spin in peak]
+        spin_ids = np.array([getattr(spin, 'spin_id') for spin in spins],
+                            dtype=np.int64)
+        found = self._find(spin_ids)
+        index = spin_ids[found]
+        strings = arrays.strings + [None]
+        res_types = [strings[code] for code in arrays.res_type[index].tolist()]
+        res_nums = [None if res_num == MISSING_INT else res_num
+                    for res_num in arrays.res_num[index].tolist()]
+        atoms = [strings[code] for code in arrays.atom[index].tolist()]
+        assigned = compress(spins, found.tolist())
+        for spin, res_type, res_num, atom in zip(assigned, res_types,
+                                                 res_nums, atoms):
+            spin.res_type = res_type
+            spin.res_num = res_num
+            spin.atom = atom
+        return spin_ids[~found].tolist()
+
+    def _assign_columns(self, peaklist):
+        """Assign the spin columns of an ArrayPeakList in bulk."""
+        import numpy as np
+        from .arrays import MISSING_INT
+        arrays = self.arrays
+        strings = arrays.strings + [None]
+        missing = []
+        for dim in range(peaklist.dims or 0):
+            spin_ids = peaklist.spin_array('spin_id')[:, dim]
+            if np.any(spin_ids == MISSING_INT):
+                raise AttributeError('spin_id')
+            found = self._find(spin_ids)
+            index = spin_ids[found]
+            peaklist.set_spin_column('res_type', dim, strings,
+                                     arrays.res_type[index], rows=found)
+            peaklist.set_spin_column('res_num', dim, arrays.res_num[index],
+                                     rows=found)
+            peaklist.set_spin_column('atom', dim, strings,
+                                     arrays.atom[index], rows=found)
+            missing.extend(spin_ids[~found].tolist())
+        return missing
 
 
 class CaraSpinsFile(AssignmentFile):
     """
+    Assignments read from a CARA spin list
+
+    Parameters
+    ----------
+    mapping : dict, optional
+        Assignments by spin ID
+    dense : bool, optional
+        Build lookup arrays indexed by spin ID after reading a file, so
+        that :meth:`assign_peaklist` assigns whole peak lists at once
     """
-    def __init__(self, mapping=None):
-        super(CaraSpinsFile, self).__init__(mapping)  
+    def __init__(self, mapping=None, dense=False):
+        super(CaraSpinsFile, self).__init__(mapping)
+        self.dense = dense
 
     def read_file(self, filename):
         dct = {}
-        with open(filename, 'r') as inp:
+        with open_file(filename) as inp:
             for line in inp:
                 line = line.strip()
                 if not line or line.startswith('#'):
@@ -388,6 +882,9 @@ class CaraSpinsFile(AssignmentFile):
                 spin_id, res_type, res_num, atom = line
                 dct[int(spin_id)] = Assignment(res_type, int(res_num), atom)
         self._map = dct
+        self.arrays = None
+        if self.dense:
+            self.build_arrays()
         return self
 
 
@@ -417,7 +914,7 @@ class CaraAnchorFile(AssignmentFile):
         return first_data_row
 
     def read_file(self, filename):
-        with open(filename, 'r') as inp:
+        with open_file(filename) as inp:
             lines = inp.readlines()
         first_data_row = self._get_first_data_row(lines)
         itr = iter(lines)
@@ -439,6 +936,7 @@ class CaraAnchorFile(AssignmentFile):
             assignments[spin_id1] = Assignment(res_type, res_num, atom1)
             assignments[spin_id2] = Assignment(res_type, res_num, atom2)
         self._map = assignments
+        self.arrays = None
         return self
 
 
@@ -494,7 +992,14 @@ class PipeSpectrumHeader(SpectrumHeader):
         parameters = list(parm_locations[1].keys())
         header = {}
         with open(filename, 'rb') as ftf:
-            raw = unpack('512f', ftf.read(2048))
+            block = ftf.read(2048)
+        # FDFLTORDER holds 2.345 in the byte order of the file
+        for byte_order in '<>':
+            raw = unpack(byte_order + '512f', block)
+            if abs(raw[2] - 2.345) < 1e-3:
+                break
+        else:
+            raw = unpack('512f', block)
         for dim_char, dim_int in zip('XYZA', raw[24:28]):  # FDDIMORD in 24:28
             header[dim_char] = {}
             loc = size_locations[dim_char]
@@ -505,29 +1010,211 @@ class PipeSpectrumHeader(SpectrumHeader):
         self._header = header
         return self
 
-    def calc_shift_pts(self, peaklist):
+    def ppm_to_pts(self, shifts, dim):
+        """
+        Convert chemical shifts in PPM to points in one dimension
+
+        Shifts outside the spectral window are aliased into it.
+
+        Parameters
+        ----------
+        shifts : array of float
+            Chemical shifts in PPM
+        dim : str
+            Dimension of the spectrum, one of 'XYZA'
+
+        Returns
+        -------
+        pts : array of float
+            Positions in points, where the first point is 1
+        folds : array of float
+            Number of spectral widths by which each shift was aliased.
+            Nonzero values mark aliased peaks.
+        """
+        import numpy as np
+        obs, sw, orig, size = self._axis(dim)
+        hz = obs * np.asarray(shifts, dtype=np.float64)
+        folds = (hz - orig) // sw
+        hz = hz - sw * folds  # Correct for aliasing
+        pts = size - (hz - orig) / (sw / size)
+        return pts, folds
+
+    def pts_to_hz(self, pts, dim, folds=0):
+        """
+        Convert positions in points to frequencies in Hz in one dimension
+
+        This is the inverse of :meth:`ppm_to_pts`.
+
+        Parameters
+        ----------
+        pts : array of float
+            Positions in points, where the first point is 1
+        dim : str
+            Dimension of the spectrum, one of 'XYZA'
+        folds : array of float, optional
+            Number of spectral widths by which each position was aliased,
+            as returned by :meth:`ppm_to_pts`. By default, the frequencies
+            are within the spectral window.
+
+        Returns
+        -------
+        hz : array of float
+        """
+        import numpy as np
+        _, sw, orig, size = self._axis(dim)
+        pts = np.asarray(pts, dtype=np.float64)
+        return orig + (size - pts) * (sw / size) + sw * np.asarray(folds)
+
+    def pts_to_ppm(self, pts, dim, folds=0):
+        """
+        Convert positions in points to chemical shifts in PPM in one
+        dimension. See :meth:`pts_to_hz` for the parameters.
+
+        Returns
+        -------
+        shifts : array of float
+        """
+        return self.pts_to_hz(pts, dim, folds) / self[dim]['OBS']
+
+    def _axis(self, dim):
+        parameters = self[dim]
+        return (parameters['OBS'], parameters['SW'], parameters['ORIG'],
+                parameters['SIZE'])
+
+    def calc_shift_pts(self, peaklist, return_folds=False):
         """
-        TODO:
         Calculate and set the chemical shift of each spin in points
 
+        The shifts of each dimension are converted in one array operation
+        with :meth:`ppm_to_pts`, then set as the ``shift_pts`` attribute of
+        each spin. The points on either side are set as ``_1`` and ``_3``.
+
         Parameters
         ----------
+        peaklist : :class:`~.peaklist.PeakList`
+            Peak list whose spins are in the XYZA order of the spectrum.
+            Every spin must have a shift.
+        return_folds : bool, optional
+            If True, also return the aliasing of each spin
+
+        Returns
+        -------
+        peaklist : :class:`~.peaklist.PeakList`
+            The same peak list
+        folds : array of float, optional
+            Array of shape (N, dims) with the number of spectral widths by
+            which each shift was aliased. Nonzero values mark aliased
+            (folded) peaks.
 
         Examples
         --------
-        >>> 
+        >>> peaklist, folds = header.calc_shift_pts(peaklist, True)
+        >>> aliased = [peak for peak, fold in zip(peaklist, folds)
+        ...            if fold.any()]
         """
-        for peak in peaklist:
-            for spin, dim in zip(peak, 'XYZA'):
-                shift = getattr(spin, 'shift')
-                obs = self[dim]['OBS']
-                orig = self[dim]['ORIG']
-                size = self[dim]['SIZE']
-                sw = self[dim]['SW']
-                hz = obs * shift
-                hz = hz - sw * ((hz - orig) // sw)  # Correct for aliasing
-                pts = size - (hz - orig) / (sw / size)
-                setattr(spin, 'shift_pts', pts)
-                setattr(spin, '_1', floor(pts))
-                setattr(spin, '_3', ceil(pts))
+        import numpy as np
+        shifts = _spin_values(peaklist, 'shift')
+        pts = np.empty_like(shifts)
+        folds = np.empty_like(shifts)
+        for index, dim in enumerate('XYZA'[:shifts.shape[1]]):
+            pts[:, index], folds[:, index] = self.ppm_to_pts(shifts[:, index],
+                                                             dim)
+        if _is_array_peaklist(peaklist):
+            lower = np.floor(pts).astype(int)
+            upper = np.ceil(pts).astype(int)
+            for index in range(pts.shape[1]):
+                peaklist.set_spin_column('shift_pts', index, pts[:, index])
+                peaklist.set_spin_column('_1', index, lower[:, index].tolist())
+                peaklist.set_spin_column('_3', index, upper[:, index].tolist())
+        else:
+            for peak, peak_pts in zip(peaklist, pts.tolist()):
+                for spin, spin_pts in zip(peak, peak_pts):
+                    spin.shift_pts = spin_pts
+                    spin._1 = int(floor(spin_pts))
+                    spin._3 = int(ceil(spin_pts))
+        if return_folds:
+            return peaklist, folds
+        return peaklist
+
+    def calc_shift_ppm(self, peaklist, folds=0):
+        """
+        Calculate and set the chemical shift of each spin from its position
+        in points
+
+        This is the inverse of :meth:`calc_shift_pts`, for example to
+        convert the fitted positions in an nlinLS fit.tab file to PPM.
+
+        Parameters
+        ----------
+        peaklist : :class:`~.peaklist.PeakList`
+            Peak list whose spins are in the XYZA order of the spectrum.
+            Every spin must have a ``shift_pts`` attribute.
+        folds : array of float, optional
+            Aliasing of each spin, as returned by :meth:`calc_shift_pts`
+
+        Returns
+        -------
+        peaklist : :class:`~.peaklist.PeakList`
+            The same peak list
+        """
+        import numpy as np
+        pts = _spin_values(peaklist, 'shift_pts')
+        folds = np.broadcast_to(folds, pts.shape)
+        shifts = np.empty_like(pts)
+        for index, dim in enumerate('XYZA'[:pts.shape[1]]):
+            shifts[:, index] = self.pts_to_ppm(pts[:, index], dim,
+                                               folds[:, index])
+        if _is_array_peaklist(peaklist):
+            for index in range(shifts.shape[1]):
+                peaklist.set_spin_column('shift', index, shifts[:, index])
+        else:
+            for peak, peak_shifts in zip(peaklist, shifts.tolist()):
+                for spin, shift in zip(peak, peak_shifts):
+                    spin.shift = shift
         return peaklist
+
+
+def _spin_values(peaklist, attr):
+    """
+    Return a float spin attribute of a peak list as an array of shape
+    (N, dims), raising AttributeError if any spin is missing it
+    """
+    import numpy as np
+    if _is_array_peaklist(peaklist):
+        values = peaklist.spin_array(attr)
+        if np.isnan(values).any():
+            err = 'every spin must have the attribute {!r}'.format(attr)
+            raise AttributeError(err)
+        return values[:, :4].copy()
+    values = [[getattr(spin, attr) for spin in peak][:4] for peak in peaklist]
+    if not values:
+        return np.empty((0, 0))
+    return np.array(values, dtype=np.float64)
+
+
+def _as_predicate(where):
+    """Return a Predicate for a predicate or an expression string."""
+    if where is None:
+        return where
+    from .predicates import Predicate
+    if isinstance(where, Predicate):
+        return where
+    return Predicate(where)
+
+
+# Replace an existing file in one step, where supported
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _copy_file_mode(source, temp):
+    """
+    Give a temporary file the permissions of the file it replaces, or the
+    default permissions for a new file
+    """
+    try:
+        mode = os.stat(source).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(temp, mode)
@@ -0,0 +1,187 @@
+"""
+Functions
+---------
+
+A registry of peak list file formats. The format of a file is detected
+from the first few kilobytes of its contents, after any decompression,
+falling back on its file extension, so that a file can be read without
+choosing its reader class. Reader classes are imported the first time
+they are used.
+
+Documentation
+-------------
+
+"""
+from __future__ import division, absolute_import, print_function
+import os
+import re
+from collections import namedtuple, OrderedDict
+from importlib import import_module
+from .compression import open_file, strip_extension
+
+
+__all__ = ['FileFormat', 'register_format', 'sniff_format', 'get_reader',
+           'reader_for', 'read_any', 'read_schema']
+
+
+SNIFF_SIZE = 4096
+
+FileFormat = namedtuple('FileFormat', ['name', 'reader', 'sniff',
+                                       'extensions'])
+
+_REGISTRY = OrderedDict()
+
+
+def register_format(name, reader, sniff=None, extensions=()):
+    """
+    Add a peak list file format to the registry
+
+    Formats are sniffed in the order they were registered. Registering a
+    name again replaces the earlier format.
+
+    Parameters
+    ----------
+    name : str
+        Name of the format
+    reader : str or class
+        A :class:`~.files.PeakListFile` subclass, or its import path as
+        ``'module:Class'``, which is imported the first time it is needed
+    sniff : callable, optional
+        Function that takes the first few kilobytes of a file as a string
+        and returns a true value if the file is in this format
+    extensions : sequence of str, optional
+        File extensions of the format, such as ``'.tab'``, used when no
+        format recognizes the contents of a file
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    _REGISTRY.pop(name, None)
+    _REGISTRY[name] = FileFormat(name, reader, sniff, extensions)
+
+
+def sniff_format(filename, size=SNIFF_SIZE):
+    """
+    Detect the format of a peak list file
+
+    Parameters
+    ----------
+    filename : str
+        Peak list file
+    size : int, optional
+        Number of characters to read from the start of the file
+
+    Returns
+    -------
+    name : str
+        Name of the registered format
+
+    Raises
+    ------
+    ValueError
+        If no format recognizes the contents or extension of the file
+    """
+    with open_file(filename) as plf:
+        text = plf.read(size)
+    for fmt in _REGISTRY.values():
+        if fmt.sniff is not None and fmt.sniff(text):
+            return fmt.name
+    extension = os.path.splitext(strip_extension(filename))[1].lower()
+    for fmt in _REGISTRY.values():
+        if extension in fmt.extensions:
+            return fmt.name
+    err = 'unknown peak list format: {!r}'.format(filename)
+    raise ValueError(err)
+
+
+def get_reader(name, *args, **kwargs):
+    """
+    Return a new reader for a registered format
+
+    Extra arguments are passed to the reader class.
+
+    Raises
+    ------
+    KeyError
+        If the format is not registered
+    """
+    try:
+        reader = _REGISTRY[name].reader
+    except KeyError:
+        raise KeyError('unknown peak list format: {!r}'.format(name))
+    if not isinstance(reader, type):
+        module, _, attr = reader.partition(':')
+        reader = getattr(import_module(module), attr)
+    return reader(*args, **kwargs)
+
+
+def reader_for(filename, *args, **kwargs):
+    """
+    Return a new reader for the format of a peak list file
+
+    Use the reader to write the peak list back in the same format. Extra
+    arguments are passed to the reader class.
+    """
+    return get_reader(sniff_format(filename), *args, **kwargs)
+
+
+def read_any(filename, add_unknown=True, cache=None, columns=None,
+             where=None):
+    """
+    Read a peak list file in any registered format
+
+    Parameters
+    ----------
+    filename : str
+        Peak list file
+    add_unknown : bool, optional
+        Read columns that are not in the template as peak attributes
+    cache : :class:`~.cache.PeakListCache`, optional
+        Passed to :meth:`~.files.PeakListFile.read_peaklist`
+    columns : list of str, optional
+        Names of the columns to read, as returned by :func:`read_schema`
+    where : str or :class:`~.predicates.Predicate`, optional
+        Read only the rows for which this predicate is true
+
+    Returns
+    -------
+    peaklist : :class:`~.peaklist.PeakList`
+
+    Examples
+    --------
+    >>> peaklist = read_any('noesy.peaks')
+    """
+    reader = reader_for(filename)
+    return reader.read_peaklist(filename, add_unknown, cache, columns, where)
+
+
+def read_schema(filename):
+    """
+    Read the dimensions and columns of a peak list file in any registered
+    format, without reading its peaks
+
+    Returns
+    -------
+    num_dims : int
+    column_names : tuple of str
+    column_formats : tuple of str
+
+    See Also
+    --------
+    nmrpeaklists.files.PeakListFile.read_schema
+    """
+    return reader_for(filename).read_schema(filename)
+
+
+_PIPE_PATTERN = re.compile(r'^\s*VARS\s.*^\s*FORMATS?\s', re.M | re.S)
+_XEASY_PATTERN = re.compile(r'^#\s*(Number of dimensions|INAME)', re.M)
+_SPARKY_PATTERN = re.compile(r'^\s*Assignment\s+w1\s+w2', re.M)
+_UPL_PATTERN = re.compile(r'^\s*\d+\s+[A-Za-z+]\S*\s+\S+\s+\d+\s+[A-Za-z+]\S*'
+                          r'\s+\S+\s+\d*\.?\d+(\s|$)', re.M)
+
+register_format('pipe', 'nmrpeaklists.files:PipeFile',
+                _PIPE_PATTERN.search, ['.tab'])
+register_format('xeasy', 'nmrpeaklists.files:XeasyFile',
+                _XEASY_PATTERN.search, ['.peaks'])
+register_format('sparky', 'nmrpeaklists.files:SparkyFile',
+                _SPARKY_PATTERN.search, ['.list'])
+register_format('upl', 'nmrpeaklists.files:UplFile',
+                _UPL_PATTERN.search, ['.upl', '.lol'])
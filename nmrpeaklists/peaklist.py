@@ -11,9 +11,20 @@ resonance in a peak list
 :class:`Peak` objects represent a line in a peak list. They act as lists
 of Spin objects and contain additional peak-specific attributes.
 
+:class:`CompactSpin` and :class:`CompactPeak` objects are memory efficient
+versions of Spin and Peak objects that use slots and shared assignments.
+
 :class:`PeakList` objects represent a peak list. They act as lists of Peak
 objects and contain attributes associated with the entire list.
 
+:class:`PeakListView` objects are selections of the peaks of another peak
+list, held as an array of indices, so that slicing, filtering and splitting
+a peak list does not copy its peaks. :class:`ViewPeak` objects let a view
+change peak attributes without changing the peaks of its parent.
+
+:class:`PeakIndex` objects map the assignments of peaks to values for fast
+membership tests and lookups.
+
 Documentation
 -------------
 
@@ -23,15 +34,24 @@ try:
     from itertools import izip as zip
 except ImportError:
     pass
+try:
+    from sys import intern
+except ImportError:
+    pass
 import re
-from itertools import combinations
+import sys
+from copy import deepcopy
+from itertools import combinations, compress, permutations
 from collections import MutableSequence, namedtuple
 from .utils import (RES_NAME_PATTERN, ATOM_NAME_PATTERN, NAME_PATTERN,
-                    SPARKY_NAME_PATTERN, SPARKY_ATOM_NAME_PATTERN, argsort)
+                    SPARKY_NAME_PATTERN, SPARKY_ATOM_NAME_PATTERN, argsort,
+                    flatten)
 
 
-__all__ = ['Assignment', 'Spin', 'Peak', 'PeakList', 'calibrate_peaklist',
-           'get_empty_peaklist', 'get_spin_link_dict', 'renumber_peaklist',
+__all__ = ['Assignment', 'Spin', 'CompactSpin', 'Peak', 'CompactPeak',
+           'PeakList', 'PeakListView', 'ViewPeak', 'PeakIndex',
+           'calibrate_peaklist', 'get_empty_peaklist',
+           'get_spin_link_dict', 'intern_assignment', 'renumber_peaklist',
            'reorder_dims', 'sort_by_assignments']
 
 
@@ -39,6 +59,168 @@ Assignment = namedtuple('Assignment', ('res_type', 'res_num', 'atom'))
 """
 """
 
+_ASSIGNMENTS = {}
+_SORT_KEYS = {}
+_ANCHOR_RESULTS = {}
+
+# Fewest peaks for which anchors are found with NumPy, if it is not loaded
+_VECTORIZE_MIN = 2000
+
+# Count changes to spin assignments and to the spins in each peak. Each
+# change stamps the changed spin or peak with the new count, and is reported
+# to the peak list that holds it, through the peak for a spin. Peak lists
+# use the reports to know when their cached dims and anchors may be out of
+# date, and which peaks to examine again.
+_MUTATIONS = 0
+
+# Owner of a spin or peak held by more than one peak or peak list. Changes
+# to it are reported to every peak list, by setting the counts below to the
+# mutation count of the change, and peak lists find the changed peaks from
+# the stamps.
+_SHARED = object()
+_UNTRACKED = 0
+_UNTRACKED_RESIZED = 0
+
+
+def _mutated(spin):
+    """Stamp a reassigned spin and report the change to its peak list."""
+    global _MUTATIONS, _UNTRACKED
+    _MUTATIONS += 1
+    spin._changed = _MUTATIONS
+    peak = getattr(spin, '_owner', None)
+    if peak is None:
+        return
+    owner = peak if peak is _SHARED else getattr(peak, '_owner', None)
+    if owner is _SHARED:
+        _UNTRACKED = _MUTATIONS
+    elif owner is not None:
+        owner._peak_changed(peak, False)
+
+
+def _peak_mutated(peak, resized=False):
+    """Stamp a peak whose spins changed and report the change to its peak
+    list. ``resized`` is True if the number of spins changed."""
+    global _MUTATIONS, _UNTRACKED, _UNTRACKED_RESIZED
+    _MUTATIONS += 1
+    peak._changed = _MUTATIONS
+    owner = getattr(peak, '_owner', None)
+    if owner is _SHARED:
+        _UNTRACKED = _MUTATIONS
+        if resized:
+            _UNTRACKED_RESIZED = _MUTATIONS
+    elif owner is not None:
+        owner._peak_changed(peak, resized)
+
+
+def _adopt(owner, obj):
+    """Record that a spin is held by a peak, or a peak by a peak list."""
+    current = getattr(obj, '_owner', None)
+    if current is None:
+        obj._owner = owner
+    elif current is not owner and current is not _SHARED:
+        obj._owner = _SHARED
+
+
+def _object_state(obj):
+    """Return the state of a spin or peak for pickling and copying. The
+    owner is left out, so that copying a spin does not copy its peak."""
+    slots = {}
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if name in ('__dict__', '__weakref__', '_owner'):
+                continue
+            try:
+                slots[name] = getattr(obj, name)
+            except AttributeError:
+                pass
+    return vars(obj), slots
+
+
+def _changed_peaks(peaks, count):
+    """Return the indices of the peaks that changed, or whose spins
+    changed, after the mutation count was ``count``."""
+    changed = []
+    for i, peak in enumerate(peaks):
+        # The stamp slot of compact spins and peaks may be unset
+        if getattr(peak, '_changed', 0) > count:
+            changed.append(i)
+            continue
+        for spin in peak:
+            if getattr(spin, '_changed', 0) > count:
+                changed.append(i)
+                break
+    return changed
+
+
+# Attribute values of these types are shared, not copied, by clone()
+_IMMUTABLE = (int, float, str, bool, tuple, frozenset, type(None))
+
+
+def _copy_value(val):
+    """Copy an attribute value, sharing it if it is immutable."""
+    if isinstance(val, _IMMUTABLE):
+        return val
+    elif type(val) is list and all(isinstance(v, _IMMUTABLE) for v in val):
+        return val[:]
+    return deepcopy(val)
+
+
+def _copy_values(attrs):
+    """Copy a dictionary of attributes, deep copying mutable values."""
+    return dict((key, _copy_value(val)) for key, val in attrs.items())
+
+
+def intern_assignment(res_type, res_num, atom):
+    """
+    Return the shared Assignment tuple for an assignment.
+
+    Each unique assignment is created once and stored in a module-level
+    table, along with interned residue type and atom name strings. Every
+    later call with the same values returns the same object.
+
+    Examples
+    --------
+    >>> a = intern_assignment('D', 54, 'HB3')
+    >>> a is intern_assignment('D', 54, 'HB3')
+    True
+    """
+    key = (res_type, res_num, atom)
+    try:
+        return _ASSIGNMENTS[key]
+    except KeyError:
+        res_type = None if res_type is None else intern(res_type)
+        atom = None if atom is None else intern(atom)
+        assignment = Assignment(res_type, res_num, atom)
+        _ASSIGNMENTS[key] = assignment
+        return assignment
+
+
+def _assignment_sort_key(res_type, res_num, atom):
+    # Replace letters with ' ' to sort before unassigned '+'
+    res_type = None if res_type is None else re.sub(r'\w', ' ', res_type)
+    # Map 2nd letter of atom to side chain position 1-7. 'N' to 0 for HN.
+    # For single letter backbone atoms, use `get` default to map '' to 0
+    side = None if atom is None else Spin.SIDECHAIN_MAP.get(atom[1:2], 0)
+    # Always sort None last. True sorts after False
+    return ((res_type is None, res_type), (res_num is None, res_num),
+            (side is None, side), (atom is None, atom))
+
+
+def _assignment_attribute(name):
+    """Store an assignment attribute in the instance dict and record each
+    change in the module mutation count."""
+    def fget(self):
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def fset(self, value):
+        self.__dict__[name] = value
+        _mutated(self)
+
+    return property(fget, fset)
+
 
 class Spin(object):
     """
@@ -78,24 +260,37 @@ class Spin(object):
     """
     SIDECHAIN_MAP = dict(zip('NABGDEZH', range(8)))
 
+    # The peak holding the spin is kept out of the instance dictionary
+    __slots__ = ('__dict__', '__weakref__', '_owner')
+
+    # Mutation count of the last change to the assignment
+    _changed = 0
+
+    res_type = _assignment_attribute('res_type')
+    res_num = _assignment_attribute('res_num')
+    atom = _assignment_attribute('atom')
+
     def __init__(self, res_type=None, res_num=None, atom=None, **kwargs):
-        self.res_type = None if res_type is None else str.upper(res_type)
-        self.res_num = None if res_num is None else int(res_num)
-        self.atom = None if atom is None else str.upper(atom)
+        # A new spin is not in any peak yet, so skip the mutation count
+        self._owner = None
+        vrs = vars(self)
+        vrs['res_type'] = None if res_type is None else str.upper(res_type)
+        vrs['res_num'] = None if res_num is None else int(res_num)
+        vrs['atom'] = None if atom is None else str.upper(atom)
         for key, val in kwargs.items():
             setattr(self, key, val)
 
     def __repr__(self):
-        rprs = [k + '=' + repr(v) for k, v in vars(self).items()]
-        return 'Spin(' + ', '.join(rprs) + ')'
+        rprs = [k + '=' + repr(v) for k, v in self._attrs().items()]
+        return type(self).__name__ + '(' + ', '.join(rprs) + ')'
 
     def __str__(self):
-        strs = [k + '=' + repr(v) for k, v in vars(self).items()
+        strs = [k + '=' + repr(v) for k, v in self._attrs().items()
                 if v is not None]
-        return 'Spin(' + ', '.join(strs) + ')'
+        return type(self).__name__ + '(' + ', '.join(strs) + ')'
 
     def __nonzero__(self):
-        vrs = vars(self).items()
+        vrs = self._attrs().items()
         return True if any(v is not None for k, v in vrs) else False
 
     def __eq__(self, other):
@@ -105,26 +300,7 @@ class Spin(object):
         return not self == other
 
     def __lt__(self, other):
-        # Shorthand
-        srt = self.res_type
-        srn = self.res_num
-        sat = self.atom
-        ort = other.res_type
-        orn = other.res_num
-        oat = other.atom
-        # Replace letters with ' ' to sort before unassigned '+'
-        srt = None if srt is None else re.sub(r'\w', ' ', self.res_type)
-        ort = None if ort is None else re.sub(r'\w', ' ', other.res_type)
-        # Map 2nd letter of atom to side chain position 1-7. 'N' to 0 for HN.
-        # For single letter backbone atoms, use `get` default to map '' to 0
-        ssc = None if sat is None else Spin.SIDECHAIN_MAP.get(sat[1:2], 0)
-        osc = None if oat is None else Spin.SIDECHAIN_MAP.get(oat[1:2], 0)
-        # Always sort None last. True sorts after False
-        slf = ((srt is None, srt), (srn is None, srn),
-               (ssc is None, ssc), (sat is None, sat))
-        oth = ((ort is None, ort), (orn is None, orn),
-               (osc is None, osc), (oat is None, oat))
-        return slf < oth
+        return self.sort_key < other.sort_key
 
     def __le__(self, other):
         return not other < self
@@ -135,10 +311,50 @@ class Spin(object):
     def __ge__(self, other):
         return not self < other
 
+    def _attrs(self):
+        attrs = vars(self)
+        if '_changed' in attrs:
+            attrs = dict(attrs)
+            del attrs['_changed']
+        return attrs
+
+    def __getstate__(self):
+        return _object_state(self)
+
+    def clone(self):
+        """
+        Return an independent copy of the spin.
+
+        Immutable attribute values, such as the assignment, shifts and
+        strings, are shared with the copy. Only mutable values are copied.
+        Unlike :func:`copy.deepcopy`, the assignment is not set again, so
+        the cached properties of peak lists stay valid.
+        """
+        spin = type(self).__new__(type(self))
+        vars(spin).update(_copy_values(vars(self)))
+        return spin
+
     @property
     def assignment(self):
         return Assignment(self.res_type, self.res_num, self.atom)
 
+    @property
+    def sort_key(self):
+        """
+        Comparable key used to sort spins by assignment.
+
+        Spins compare in the same order as their keys. The key depends only
+        on the assignment, so it is computed once for each unique assignment
+        and reused.
+        """
+        assignment = self.assignment
+        try:
+            return _SORT_KEYS[assignment]
+        except KeyError:
+            key = _assignment_sort_key(*assignment)
+            _SORT_KEYS[assignment] = key
+            return key
+
     @property
     def res_name(self):
         rest = self.res_type if self.res_type is not None else '?'
@@ -190,6 +406,91 @@ class Spin(object):
             self.atom_name = match.group(2)
 
 
+class CompactSpin(Spin):
+    """
+    A memory efficient Spin with slots for the common attributes.
+
+    The assignment is stored as a single shared tuple from
+    :func:`intern_assignment`, so :attr:`assignment` is returned without
+    creating a new object. The attributes ``shift``, ``shift_pts``,
+    ``spin_id`` and ``width`` are stored in slots. Any other attribute is
+    stored in an instance dictionary, which is only created when needed.
+
+    See Also
+    --------
+    Spin, CompactPeak
+    """
+    _FIELDS = ('shift', 'shift_pts', 'spin_id', 'width')
+    __slots__ = ('_assignment', '_changed') + _FIELDS
+
+    def __init__(self, res_type=None, res_num=None, atom=None, **kwargs):
+        res_type = None if res_type is None else str.upper(res_type)
+        res_num = None if res_num is None else int(res_num)
+        atom = None if atom is None else str.upper(atom)
+        self._owner = None
+        self._assignment = intern_assignment(res_type, res_num, atom)
+        for key, val in kwargs.items():
+            setattr(self, key, val)
+
+    def _attrs(self):
+        attrs = self._assignment._asdict()
+        for name in CompactSpin._FIELDS:
+            try:
+                attrs[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        attrs.update(vars(self))
+        return attrs
+
+    def clone(self):
+        spin = type(self).__new__(type(self))
+        spin._assignment = self._assignment
+        for name in CompactSpin._FIELDS:
+            try:
+                value = getattr(self, name)
+            except AttributeError:
+                continue
+            setattr(spin, name, _copy_value(value))
+        vars(spin).update(_copy_values(vars(self)))
+        return spin
+
+    clone.__doc__ = Spin.clone.__doc__
+
+    @property
+    def assignment(self):
+        return self._assignment
+
+    @property
+    def res_type(self):
+        return self._assignment.res_type
+
+    @res_type.setter
+    def res_type(self, value):
+        _, res_num, atom = self._assignment
+        self._assignment = intern_assignment(value, res_num, atom)
+        _mutated(self)
+
+    @property
+    def res_num(self):
+        return self._assignment.res_num
+
+    @res_num.setter
+    def res_num(self, value):
+        res_type, _, atom = self._assignment
+        self._assignment = intern_assignment(res_type, value, atom)
+        _mutated(self)
+
+    @property
+    def atom(self):
+        return self._assignment.atom
+
+    @atom.setter
+    def atom(self, value):
+        res_type, res_num, _ = self._assignment
+        self._assignment = intern_assignment(res_type, res_num, value)
+        _mutated(self)
+
+
 class Peak(MutableSequence):
     """
     A list of Spin objects and an associated set of parameters.
@@ -246,9 +547,18 @@ class Peak(MutableSequence):
     --------
     Spin, PeakList
     """
+    # The peak list holding the peak is kept out of the instance dictionary
+    __slots__ = ('__dict__', '__weakref__', '_owner')
+
+    # Mutation count of the last change to the spins
+    _changed = 0
+
     def __init__(self, spins=None, **kwargs):
+        self._owner = None
         self._spins = []
-        self.extend(spins if spins is not None else [])
+        self._spins.extend(spins if spins is not None else [])
+        for spin in self._spins:
+            _adopt(self, spin)
         for key, val in kwargs.items():
             setattr(self, key, val)
 
@@ -258,33 +568,45 @@ class Peak(MutableSequence):
     def __getitem__(self, i):
         return self._spins[i]
 
+    def __iter__(self):
+        return iter(self._spins)
+
     def __delitem__(self, i):
         del self._spins[i]
+        _peak_mutated(self, resized=True)
 
     def __setitem__(self, i, v):
+        if isinstance(i, slice):
+            v = list(v)
+            for spin in v:
+                _adopt(self, spin)
+        else:
+            _adopt(self, v)
         self._spins[i] = v
+        _peak_mutated(self, resized=isinstance(i, slice))
 
     def insert(self, i, v):
+        _adopt(self, v)
         self._spins.insert(i, v)
+        _peak_mutated(self, resized=True)
 
     def __repr__(self):
-        attr = [k + '=' + repr(v) + ', ' for k, v in vars(self).items()
-                if k != '_spins']
+        attr = [k + '=' + repr(v) + ', ' for k, v in self._attrs().items()]
         attr = ''.join(attr)
-        return 'Peak(' + attr + 'spins=' + repr(self._spins) + ')'
+        name = type(self).__name__
+        return name + '(' + attr + 'spins=' + repr(list(self)) + ')'
 
     def __str__(self):
-        attr = [k + '=' + repr(v) + ', ' for k, v in vars(self).items()
-                if k != '_spins' and v is not None]
+        attr = [k + '=' + repr(v) + ', ' for k, v in self._attrs().items()
+                if v is not None]
         attr = ''.join(attr)
         spins = ',\n'.join('  ' + str(spin) for spin in self)
-        return 'Peak(' + attr + 'spins=[\n' + spins + '])'
+        name = type(self).__name__
+        return name + '(' + attr + 'spins=[\n' + spins + '])'
 
     def __nonzero__(self):
         empty = True
-        for key, value in vars(self).items():
-            if key == '_spins':
-                continue
+        for key, value in self._attrs().items():
             if value is not None:
                 empty = False
                 break
@@ -298,7 +620,8 @@ class Peak(MutableSequence):
         return not self == other
 
     def __lt__(self, other):
-        return tuple(spin for spin in self) < tuple(spin for spin in other)
+        return (tuple(spin.sort_key for spin in self) <
+                tuple(spin.sort_key for spin in other))
 
     def __le__(self, other):
         return not other < self
@@ -311,6 +634,39 @@ class Peak(MutableSequence):
 
     def sort(self, **kwargs):
         self._spins.sort(**kwargs)
+        _peak_mutated(self)
+
+    def _attrs(self):
+        return dict((k, v) for k, v in vars(self).items()
+                    if k != '_spins' and k != '_changed')
+
+    def __getstate__(self):
+        return _object_state(self)
+
+    def __setstate__(self, state):
+        attrs, slots = state
+        vars(self).update(attrs)
+        for name, value in slots.items():
+            setattr(self, name, value)
+        for spin in self._spins:
+            _adopt(self, spin)
+
+    def clone(self):
+        """
+        Return an independent copy of the peak and its spins.
+
+        The spins are copied with :meth:`Spin.clone`. Immutable attribute
+        values are shared with the copy and only mutable values, such as
+        lists, are copied.
+        """
+        peak = type(self).__new__(type(self))
+        peak._owner = None
+        peak._spins = [spin.clone() for spin in self._spins]
+        for spin in peak._spins:
+            spin._owner = peak
+        for key, val in self._attrs().items():
+            setattr(peak, key, _copy_value(val))
+        return peak
 
     @property
     def sparky_name(self):
@@ -356,6 +712,33 @@ class Peak(MutableSequence):
         return name
 
 
+class CompactPeak(Peak):
+    """
+    A memory efficient Peak with slots for the common attributes.
+
+    The attributes ``number``, ``volume``, ``height`` and ``commented`` are
+    stored in slots. Any other attribute is stored in an instance
+    dictionary, which is only created when needed. Use with
+    :class:`CompactSpin` for the most compact peak lists.
+
+    See Also
+    --------
+    Peak, CompactSpin
+    """
+    _FIELDS = ('number', 'volume', 'height', 'commented')
+    __slots__ = ('_spins', '_changed') + _FIELDS
+
+    def _attrs(self):
+        attrs = {}
+        for name in CompactPeak._FIELDS:
+            try:
+                attrs[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        attrs.update(vars(self))
+        return attrs
+
+
 class PeakList(MutableSequence):
     """
     A list of Peak objects and parameters associated with entire peak lists.
@@ -400,6 +783,12 @@ class PeakList(MutableSequence):
     """
     def __init__(self, peaks=None):
         self._peaks = []
+        self._version = 0
+        self._changes = 0
+        self._resizes = 0
+        self._notified = []
+        self._cache = {}
+        self._peak_anchors = []
         self.extend(peaks if peaks is not None else [])
 
     def __len__(self):
@@ -408,14 +797,40 @@ class PeakList(MutableSequence):
     def __getitem__(self, i):
         return self._peaks[i]
 
+    def __iter__(self):
+        return iter(self._peaks)
+
     def __setitem__(self, i, v):
+        if isinstance(i, slice):
+            v = list(v)
+            for peak in v:
+                _adopt(self, peak)
+        else:
+            _adopt(self, v)
         self._peaks[i] = v
+        self._version += 1
+        if isinstance(i, slice):
+            self._peak_anchors = None
+        elif self._peak_anchors is not None:
+            self._peak_anchors[i] = None
 
     def __delitem__(self, i):
         del self._peaks[i]
+        self._version += 1
+        if self._peak_anchors is not None:
+            del self._peak_anchors[i]
 
     def insert(self, i, v):
+        _adopt(self, v)
         self._peaks.insert(i, v)
+        self._version += 1
+        if self._peak_anchors is not None:
+            self._peak_anchors.insert(i, None)
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        for peak in state.get('_peaks', ()):
+            _adopt(self, peak)
 
     def __repr__(self):
         return 'PeakList(' + repr(self._peaks) + ')'
@@ -432,7 +847,7 @@ class PeakList(MutableSequence):
     def __nonzero__(self):
         empty = True
         for key, value in vars(self).items():
-            if key == '_peaks':
+            if key.startswith('_'):
                 continue
             if value is not None:
                 empty = False
@@ -448,9 +863,241 @@ class PeakList(MutableSequence):
 
     def sort(self, **kwargs):
         self._peaks.sort(**kwargs)
+        self._version += 1
+        self._peak_anchors = None
+
+    def reorder(self, indices):
+        """Rearrange the peaks so that peak ``i`` is old peak
+        ``indices[i]``."""
+        self._peaks[:] = [self._peaks[i] for i in indices]
+        self._version += 1
+        if self._peak_anchors is not None:
+            anchors = self._peak_anchors
+            self._peak_anchors = [anchors[i] for i in indices]
+
+    def clone(self):
+        """
+        Return an independent copy of the peak list.
+
+        Each peak is copied with :meth:`Peak.clone`, which shares immutable
+        values instead of copying them like :func:`copy.deepcopy`.
+        """
+        peaklist = type(self)()
+        peaklist._peaks = [peak.clone() for peak in self]
+        for peak in peaklist._peaks:
+            peak._owner = peaklist
+        peaklist._peak_anchors = None
+        _clone_list_attrs(self, peaklist)
+        return peaklist
+
+    def _cache_key(self):
+        return self._version, self._changes, _UNTRACKED
+
+    def _dims_key(self):
+        return self._version, self._resizes, _UNTRACKED_RESIZED
+
+    def _peak_changed(self, peak, resized):
+        """Record a change to a peak of the peak list, or to its spins."""
+        self._changes += 1
+        if resized:
+            self._resizes += 1
+        notified = self._notified
+        if self._peak_anchors is None or notified is None:
+            return
+        elif len(notified) > len(self._peaks) // 4:
+            # Too many to examine one by one
+            self._notified = None
+        else:
+            notified.append(peak)
+
+    def _changed_since(self, count):
+        """Return the indices of the peaks that changed after the mutation
+        count was ``count``, or None if there are too many to tell."""
+        notified = self._notified
+        self._notified = []
+        if _UNTRACKED > count:
+            return _changed_peaks(self, count)
+        elif notified is None:
+            return None
+        elif not notified:
+            return []
+        ids = set(id(peak) for peak in notified)
+        return [i for i, peak in enumerate(self._peaks) if id(peak) in ids]
+
+    def _cached(self, name, func, key=None):
+        """Return the cached result of ``func`` unless the peak list has
+        changed since it was computed, according to ``key``."""
+        if key is None:
+            key = self._cache_key()
+        try:
+            cache_key, value = self._cache[name]
+        except KeyError:
+            pass
+        else:
+            if cache_key == key:
+                return value
+        value = func()
+        self._cache[name] = (key, value)
+        return value
+
+    def sort_keys(self, order, commented_at_end=False):
+        """
+        Return the assignment sort key of each peak.
+
+        Each key is a tuple of :attr:`Spin.sort_key` for the spins in the
+        dimensions given by ``order``. If ``commented_at_end`` is True, the
+        key starts with whether the peak is commented.
+        """
+        keys = []
+        for peak in self:
+            key = tuple(peak[i].sort_key for i in order)
+            if commented_at_end:
+                key = (getattr(peak, 'commented', False),) + key
+            keys.append(key)
+        return keys
+
+    def argsort_by_assignments(self, order, commented_at_end=False):
+        """Return the peak indices that sort the peaks by assignment."""
+        keys = self.sort_keys(order, commented_at_end)
+        return sorted(range(len(keys)), key=keys.__getitem__)
+
+    def index_by_assignment(self, wildcard=False):
+        """Return a :class:`PeakIndex` of the peaks in the peak list."""
+        return PeakIndex(self, wildcard)
+
+    def where(self, predicate):
+        """
+        Return a mask of the peaks for which a predicate is true
+
+        Parameters
+        ----------
+        predicate : str or :class:`~.predicates.Predicate`
+            Expression over peak and spin attributes, such as
+            ``"volume > 1e4 and all(res_type != '+')"`` or
+            ``'width[0] between 0.5 and 20'``
+
+        Returns
+        -------
+        mask : :class:`numpy.ndarray` of bool
+            True for each selected peak
+
+        Examples
+        --------
+        >>> mask = peaklist.where('not commented and width[1] < 30')
+        >>> peaks = itertools.compress(peaklist, mask)
+
+        See Also
+        --------
+        select, nmrpeaklists.predicates
+        """
+        # Import here so that NumPy is only loaded when it is needed
+        from .predicates import Predicate
+        if not isinstance(predicate, Predicate):
+            predicate = Predicate(predicate)
+        return predicate.evaluate(self)
+
+    def select(self, predicate):
+        """
+        Return a peak list of the peaks for which a predicate is true
+
+        The selected Peak objects are shared with this peak list, not
+        copied, so changes to them are seen in both. Public attributes of
+        the peak list, such as a name, are copied to the result, as by
+        :meth:`clone`.
+
+        Parameters
+        ----------
+        predicate : str, :class:`~.predicates.Predicate` or array of bool
+            Expression as for :meth:`where`, or a mask it returned
+
+        Returns
+        -------
+        peaklist : PeakList
+
+        Raises
+        ------
+        ValueError
+            If a mask does not have one entry per peak
+
+        See Also
+        --------
+        view
+        """
+        selected = PeakList(compress(self._peaks, self._mask(predicate)))
+        _clone_list_attrs(self, selected)
+        return selected
+
+    def view(self, predicate=None, copy_on_write=False):
+        """
+        Return a view of the peaks for which a predicate is true
+
+        The view holds the indices of the selected peaks, so no peaks are
+        copied. Public attributes of the peak list are copied to the view.
+        See :class:`PeakListView`.
+
+        Parameters
+        ----------
+        predicate : str, :class:`~.predicates.Predicate` or array of bool
+            Expression as for :meth:`where`, or a mask it returned. If
+            omitted, every peak is in the view.
+        copy_on_write : bool or list of str, optional
+            Peak attributes to change in the view only, or True for all
+            peak attributes
+
+        Returns
+        -------
+        view : PeakListView
+
+        Examples
+        --------
+        >>> rejected = peaklist.view('volume < 1e4', ['volume'])
+        >>> rejected.override('volume', 1.0)
+        """
+        if predicate is None:
+            indices = range(len(self))
+        else:
+            indices = [i for i, keep in enumerate(self._mask(predicate))
+                       if keep]
+        return PeakListView(self, indices, copy_on_write)
+
+    def split(self, predicate, copy_on_write=False):
+        """
+        Return views of the peaks for which a predicate is true and false
+
+        Parameters
+        ----------
+        predicate : str, :class:`~.predicates.Predicate` or array of bool
+            Expression as for :meth:`where`, or a mask it returned
+        copy_on_write : bool or list of str, optional
+            Passed to both views
+
+        Returns
+        -------
+        accepted, rejected : PeakListView
+        """
+        accepted = []
+        rejected = []
+        for i, keep in enumerate(self._mask(predicate)):
+            (accepted if keep else rejected).append(i)
+        return (PeakListView(self, accepted, copy_on_write),
+                PeakListView(self, rejected, copy_on_write))
+
+    def _mask(self, predicate):
+        """Return a predicate or mask as a list with one entry per peak."""
+        if isinstance(predicate, str) or hasattr(predicate, 'evaluate'):
+            predicate = self.where(predicate)
+        mask = list(predicate)
+        if len(mask) != len(self):
+            err = 'mask has {:d} entries for {:d} peaks'
+            raise ValueError(err.format(len(mask), len(self)))
+        return mask
 
     @property
     def dims(self):
+        """Number of spins in each peak, cached until the list changes."""
+        return self._cached('dims', self._find_dims, self._dims_key())
+
+    def _find_dims(self):
         set_of_peak_lengths = set(len(peak) for peak in self)
         num_lens = len(set_of_peak_lengths)
         if num_lens == 1:
@@ -462,45 +1109,606 @@ class PeakList(MutableSequence):
 
     @property
     def anchors(self):
-        """Detect which spins in each peak make up spin anchors."""
+        """
+        Detect which spins in each peak make up spin anchors.
+
+        The result is cached until the peak list changes. Anchors are also
+        cached for each peak, so after inserting, replacing or deleting
+        peaks, only the new peaks are examined again. Likewise, after
+        reassigning spins or changing the spins of peaks, only those peaks
+        are examined again.
+        """
+        return self._cached('anchors', self._find_anchors)
+
+    def _find_anchors(self):
         dims = self.dims
+        mutations = _MUTATIONS
+        cached = self._cache.get('peak_anchors')
+        if cached is None or cached[0] != dims:
+            self._peak_anchors = None
+        elif self._peak_anchors is not None and cached[1] != mutations:
+            # Forget the anchors of the peaks that changed since
+            changed = self._changed_since(cached[1])
+            if changed is None or len(changed) > len(self) // 4:
+                self._peak_anchors = None
+            elif not changed and cached[2] == self._version:
+                # Only peaks held by other peak lists changed
+                self._cache['peak_anchors'] = (dims, mutations, self._version)
+                return self._cache['anchors'][1]
+            else:
+                for i in changed:
+                    self._peak_anchors[i] = None
+        if self._peak_anchors is None:
+            # Every peak is examined again
+            self._notified = []
+        if self._peak_anchors is None and (len(self) < _VECTORIZE_MIN and
+                                           'numpy' not in sys.modules):
+            # Examine a short peak list peak by peak, which is faster than
+            # importing NumPy
+            self._peak_anchors = [None] * len(self)
+        elif self._peak_anchors is None:
+            # Examine every peak at once with array operations. Import here
+            # so that NumPy is only loaded when it is needed.
+            from .arrays import anchor_signatures, encode_assignments
+            encoded = encode_assignments(self)
+            signatures, decode = anchor_signatures(*encoded)
+            self._peak_anchors = [_ANCHOR_RESULTS.setdefault(a, a) for a in
+                                  (decode[s] for s in signatures.tolist())]
+        peak_anchors = self._peak_anchors
         anchors = []
-        for peak in self:
-            possible_anchors = []
-            for combination in combinations(range(dims), 2):
-                spins = [peak[i] for i in combination]
-                if any(s.res_num is None or s.atom is None for s in spins):
-                    continue
-                res_nums = [spin.res_num for spin in spins]
-                atoms = [spin.atom for spin in spins]
-                elements = [atom[0] for atom in atoms]
-                positions = [atom[1:] for atom in atoms]
-                same_res_num = res_nums[0] == res_nums[1]
-                valid_pairs = [set(('H', 'N')), set(('H', 'C'))]
-                is_proton_heavy_pair = set(elements) in valid_pairs
-                same_position = all(c[0] == c[1] for c in zip(*positions))
-                if same_res_num and is_proton_heavy_pair and same_position:
-                    if '' in positions and set(elements) != set(('H', 'N')):
-                        # One of the atom names must have been 'H', 'N' or 'C'
-                        # Of these, only the amide proton anchor is valid
-                        continue
-                    if elements[0] == 'H':
-                        possible_anchors.append(combination)
-                    else:
-                        possible_anchors.append(combination[::-1])
-            if len(possible_anchors) > 1:
-                pa_sets = [set(pa) for pa in possible_anchors]
-                overlap = set.intersection(*pa_sets)
-                if overlap:
-                    # Ambiguous, overlapping anchors
-                    continue
+        for i, peak in enumerate(self):
+            possible_anchors = peak_anchors[i]
+            if possible_anchors is None:
+                possible_anchors = _find_peak_anchors(peak, dims)
+                peak_anchors[i] = possible_anchors
             for poss_anc in possible_anchors:
                 if poss_anc not in anchors:
                     anchors.append(poss_anc)
+        self._cache['peak_anchors'] = (dims, mutations, self._version)
         anchors = tuple(anchors)
         return anchors
 
 
+def _is_array_peaklist(peaks):
+    """
+    Return True if ``peaks`` is an :class:`~.arrays.ArrayPeakList`
+
+    No ArrayPeakList can exist before the arrays module is imported, so
+    this does not import it, or NumPy.
+    """
+    arrays = sys.modules.get(__name__.rpartition('.')[0] + '.arrays')
+    return arrays is not None and isinstance(peaks, arrays.ArrayPeakList)
+
+
+def _clone_list_attrs(peaklist, clone):
+    """Copy the public attributes of one peak list to another."""
+    attrs = dict((k, v) for k, v in vars(peaklist).items()
+                 if not k.startswith('_'))
+    vars(clone).update(_copy_values(attrs))
+
+
+def _find_peak_anchors(peak, dims):
+    """Return a shared tuple of the spin anchors found in a single peak."""
+    possible_anchors = []
+    for combination in combinations(range(dims), 2):
+        spins = [peak[i] for i in combination]
+        if any(s.res_num is None or s.atom is None for s in spins):
+            continue
+        res_nums = [spin.res_num for spin in spins]
+        atoms = [spin.atom for spin in spins]
+        elements = [atom[0] for atom in atoms]
+        positions = [atom[1:] for atom in atoms]
+        same_res_num = res_nums[0] == res_nums[1]
+        valid_pairs = [set(('H', 'N')), set(('H', 'C'))]
+        is_proton_heavy_pair = set(elements) in valid_pairs
+        same_position = all(c[0] == c[1] for c in zip(*positions))
+        if same_res_num and is_proton_heavy_pair and same_position:
+            if '' in positions and set(elements) != set(('H', 'N')):
+                # One of the atom names must have been 'H', 'N' or 'C'
+                # Of these, only the amide proton anchor is valid
+                continue
+            if elements[0] == 'H':
+                possible_anchors.append(combination)
+            else:
+                possible_anchors.append(combination[::-1])
+    if len(possible_anchors) > 1:
+        pa_sets = [set(pa) for pa in possible_anchors]
+        overlap = set.intersection(*pa_sets)
+        if overlap:
+            # Ambiguous, overlapping anchors
+            possible_anchors = []
+    possible_anchors = tuple(possible_anchors)
+    return _ANCHOR_RESULTS.setdefault(possible_anchors, possible_anchors)
+
+
+# Markers in the attribute overrides of a PeakListView
+_UNSET = object()
+_DELETED = object()
+
+
+class ViewPeak(Peak):
+    """
+    Proxy for a peak in a copy-on-write :class:`PeakListView`.
+
+    Peak attributes chosen for copy-on-write are read from and written to
+    the view. All other attributes, and the spins, are those of the peak
+    in the parent peak list, so changes to them are seen in both. Copying
+    a ViewPeak with :func:`copy.copy` or :func:`copy.deepcopy` returns an
+    independent peak with the attributes seen through the view.
+
+    See Also
+    --------
+    PeakListView
+    """
+    __slots__ = ('_view', '_pos')
+
+    def __init__(self, view, pos):
+        object.__setattr__(self, '_view', view)
+        object.__setattr__(self, '_pos', pos)
+
+    def _peak(self):
+        view = self._view
+        return view._parent[view._indices[self._pos]]
+
+    @property
+    def _changed(self):
+        return self._peak()._changed
+
+    @property
+    def _owner(self):
+        return getattr(self._peak(), '_owner', None)
+
+    @_owner.setter
+    def _owner(self, owner):
+        # Adding the proxy to another peak list shares the parent's peak
+        self._peak()._owner = owner
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ViewPeak.__slots__:
+            raise AttributeError(name)
+        values = self._view._overrides.get(name)
+        if values is not None:
+            value = values[self._pos]
+            if value is _DELETED:
+                raise AttributeError(name)
+            elif value is not _UNSET:
+                return value
+        return getattr(self._peak(), name)
+
+    def __setattr__(self, name, value):
+        if isinstance(getattr(type(self), name, None), property):
+            object.__setattr__(self, name, value)
+        elif self._view._copies(name):
+            self._view._override_values(name)[self._pos] = value
+        else:
+            setattr(self._peak(), name, value)
+
+    def __delattr__(self, name):
+        if self._view._copies(name):
+            getattr(self, name)
+            self._view._override_values(name)[self._pos] = _DELETED
+        else:
+            delattr(self._peak(), name)
+
+    def __len__(self):
+        return len(self._peak())
+
+    def __getitem__(self, i):
+        return self._peak()[i]
+
+    def __iter__(self):
+        return iter(self._peak())
+
+    def __setitem__(self, i, v):
+        self._peak()[i] = v
+
+    def __delitem__(self, i):
+        del self._peak()[i]
+
+    def insert(self, i, v):
+        self._peak().insert(i, v)
+
+    def sort(self, **kwargs):
+        self._peak().sort(**kwargs)
+
+    def __copy__(self):
+        return self.detach()
+
+    def __deepcopy__(self, memo):
+        return self.detach()
+
+    def _attrs(self):
+        attrs = dict(self._peak()._attrs())
+        for name, values in self._view._overrides.items():
+            value = values[self._pos]
+            if value is _DELETED:
+                attrs.pop(name, None)
+            elif value is not _UNSET:
+                attrs[name] = value
+        return attrs
+
+    def detach(self):
+        """Return an independent copy of the peak with the attributes seen
+        through the view."""
+        peak = self._peak().clone()
+        for name, values in self._view._overrides.items():
+            value = values[self._pos]
+            if value is _DELETED:
+                if hasattr(peak, name):
+                    delattr(peak, name)
+            elif value is not _UNSET:
+                setattr(peak, name, deepcopy(value))
+        return peak
+
+    def clone(self):
+        return self.detach()
+
+    clone.__doc__ = detach.__doc__
+
+
+class PeakListView(PeakList):
+    """
+    A selection of the peaks of another peak list, without copying them.
+
+    A view holds its parent peak list and the indices of the selected
+    peaks. Slicing, filtering or splitting a view returns another view of
+    the same parent. Peaks may be deleted from a view and a view may be
+    sorted, leaving the parent unchanged, but peaks can't be inserted.
+
+    The peaks of a view are those of its parent, so changes to them are
+    seen in both, except for the peak attributes chosen with
+    ``copy_on_write``. A copy-on-write view hands out :class:`ViewPeak`
+    proxies, which keep changes to those attributes in the view. Spin
+    attributes are always shared with the parent. Public attributes of the
+    parent peak list, such as a name, are copied to the view when it is
+    created.
+
+    Inserting, deleting or reordering the peaks of the parent invalidates
+    its views.
+
+    Parameters
+    ----------
+    parent : PeakList
+        Peak list to select from. The view of a view selects from the
+        parent of the first view, keeping its copy-on-write attributes.
+    indices : sequence of int, optional
+        Indices of the selected peaks in ``parent``. By default, every
+        peak is selected.
+    copy_on_write : bool or list of str, optional
+        Names of the peak attributes to change in the view only, or True
+        for all peak attributes
+
+    Examples
+    --------
+    >>> accepted, rejected = peaklist.split('volume > 1e4', ['volume'])
+    >>> rejected.override('volume', 1.0)
+    >>> PipeFile().write_peaklist(rejected, 'rejected.tab')
+
+    See Also
+    --------
+    PeakList.view, PeakList.split, ViewPeak
+    """
+    def __init__(self, parent, indices=None, copy_on_write=False):
+        _clone_list_attrs(parent, self)
+        if indices is None:
+            indices = range(len(parent))
+        positions = _index_list(indices, len(parent))
+        copies = _copied_attrs(copy_on_write)
+        if isinstance(parent, PeakListView):
+            self._indices = [parent._indices[i] for i in positions]
+            self._overrides = dict(
+                (name, [values[i] for i in positions])
+                for name, values in parent._overrides.items())
+            self._copy_on_write = _merge_copied(parent._copy_on_write,
+                                                copies)
+            parent = parent._parent
+        else:
+            self._indices = positions
+            self._overrides = {}
+            self._copy_on_write = copies
+        self._parent = parent
+        self._version = 0
+        self._notified = []
+        self._cache = {}
+        self._peak_anchors = None
+
+    @property
+    def parent(self):
+        """The peak list that the view selects from."""
+        return self._parent
+
+    @property
+    def indices(self):
+        """The indices of the peaks of the view in its parent."""
+        return list(self._indices)
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._derive(self._indices[i], dict(
+                (name, values[i]) for name, values in self._overrides.items()))
+        if self._copy_on_write:
+            if i < 0:
+                i += len(self._indices)
+            if not 0 <= i < len(self._indices):
+                raise IndexError('peak index out of range')
+            return ViewPeak(self, i)
+        return self._parent[self._indices[i]]
+
+    def __iter__(self):
+        if self._copy_on_write:
+            return (ViewPeak(self, pos) for pos in range(len(self._indices)))
+        getitem = self._parent.__getitem__
+        return (getitem(i) for i in self._indices)
+
+    def __setitem__(self, i, v):
+        raise TypeError("can't replace the peaks of a peak list view")
+
+    def __delitem__(self, i):
+        del self._indices[i]
+        for values in self._overrides.values():
+            del values[i]
+        self._version += 1
+        if self._peak_anchors is not None:
+            del self._peak_anchors[i]
+
+    def insert(self, i, v):
+        raise TypeError("can't insert peaks into a peak list view")
+
+    def __repr__(self):
+        return 'PeakListView(' + repr(list(self)) + ')'
+
+    def __str__(self):
+        string = super(PeakListView, self).__str__()
+        return 'PeakListView' + string[len('PeakList'):]
+
+    def sort(self, key=None, reverse=False):
+        peaks = list(self)
+        if key is None:
+            order = sorted(range(len(peaks)), key=peaks.__getitem__,
+                           reverse=reverse)
+        else:
+            order = sorted(range(len(peaks)), key=lambda i: key(peaks[i]),
+                           reverse=reverse)
+        self.reorder(order)
+
+    def reorder(self, indices):
+        """Rearrange the peaks of the view so that peak ``i`` is old peak
+        ``indices[i]``. The parent is unchanged."""
+        self._indices = [self._indices[i] for i in indices]
+        for name, values in self._overrides.items():
+            self._overrides[name] = [values[i] for i in indices]
+        self._version += 1
+        if self._peak_anchors is not None:
+            anchors = self._peak_anchors
+            self._peak_anchors = [anchors[i] for i in indices]
+
+    def _cache_key(self):
+        return self._version, self._parent._cache_key()
+
+    def _dims_key(self):
+        return self._version, self._parent._dims_key()
+
+    def _changed_since(self, count):
+        # Changes are reported to the parent, so find them from the stamps
+        return _changed_peaks(self, count)
+
+    def _find_anchors(self):
+        # The peaks at the indices of the view change when the parent's
+        # peaks are replaced, so forget the anchors found for each peak
+        version = self._parent._version
+        if self._cache.get('parent_version') != version:
+            self._peak_anchors = None
+            self._cache['parent_version'] = version
+        return super(PeakListView, self)._find_anchors()
+
+    def where(self, predicate):
+        if not self._overrides and hasattr(self._parent, '_take_rows'):
+            # Evaluate on the arrays of the parent instead of on proxies
+            return self._parent.where(predicate)[self._indices]
+        return super(PeakListView, self).where(predicate)
+
+    where.__doc__ = PeakList.where.__doc__
+
+    def select(self, predicate):
+        """
+        Return a view of the peaks for which a predicate is true
+
+        Unlike :meth:`PeakList.select`, the result is another view of the
+        parent, so no peaks are copied.
+
+        Parameters
+        ----------
+        predicate : str, :class:`~.predicates.Predicate` or array of bool
+            Expression as for :meth:`where`, or a mask it returned
+
+        Returns
+        -------
+        view : PeakListView
+        """
+        return self.view(predicate)
+
+    def override(self, attr, value):
+        """
+        Set a peak attribute of every peak in the view, without changing
+        the peaks of the parent
+
+        The attribute becomes copy-on-write, if it was not already.
+        """
+        if self._copy_on_write is not True:
+            self._copy_on_write = self._copy_on_write | frozenset([attr])
+        self._overrides[attr] = [value] * len(self._indices)
+
+    def clone(self):
+        """Return a :class:`PeakList` of independent copies of the peaks
+        as seen through the view."""
+        peaklist = PeakList(peak.clone() for peak in self)
+        _clone_list_attrs(self, peaklist)
+        return peaklist
+
+    def _copies(self, name):
+        copy_on_write = self._copy_on_write
+        return copy_on_write is True or name in copy_on_write
+
+    def _override_values(self, name):
+        try:
+            return self._overrides[name]
+        except KeyError:
+            values = [_UNSET] * len(self._indices)
+            self._overrides[name] = values
+            return values
+
+    def _derive(self, indices, overrides):
+        view = PeakListView(self._parent, [])
+        _clone_list_attrs(self, view)
+        view._indices = indices
+        view._overrides = overrides
+        view._copy_on_write = self._copy_on_write
+        return view
+
+    def _row_slice(self, start, stop):
+        """
+        Return a peak list of the peaks from ``start`` to ``stop``, for
+        writing.
+
+        The rows of an array-backed parent are gathered into a new array
+        peak list. Otherwise, the result is a view.
+        """
+        if not self._overrides and hasattr(self._parent, '_take_rows'):
+            return self._parent._take_rows(self._indices[start:stop])
+        return self[start:stop]
+
+
+def _index_list(indices, size):
+    """Return a list of indices into a sequence of ``size`` items."""
+    if hasattr(indices, 'tolist'):
+        indices = indices.tolist()
+    positions = []
+    for i in indices:
+        if isinstance(i, bool):
+            err = 'peak indices must be integers, not masks'
+            raise TypeError(err)
+        if i < 0:
+            i += size
+        if not 0 <= i < size:
+            raise IndexError('peak index out of range')
+        positions.append(i)
+    return positions
+
+
+def _copied_attrs(copy_on_write):
+    if copy_on_write is True:
+        return True
+    elif not copy_on_write:
+        return frozenset()
+    elif isinstance(copy_on_write, str):
+        return frozenset([copy_on_write])
+    return frozenset(copy_on_write)
+
+
+def _merge_copied(first, second):
+    if first is True or second is True:
+        return True
+    return first | second
+
+
+class PeakIndex(object):
+    """
+    Map peak assignments to values for constant time lookups.
+
+    Two peaks match if the sets of their spin assignments are equal, the
+    same rule used by ``Peak.__eq__``. Testing ``peak in index`` is
+    therefore equivalent to ``peak in peaks``, but does not scan the
+    indexed peaks.
+
+    With ``wildcard=True``, any part of an indexed assignment that is None
+    (written as ``'?'`` in spin names) matches any value in the peak being
+    looked up. For example, an indexed peak ``S?-H/N D58-C`` matches the
+    peak ``S12-H/N D58-C``.
+
+    Parameters
+    ----------
+    peaks : list of Peak objects, optional
+        Peaks to add to the index. Each peak is its own value.
+    wildcard : bool, default False
+        Whether None parts of indexed assignments match any value
+
+    Examples
+    --------
+    >>> index = PeakIndex(to_comment, wildcard=True)
+    >>> for peak in peaklist:
+    ...     if peak in index:
+    ...         peak.commented = True
+
+    See Also
+    --------
+    PeakList.index_by_assignment
+    """
+    def __init__(self, peaks=None, wildcard=False):
+        self.wildcard = wildcard
+        self._patterns = {}
+        self._size = 0
+        for peak in peaks if peaks is not None else []:
+            self.add(peak)
+
+    def __repr__(self):
+        rpr = '{}(<{:d} peaks>, wildcard={!r})'
+        return rpr.format(type(self).__name__, self._size, self.wildcard)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, peak):
+        return bool(self.get(peak))
+
+    def __getitem__(self, peak):
+        values = self.get(peak)
+        if not values:
+            raise KeyError('{!r}'.format(peak))
+        return values
+
+    def add(self, peak, value=None):
+        """Add a peak to the index. Its value defaults to the peak."""
+        assignments = set(spin.assignment for spin in peak)
+        if self.wildcard:
+            masks = [tuple(part is None for part in assignment)
+                     for assignment in assignments]
+        else:
+            masks = [(False, False, False)] * len(assignments)
+        pattern = tuple(sorted(masks))
+        keys = self._patterns.setdefault(pattern, {})
+        key = frozenset(assignments)
+        keys.setdefault(key, []).append(peak if value is None else value)
+        self._size += 1
+
+    def get(self, peak, default=None):
+        """Return the values of all indexed peaks matching ``peak``."""
+        assignments = list(set(spin.assignment for spin in peak))
+        found = []
+        for pattern, keys in self._patterns.items():
+            if len(pattern) != len(assignments):
+                continue
+            matched = set()
+            for masks in set(permutations(pattern)):
+                key = frozenset(_mask_assignment(assignment, mask)
+                                for assignment, mask
+                                in zip(assignments, masks))
+                if key in keys:
+                    matched.add(key)
+            for key in matched:
+                found.extend(keys[key])
+        return found if found else default
+
+
+def _mask_assignment(assignment, mask):
+    if not any(mask):
+        return assignment
+    return tuple(None if masked else part
+                 for part, masked in zip(assignment, mask))
+
+
 def calibrate_peaklist(peaklist, calibration, attr='shift'):
     """
     Calibrate the chemical shifts of each spin in the peak list.
@@ -538,11 +1746,13 @@ def calibrate_peaklist(peaklist, calibration, attr='shift'):
     return peaklist
 
 
-def get_empty_peaklist(num_peaks, num_dims):
+def get_empty_peaklist(num_peaks, num_dims, compact=False):
+    peak_type = CompactPeak if compact else Peak
+    spin_type = CompactSpin if compact else Spin
     peaklist = PeakList()
-    peaklist[:] = [Peak() for _ in range(num_peaks)]
+    peaklist[:] = [peak_type() for _ in range(num_peaks)]
     for peak in peaklist:
-        peak[:] = [Spin() for _ in range(num_dims)]
+        peak[:] = [spin_type() for _ in range(num_dims)]
     return peaklist
 
 
@@ -650,12 +1860,13 @@ def sort_by_assignments(peaklist, order=None, commented_at_end=False):
     >>> peaklist[0][2]
     Spin(res_type='E', res_num=1, atom='N')
     """
-    anchors = peaklist.anchors
-    anchored = tuple(i for anchor in anchors for i in anchor)
-    unanchored = set(range(peaklist.dims)) - set(anchored)
-    default_order = anchored + tuple(sorted(unanchored))
-    order = order if order is not None else default_order
-    peaklist.sort(key=lambda peak: tuple(peak[i] for i in order))
-    if commented_at_end:
-        peaklist.sort(key=lambda peak: peak.commented)
+    if order is None:
+        anchors = peaklist.anchors
+        anchored = tuple(i for anchor in anchors for i in anchor)
+        unanchored = set(range(peaklist.dims)) - set(anchored)
+        order = anchored + tuple(sorted(unanchored))
+    else:
+        order = tuple(flatten(order))
+    indices = peaklist.argsort_by_assignments(order, commented_at_end)
+    peaklist.reorder(indices)
     return peaklist
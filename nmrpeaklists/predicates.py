@@ -0,0 +1,595 @@
+"""
+Classes
+-------
+
+:class:`Predicate` objects are filters written as expressions such as
+``'VOL > 1e4 and not commented'``. Peak list readers evaluate them against
+the column names of a file, on the fields of each row or on whole columns
+parsed in bulk, before any :class:`~.peaklist.Peak` or
+:class:`~.peaklist.Spin` objects are built, so rejected rows are never
+allocated. :meth:`~.peaklist.PeakList.where` evaluates them against the
+peak and spin attributes of a peak list, one array per attribute.
+
+Expressions
+-----------
+
+Comparisons take a name, one of ``<``, ``<=``, ``>``, ``>=``, ``==`` and
+``!=``, and a number, a quoted string or ``None``, as in ``VOL > 1e4`` or
+``X_NAME == 'I15-H'``. ``XW between 0.5 and 20`` tests that a value is
+within an inclusive range. A name on its own is true if its value is
+nonzero or nonempty. The name ``commented`` is true for commented peaks.
+Combine tests with ``and``, ``or``, ``not`` and parentheses. A missing
+value fails every test except ``== None``.
+
+For a file, names are the column names returned by
+:meth:`~.files.PeakListFile.read_schema`. For a peak list, names are peak
+and spin attributes. A spin attribute is indexed by dimension, as in
+``width[0] > 0.5``, or tested in every dimension inside ``any()`` or
+``all()``, as in ``all(res_type != '+')``.
+
+Documentation
+-------------
+
+"""
+from __future__ import division, absolute_import, print_function
+import re
+import operator
+from numbers import Number
+import numpy as np
+from .arrays import ArrayPeakList, MISSING_INT
+from .columns import Column
+
+
+__all__ = ['Predicate']
+
+
+COMMENTED = 'commented'
+
+_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt,
+              '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+_KEYWORDS = ('and', 'or', 'not', 'between', 'any', 'all', 'None')
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:(?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+         |(?P<string>'[^']*'|"[^"]*")
+         |(?P<op><=|>=|==|!=|<|>|\(|\)|\[|\])
+         |(?P<word>[A-Za-z_][A-Za-z0-9_]*))""", re.X)
+
+
+class Predicate(object):
+    """
+    A filter of the rows of a peak list file or the peaks of a peak list
+
+    Parameters
+    ----------
+    expression : str
+        Filter expression, as described in the module documentation
+
+    Attributes
+    ----------
+    expression : str
+        The expression
+    names : frozenset of str
+        Names used by the expression, other than ``commented``
+
+    Raises
+    ------
+    ValueError
+        If the expression can't be parsed
+
+    Examples
+    --------
+    >>> where = Predicate('VOL > 1e4 and XW between 0.5 and 20')
+    >>> peaklist = PipeFile().read_peaklist('fit.tab', where=where)
+    >>> mask = Predicate('all(width > 0.5)').evaluate(peaklist)
+    """
+    def __init__(self, expression):
+        self.expression = expression
+        self._tokens = _tokenize(expression)
+        self._position = 0
+        self._tree = self._parse_or()
+        if self._position != len(self._tokens):
+            self._error('unexpected {!r}'.format(self._peek()[1]))
+        del self._tokens, self._position
+        self.names = frozenset(_tree_names(self._tree)) - {COMMENTED}
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.expression)
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                self.expression == other.expression)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.expression)
+
+    # Parsing
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return (None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            self._error('unexpected end of expression')
+        self._position += 1
+        return token
+
+    def _accept(self, kind, value=None):
+        token = self._peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self._position += 1
+            return True
+        return False
+
+    def _error(self, message):
+        err = 'invalid predicate {!r}: {}'.format(self.expression, message)
+        raise ValueError(err)
+
+    def _parse_or(self):
+        tree = self._parse_and()
+        while self._accept('keyword', 'or'):
+            tree = ('or', tree, self._parse_and())
+        return tree
+
+    def _parse_and(self):
+        tree = self._parse_not()
+        while self._accept('keyword', 'and'):
+            tree = ('and', tree, self._parse_not())
+        return tree
+
+    def _parse_not(self):
+        if self._accept('keyword', 'not'):
+            return ('not', self._parse_not())
+        return self._parse_test()
+
+    def _parse_group(self):
+        tree = self._parse_or()
+        if not self._accept('op', ')'):
+            self._error("missing ')'")
+        return tree
+
+    def _parse_test(self):
+        if self._accept('op', '('):
+            return self._parse_group()
+        for quantifier in ('any', 'all'):
+            if self._accept('keyword', quantifier):
+                if not self._accept('op', '('):
+                    self._error("expected '(' after {!r}".format(quantifier))
+                return (quantifier, self._parse_group())
+        kind, name = self._next()
+        if kind != 'word':
+            self._error('expected a name, found {!r}'.format(name))
+        index = None
+        if self._accept('op', '['):
+            kind, index = self._next()
+            if kind != 'number' or not index.isdigit():
+                self._error('expected a dimension, found {!r}'.format(index))
+            index = int(index)
+            if not self._accept('op', ']'):
+                self._error("missing ']'")
+        if self._accept('keyword', 'between'):
+            low = self._parse_value()
+            if not self._accept('keyword', 'and'):
+                self._error("expected 'and' after 'between'")
+            high = self._parse_value()
+            if low is None or high is None:
+                self._error("'between' needs two values")
+            return ('between', name, index, low, high)
+        kind, op = self._peek()
+        if kind == 'op' and op in _OPERATORS:
+            self._position += 1
+            value = self._parse_value()
+            if value is None and op not in ('==', '!='):
+                self._error('None can only be compared with == and !=')
+            return ('compare', name, index, op, value)
+        return ('truth', name, index)
+
+    def _parse_value(self):
+        kind, value = self._next()
+        if kind == 'number':
+            return float(value) if re.search('[.eE]', value) else int(value)
+        if kind == 'string':
+            return value[1:-1]
+        if kind == 'keyword' and value == 'None':
+            return None
+        self._error('expected a value, found {!r}'.format(value))
+
+    # Evaluation
+
+    def check_names(self, names):
+        """
+        Check that the predicate can be evaluated on the columns of a file
+
+        Raises
+        ------
+        ValueError
+            If a column is not in ``names``, or the predicate uses
+            dimensions or ``any()`` and ``all()``, which apply only to peak
+            lists
+        """
+        if _tree_uses_spins(self._tree):
+            err = ('dimensions and any() or all() can only be used with '
+                   'peak lists: {!r}'.format(self.expression))
+            raise ValueError(err)
+        missing = self.names.difference(names)
+        if missing:
+            err = 'columns not in the peak list: {}'
+            raise ValueError(err.format(', '.join(sorted(missing))))
+
+    def row_filter(self, names, formats):
+        """
+        Compile the predicate into a test of a single row
+
+        Only the fields used by the predicate are converted, with the types
+        given by their formats. A test of a field missing from a short row
+        is false.
+
+        Parameters
+        ----------
+        names : list of str
+            Column names, in the order of the fields of each row
+        formats : list of str
+            printf-style format string of each column
+
+        Returns
+        -------
+        test : callable
+            Function of ``(commented, fields)`` that returns True for the
+            rows to keep
+        """
+        self.check_names(names)
+        getters = {COMMENTED: _commented}
+        for index, (name, fmt) in enumerate(zip(names, formats)):
+            if name in self.names and name not in getters:
+                try:
+                    converter = Column.types[fmt[-1]]
+                except (KeyError, IndexError, TypeError):
+                    converter = str
+                getters[name] = _field_getter(index, converter)
+        return _row_test(self._tree, getters)
+
+    def mask(self, columns):
+        """
+        Evaluate the predicate on whole columns at once
+
+        Parameters
+        ----------
+        columns : mapping of str to array
+            Values of each column used by the predicate, and ``commented``,
+            with one entry per row
+
+        Returns
+        -------
+        mask : array of bool
+            True for the rows to keep
+        """
+        return self._evaluate(_MappingColumns(columns))
+
+    def evaluate(self, peaklist):
+        """
+        Evaluate the predicate on the peaks of a peak list
+
+        Each attribute used by the predicate is gathered into an array
+        once, or taken directly from the storage of an
+        :class:`~.arrays.ArrayPeakList`, and the tests are evaluated on
+        whole arrays.
+
+        Parameters
+        ----------
+        peaklist : :class:`~.peaklist.PeakList`
+
+        Returns
+        -------
+        mask : array of bool
+            True for each peak for which the predicate is true
+
+        Raises
+        ------
+        ValueError
+            If a spin attribute is tested without a dimension outside
+            ``any()`` or ``all()``
+            or if no peak or spin has an attribute used by the
+            predicate, unless it is one an
+            :class:`~.arrays.ArrayPeakList` stores in arrays
+        """
+        if not len(peaklist):
+            return np.zeros(0, dtype=np.bool_)
+        return self._evaluate(_PeakListColumns(peaklist))
+
+    def _evaluate(self, columns):
+        mask = np.asarray(_array_test(self._tree, columns), dtype=np.bool_)
+        if mask.ndim != 1:
+            err = ('spin attributes must have a dimension, as in width[0], '
+                   'or be inside any() or all(): {!r}')
+            raise ValueError(err.format(self.expression))
+        return mask
+
+
+def _tokenize(expression):
+    """Split an expression into ``(kind, text)`` tokens."""
+    tokens = []
+    position = 0
+    end = len(expression.rstrip())
+    while position < end:
+        match = _TOKEN_PATTERN.match(expression, position)
+        if match is None or match.end() == position:
+            err = 'invalid predicate {!r}: unexpected {!r}'
+            raise ValueError(err.format(expression,
+                                        expression[position:].strip()))
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'word' and text in _KEYWORDS:
+            kind = 'keyword'
+        tokens.append((kind, text))
+        position = match.end()
+    return tokens
+
+
+def _tree_names(tree):
+    """Yield the names used in a parsed expression."""
+    kind = tree[0]
+    if kind in ('and', 'or'):
+        for name in _tree_names(tree[1]):
+            yield name
+        for name in _tree_names(tree[2]):
+            yield name
+    elif kind in ('not', 'any', 'all'):
+        for name in _tree_names(tree[1]):
+            yield name
+    else:
+        yield tree[1]
+
+
+def _tree_uses_spins(tree):
+    """Return True if a parsed expression uses dimensions or any()/all()."""
+    kind = tree[0]
+    if kind in ('and', 'or'):
+        return _tree_uses_spins(tree[1]) or _tree_uses_spins(tree[2])
+    if kind == 'not':
+        return _tree_uses_spins(tree[1])
+    if kind in ('any', 'all'):
+        return True
+    return tree[2] is not None
+
+
+def _commented(commented, fields):
+    return commented
+
+
+def _field_getter(index, converter):
+    """Return a function that converts one field of a row, or None if the
+    row is too short."""
+    def get(commented, fields):
+        if index < len(fields):
+            return converter(fields[index])
+        return None
+    return get
+
+
+def _row_test(tree, getters):
+    """Compile a parsed expression into a function of one row."""
+    kind = tree[0]
+    if kind == 'and':
+        first, second = (_row_test(tree[1], getters),
+                         _row_test(tree[2], getters))
+        return lambda com, fields: (first(com, fields) and
+                                    second(com, fields))
+    if kind == 'or':
+        first, second = (_row_test(tree[1], getters),
+                         _row_test(tree[2], getters))
+        return lambda com, fields: (first(com, fields) or
+                                    second(com, fields))
+    if kind == 'not':
+        inner = _row_test(tree[1], getters)
+        return lambda com, fields: not inner(com, fields)
+    get = getters[tree[1]]
+    if kind == 'truth':
+        return lambda com, fields: bool(get(com, fields))
+    if kind == 'between':
+        low, high = tree[3], tree[4]
+
+        def between(com, fields):
+            value = get(com, fields)
+            return value is not None and low <= value <= high
+        return between
+    op, target = tree[3], tree[4]
+    if target is None:
+        if op == '==':
+            return lambda com, fields: get(com, fields) is None
+        return lambda com, fields: get(com, fields) is not None
+    compare = _OPERATORS[op]
+
+    def test(com, fields):
+        value = get(com, fields)
+        return value is not None and compare(value, target)
+    return test
+
+
+def _array_test(tree, columns):
+    """
+    Evaluate a parsed expression on arrays of values
+
+    The result has one entry per peak, or one per spin, with shape
+    (peaks, dims), for tests of spin attributes outside any() and all().
+    """
+    kind = tree[0]
+    if kind in ('and', 'or'):
+        first, second = _broadcast(_array_test(tree[1], columns),
+                                   _array_test(tree[2], columns))
+        if kind == 'and':
+            return np.logical_and(first, second)
+        return np.logical_or(first, second)
+    if kind == 'not':
+        return np.logical_not(_array_test(tree[1], columns))
+    if kind in ('any', 'all'):
+        result = np.asarray(_array_test(tree[1], columns))
+        if result.ndim < 2:
+            return result
+        return getattr(np, kind)(result, axis=1)
+    name, index = tree[1], tree[2]
+    values, present = columns.lookup(name)
+    if index is not None:
+        if values.ndim != 2:
+            err = '{!r} is not a spin attribute'.format(name)
+            raise ValueError(err)
+        values = values[:, index]
+        present = present[:, index] if present is not None else None
+    if kind == 'truth':
+        if values.dtype == object:
+            result = np.array([bool(value) for value in values.ravel()],
+                              dtype=np.bool_).reshape(values.shape)
+        else:
+            result = values.astype(np.bool_)
+    elif kind == 'compare' and tree[4] is None:
+        if present is None:
+            present = np.ones(values.shape, dtype=np.bool_)
+        return ~present if tree[3] == '==' else present
+    else:
+        with np.errstate(invalid='ignore'):
+            if kind == 'between':
+                result = (values >= tree[3]) & (values <= tree[4])
+            else:
+                result = _OPERATORS[tree[3]](values, tree[4])
+        result = np.asarray(result, dtype=np.bool_)
+    if present is not None:
+        result = result & present
+    return result
+
+
+def _broadcast(first, second):
+    """Match a per-peak result to a per-spin result."""
+    first, second = np.asarray(first), np.asarray(second)
+    if first.ndim < second.ndim:
+        first = first[:, np.newaxis]
+    elif second.ndim < first.ndim:
+        second = second[:, np.newaxis]
+    return first, second
+
+
+class _MappingColumns(object):
+    """Columns parsed from a file, given as a mapping of arrays."""
+    def __init__(self, columns):
+        self.columns = columns
+
+    def lookup(self, name):
+        """Return the values of a column and which of them are present."""
+        return np.asarray(self.columns[name]), None
+
+
+class _PeakListColumns(object):
+    """Peak and spin attributes of a peak list, gathered once each."""
+    def __init__(self, peaklist):
+        self.peaklist = peaklist
+        self._columns = {}
+
+    def lookup(self, name):
+        """
+        Return the values of an attribute and which of them are present
+
+        Peak attributes have one value per peak and spin attributes have
+        shape (peaks, dims).
+        """
+        try:
+            return self._columns[name]
+        except KeyError:
+            pass
+        peaklist = self.peaklist
+        if isinstance(peaklist, ArrayPeakList):
+            column = _array_column(peaklist, name)
+        else:
+            column = None
+        if column is None:
+            column = _object_column(peaklist, name)
+        self._columns[name] = column
+        return column
+
+
+_PEAK_FIELDS = frozenset(name for name, _ in ArrayPeakList.PEAK_FIELDS)
+_SPIN_FIELDS = frozenset([name for name, _ in ArrayPeakList.SPIN_FIELDS] +
+                         list(ArrayPeakList.STRING_FIELDS))
+
+
+def _array_column(peaklist, name):
+    """Return an attribute stored in the arrays of an ArrayPeakList."""
+    if name in ArrayPeakList.STRING_FIELDS:
+        codes = peaklist.spin_array(name)
+        strings = peaklist.strings()
+        table = np.empty(len(strings) + 1, dtype=object)
+        table[:] = strings + ('',)
+        return table[codes], codes >= 0
+    if name in dict(ArrayPeakList.SPIN_FIELDS):
+        values = peaklist.spin_array(name)
+    elif name in dict(ArrayPeakList.PEAK_FIELDS):
+        return peaklist.peak_array(name), peaklist.peak_mask(name)
+    else:
+        return None
+    if values.dtype.kind == 'f':
+        return values, ~np.isnan(values)
+    if values.dtype.kind == 'i':
+        return values, values != MISSING_INT
+    return values, None
+
+
+def _object_column(peaklist, name):
+    """
+    Gather an attribute from the Peak or Spin objects of a peak list
+
+    An attribute that no peak or spin has is missing from every peak, or
+    every spin, as in an ArrayPeakList, if it is one of the attributes an
+    ArrayPeakList stores in arrays.
+
+    Raises
+    ------
+    ValueError
+        If no peak or spin has the attribute and it is not one of those
+    """
+    peaks = list(peaklist)
+    first = peaks[0]
+    if hasattr(first, name):
+        is_spin = False
+    elif len(first) and hasattr(first[0], name):
+        is_spin = True
+    elif any(hasattr(peak, name) for peak in peaks):
+        is_spin = False
+    elif any(hasattr(spin, name) for peak in peaks for spin in peak):
+        is_spin = True
+    elif name in _PEAK_FIELDS:
+        is_spin = False
+    elif name in _SPIN_FIELDS:
+        is_spin = True
+    else:
+        raise ValueError('no peak or spin has attribute {!r}'.format(name))
+    if is_spin:
+        dims = peaklist.dims
+        values = [getattr(spin, name, None) for peak in peaks for spin in peak]
+        values, present = _values_array(values)
+        return (values.reshape(len(peaks), dims),
+                present.reshape(len(peaks), dims))
+    return _values_array([getattr(peak, name, None) for peak in peaks])
+
+
+def _values_array(values):
+    """Return an array of values, with None replaced, and a mask of the
+    values that are not None."""
+    first = next((value for value in values if value is not None), None)
+    if first is None:
+        array = np.full(len(values), np.nan)
+        return array, np.zeros(len(values), dtype=np.bool_)
+    elif isinstance(first, Number):
+        try:
+            array = np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            pass
+        else:
+            if array.ndim == 1:
+                return array, ~np.isnan(array)
+    present = np.array([value is not None for value in values],
+                       dtype=np.bool_)
+    array = np.empty(len(values), dtype=object)
+    array[:] = ['' if value is None else value for value in values]
+    return array, present
@@ -0,0 +1,256 @@
+"""
+Classes
+-------
+
+:class:`PipeSpectrum` objects memory-map the data of an NMRPipe spectrum,
+either a single file or a series of plane files, and look up the intensity
+at the position of every peak in a peak list in one vectorized call. Only
+the pages of the spectrum that hold the requested points are read.
+
+Documentation
+-------------
+
+"""
+from __future__ import division, absolute_import, print_function
+import os
+import re
+from itertools import product
+import numpy as np
+from .arrays import ArrayPeakList
+from .files import PipeSpectrumHeader
+
+
+__all__ = ['PipeSpectrum']
+
+
+HEADER_SIZE = 512  # float32 values
+FDFLTORDER = 2
+FDDIMCOUNT = 9
+FDQUADFLAG = 106
+
+
+class PipeSpectrum(object):
+    """
+    A memory-mapped NMRPipe spectrum
+
+    The data of a monolithic spectrum is mapped as a single array. For a
+    plane series, each plane file is mapped the first time a point in it is
+    requested. Only real data is supported.
+
+    Parameters
+    ----------
+    filename : str
+        A monolithic spectrum, the first plane of a plane series, or a
+        plane series template such as ``'ft/test%03d.ft3'``. The template
+        of a series is found from the first plane by replacing the last
+        group of digits in the file name.
+
+    Attributes
+    ----------
+    header : :class:`~.files.PipeSpectrumHeader`
+        Header of the spectrum
+    dims : int
+        Number of dimensions
+    sizes : tuple of int
+        Number of points in each dimension, in XYZA order
+    template : str or None
+        Template of the plane file names, or None for a monolithic spectrum
+
+    Examples
+    --------
+    >>> spectrum = PipeSpectrum('ft/test001.ft3')
+    >>> peaklist = spectrum.header.calc_shift_pts(peaklist)
+    >>> heights = spectrum.peak_intensities(peaklist, interpolate=True)
+    """
+    def __init__(self, filename):
+        if '%' in filename:
+            template = filename
+            filename = template % ((1,) * template.count('%'))
+        else:
+            template = None
+        raw, dtype = _read_raw_header(filename)
+        if raw[FDQUADFLAG] != 1:
+            err = 'complex NMRPipe data is not supported: {!r}'
+            raise ValueError(err.format(filename))
+        self.header = PipeSpectrumHeader().read_file(filename)
+        self.dims = int(raw[FDDIMCOUNT])
+        self.sizes = tuple(max(int(self.header[dim]['SIZE']), 1)
+                           for dim in 'XYZA'[:self.dims])
+        self._dtype = dtype
+        self._planes = {}
+        points = (os.path.getsize(filename) - 4 * HEADER_SIZE) // 4
+        if template is None and points == np.prod(self.sizes):
+            self.template = None
+            self.data = self._map(filename, self.sizes)
+        elif self.dims > 2 and points == np.prod(self.sizes[:2]):
+            self.template = template or _series_template(filename, self.dims)
+            self.data = None
+        else:
+            err = '{!r} does not match the sizes in its header: {!r}'
+            raise ValueError(err.format(filename, self.sizes))
+
+    def __repr__(self):
+        filename = self.template or getattr(self.data, 'filename', None)
+        return '{}({!r})'.format(type(self).__name__, filename)
+
+    def _map(self, filename, sizes):
+        """Memory-map the data of a file in C order (A, Z, Y, X)."""
+        return np.memmap(filename, dtype=self._dtype, mode='r',
+                         offset=4 * HEADER_SIZE, shape=tuple(reversed(sizes)))
+
+    def plane(self, *indices):
+        """
+        Return the memory-mapped XY plane at zero-based Z (and A) indices
+
+        Returns
+        -------
+        plane : :class:`numpy.memmap`
+            Array of shape (Y size, X size)
+        """
+        if self.template is None:
+            return self.data[tuple(reversed(indices))]
+        try:
+            return self._planes[indices]
+        except KeyError:
+            numbers = tuple(reversed([index + 1 for index in indices]))
+            plane = self._map(self.template % numbers, self.sizes[:2])
+            self._planes[indices] = plane
+            return plane
+
+    def values(self, indices):
+        """
+        Return the intensities at zero-based integer indices
+
+        Parameters
+        ----------
+        indices : array of int
+            Array of shape (N, dims) in XYZA order. Indices must be within
+            the spectrum.
+
+        Returns
+        -------
+        intensities : array of float
+        """
+        indices = np.asarray(indices, dtype=np.intp).reshape(-1, self.dims)
+        if self.template is None:
+            return self.data[tuple(indices[:, ::-1].T)].astype(np.float64)
+        intensities = np.empty(len(indices))
+        plane_numbers = np.ravel_multi_index(indices[:, 2:].T,
+                                             self.sizes[2:])
+        for number in np.unique(plane_numbers).tolist():
+            rows = plane_numbers == number
+            plane = self.plane(*np.unravel_index(number, self.sizes[2:]))
+            intensities[rows] = plane[indices[rows, 1], indices[rows, 0]]
+        return intensities
+
+    def sample(self, points, interpolate=False):
+        """
+        Return the intensities at positions in points
+
+        Positions use the NMRPipe convention, where the first point of each
+        dimension is 1. Positions more than half a point outside the
+        spectrum, or NaN, give an intensity of NaN.
+
+        Parameters
+        ----------
+        points : array of float
+            Array of shape (N, dims) in XYZA order
+        interpolate : bool, optional
+            If True, interpolate multilinearly between the surrounding
+            points. Otherwise use the nearest point.
+
+        Returns
+        -------
+        intensities : array of float
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, self.dims)
+        sizes = np.array(self.sizes)
+        with np.errstate(invalid='ignore'):
+            valid = np.all((points >= 0.5) & (points < sizes + 0.5), axis=1)
+        positions = np.clip(points[valid] - 1, 0, sizes - 1)
+        intensities = np.full(len(points), np.nan)
+        if not interpolate:
+            intensities[valid] = self.values(np.rint(positions))
+            return intensities
+        lower = np.minimum(np.floor(positions), np.maximum(sizes - 2, 0))
+        fractions = positions - lower
+        total = np.zeros(len(positions))
+        for corner in product((0, 1), repeat=self.dims):
+            corner = np.array(corner)
+            weights = np.prod(np.where(corner, fractions, 1 - fractions),
+                              axis=1)
+            indices = np.minimum(lower + corner, sizes - 1)
+            total += weights * self.values(indices)
+        intensities[valid] = total
+        return intensities
+
+    def peak_intensities(self, peaklist, interpolate=False, attr='shift_pts'):
+        """
+        Return the intensity at the position of each peak
+
+        Parameters
+        ----------
+        peaklist : :class:`~.peaklist.PeakList`
+            Peak list whose spins are in the XYZA order of the spectrum
+        interpolate : bool, optional
+            If True, interpolate multilinearly between the surrounding
+            points. Otherwise use the nearest point.
+        attr : str, optional
+            Spin attribute holding the position in points, as set by
+            :meth:`~.files.PipeSpectrumHeader.calc_shift_pts`. Spins without
+            it give an intensity of NaN.
+
+        Returns
+        -------
+        intensities : array of float
+        """
+        if peaklist.dims != self.dims:
+            err = 'peak list has {} dimensions, but the spectrum has {}'
+            raise ValueError(err.format(peaklist.dims, self.dims))
+        if isinstance(peaklist, ArrayPeakList):
+            points = peaklist.spin_array(attr)
+        else:
+            points = [[getattr(spin, attr, None) for spin in peak]
+                      for peak in peaklist]
+            points = np.array(points, dtype=np.float64).reshape(-1, self.dims)
+        return self.sample(points, interpolate)
+
+
+def _read_raw_header(filename):
+    """Return the header values and data type of an NMRPipe file."""
+    with open(filename, 'rb') as ftf:
+        block = ftf.read(4 * HEADER_SIZE)
+    if len(block) == 4 * HEADER_SIZE:
+        for byte_order in '<>':
+            dtype = np.dtype(byte_order + 'f4')
+            raw = np.frombuffer(block, dtype=dtype)
+            if abs(raw[FDFLTORDER] - 2.345) < 1e-3:
+                return raw, dtype
+    err = '{!r} is not an NMRPipe spectrum'.format(filename)
+    raise ValueError(err)
+
+
+def _series_template(filename, dims):
+    """
+    Return the plane series template for the first plane of a series
+
+    The last group of digits in the file name, before the extension, is
+    the plane number. For 4D
+    series, its last three digits are the Z plane and the rest are the A
+    plane, as in ``test%02d%03d.ft4``.
+    """
+    directory, name = os.path.split(filename)
+    name, extension = os.path.splitext(name)
+    matches = list(re.finditer(r'\d+', name))
+    if not matches or (dims == 4 and len(matches[-1].group()) < 4):
+        err = 'cannot find the plane number in {!r}'.format(filename)
+        raise ValueError(err)
+    match = matches[-1]
+    width = len(match.group())
+    if dims == 4:
+        number = '%0{}d%03d'.format(width - 3)
+    else:
+        number = '%0{}d'.format(width)
+    name = (name[:match.start()].replace('%', '%%') + number +
+            (name[match.end():] + extension).replace('%', '%%'))
+    return os.path.join(directory, name)
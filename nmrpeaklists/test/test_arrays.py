@@ -0,0 +1,248 @@
+from __future__ import division, absolute_import, print_function
+import unittest as ut
+import random
+import numpy as np
+from copy import deepcopy
+from ..arrays import (ArrayPeakList, ArrayPeak, ArraySpin, anchor_signatures,
+                      encode_assignments, pack_peaklist)
+from ..columns import PeakAttrColumn, SpinAttrColumn, PipeNameColumn
+from ..peaklist import (PeakList, Peak, Spin, reorder_dims,
+                         sort_by_assignments, _find_peak_anchors)
+from . import test_peaklist
+
+
+def make_peaklist():
+    return PeakList(peaks=[
+        Peak(spins=[Spin(res_type='I', res_num=15, atom='H', shift=8.1,
+                         spin_id=3),
+                    Spin(res_type='I', res_num=15, atom='N', shift=121.9,
+                         spin_id=4)],
+             volume=1.5e5, number=1, commented=False),
+        Peak(spins=[Spin(res_type='L', res_num=16, atom='H', shift=7.5,
+                         spin_id=7, _1=40),
+                    Spin(res_type='L', res_num=16, atom='N', shift=117.3,
+                         spin_id=8, _1=70)],
+             volume=2.5e5, number=2, commented=True, profile=[1, 2])])
+
+
+class ArrayPeakListTestCase(ut.TestCase):
+    def setUp(self):
+        self.peaklist = ArrayPeakList(make_peaklist())
+
+    def test_len_dims(self):
+        self.assertEqual(len(self.peaklist), 2)
+        self.assertEqual(self.peaklist.dims, 2)
+
+    def test_proxies(self):
+        peak = self.peaklist[1]
+        self.assertIsInstance(peak, ArrayPeak)
+        self.assertIsInstance(peak[0], ArraySpin)
+        self.assertEqual(peak.volume, 2.5e5)
+        self.assertEqual(peak.number, 2)
+        self.assertTrue(peak.commented)
+        self.assertEqual(peak.profile, [1, 2])
+        self.assertEqual(peak[0].name, 'L16-H')
+        self.assertEqual(peak[1].shift, 117.3)
+        self.assertEqual(peak[1]._1, 70)
+
+    def test_missing_attr(self):
+        spin = self.peaklist[0][0]
+        self.assertRaises(AttributeError, getattr, spin, 'width')
+        self.assertRaises(AttributeError, getattr, spin, '_1')
+        self.assertRaises(AttributeError, getattr, self.peaklist[0], 'height')
+
+    def test_set_attr(self):
+        peak = self.peaklist[0]
+        peak.height = 12.0
+        peak[0].width = 2.5
+        peak[1].name = 'G3-N'
+        self.assertEqual(self.peaklist.peak_array('height')[0], 12.0)
+        self.assertEqual(self.peaklist.spin_array('width')[0, 0], 2.5)
+        self.assertEqual(self.peaklist[0][1].assignment, ('G', 3, 'N'))
+
+    def test_arrays(self):
+        shifts = self.peaklist.spin_array('shift')
+        self.assertEqual(shifts.shape, (2, 2))
+        self.assertEqual(list(shifts[:, 0]), [8.1, 7.5])
+        codes = self.peaklist.spin_array('atom')
+        strings = self.peaklist.strings()
+        self.assertEqual([strings[c] for c in codes[:, 1]], ['N', 'N'])
+
+    def test_equality(self):
+        self.assertEqual(self.peaklist, make_peaklist())
+        self.assertEqual(self.peaklist[0], make_peaklist()[0])
+
+    def test_wrong_dims(self):
+        peak = Peak(spins=[Spin()])
+        self.assertRaises(ValueError, self.peaklist.append, peak)
+
+    def test_insert_delete(self):
+        self.peaklist.insert(0, Peak(spins=[Spin(shift=1.0), Spin()],
+                                     number=9, commented=False))
+        self.assertEqual([p.number for p in self.peaklist], [9, 1, 2])
+        del self.peaklist[1]
+        self.assertEqual([p.number for p in self.peaklist], [9, 2])
+        self.assertEqual(self.peaklist[1].profile, [1, 2])
+        self.peaklist[:] = [p for p in self.peaklist if not p.commented]
+        self.assertEqual([p.number for p in self.peaklist], [9])
+
+    def test_sort(self):
+        self.peaklist.sort(key=lambda peak: -peak.volume)
+        self.assertEqual([p.number for p in self.peaklist], [2, 1])
+        self.assertEqual(self.peaklist[0][0]._1, 40)
+
+    def test_reorder_dims(self):
+        reorder_dims(self.peaklist, old_indices=[1, 0])
+        self.assertEqual(self.peaklist[1][0].name, 'L16-N')
+        self.assertEqual(self.peaklist[1][1].shift, 7.5)
+
+    def test_deepcopy(self):
+        copy = deepcopy(self.peaklist[1])
+        self.assertIs(type(copy), Peak)
+        copy.volume = 1.0
+        self.assertEqual(self.peaklist[1].volume, 2.5e5)
+
+    def test_clone(self):
+        clone = self.peaklist[1].clone()
+        self.assertIs(type(clone), Peak)
+        self.assertEqual(clone.profile, [1, 2])
+        self.assertIsNot(clone.profile, self.peaklist[1].profile)
+        clone = self.peaklist.clone()
+        self.assertIsInstance(clone, ArrayPeakList)
+        self.assertEqual(clone, self.peaklist)
+        clone[1].volume = 1.0
+        clone[1].profile[0] = 5
+        clone[1][0].name = 'G3-H'
+        self.assertEqual(self.peaklist[1].volume, 2.5e5)
+        self.assertEqual(self.peaklist[1].profile, [1, 2])
+        self.assertEqual(self.peaklist[1][0].name, 'L16-H')
+        self.peaklist.name = 'noesy'
+        self.assertEqual(self.peaklist.select([False, True]).name, 'noesy')
+
+    def test_to_peaklist(self):
+        peaklist = self.peaklist.to_peaklist()
+        self.assertIs(type(peaklist[0]), Peak)
+        self.assertEqual(peaklist[1].profile, [1, 2])
+        self.assertEqual(peaklist[1][0]._1, 40)
+
+    def test_arrays_round_trip(self):
+        arrays = self.peaklist.to_arrays()
+        peaklist = ArrayPeakList.from_arrays(arrays)
+        self.assertEqual(peaklist, make_peaklist())
+        self.assertEqual(peaklist[1].profile, [1, 2])
+        self.assertEqual(peaklist[1][0]._1, 40)
+
+    def test_extra_json(self):
+        self.peaklist[0].profile = {'x': [1.5, None], 'label': 'a'}
+        arrays = self.peaklist.to_arrays()
+        self.assertEqual(arrays['extra'].dtype, np.uint8)
+        peaklist = ArrayPeakList.from_arrays(arrays)
+        self.assertEqual(peaklist[0].profile, {'x': [1.5, None], 'label': 'a'})
+        self.peaklist[0].profile = (1, 2)
+        self.assertRaises(TypeError, self.peaklist.to_arrays)
+        self.assertIsNone(pack_peaklist(self.peaklist))
+
+    def test_missing_flag(self):
+        self.peaklist.append(Peak(spins=[Spin(), Spin()], number=3))
+        self.assertFalse(hasattr(self.peaklist[2], 'commented'))
+        self.assertEqual(list(self.peaklist.peak_mask('commented')),
+                         [True, True, False])
+        self.assertNotIn('commented', vars(self.peaklist.to_peaklist()[2]))
+        peaklist = ArrayPeakList.from_arrays(self.peaklist.to_arrays())
+        self.assertFalse(hasattr(peaklist[2], 'commented'))
+        self.assertFalse(peaklist[0].commented)
+        self.assertFalse(hasattr(peaklist.clone()[2], 'commented'))
+        self.peaklist[2].commented = True
+        self.assertTrue(self.peaklist[2].commented)
+        del self.peaklist[2].commented
+        self.assertFalse(hasattr(self.peaklist[2], 'commented'))
+
+    def test_set_column_version(self):
+        self.assertEqual(self.peaklist.anchors, ((0, 1),))
+        self.peaklist.set_spin_column('atom', 1, ['CA', 'CA'])
+        self.assertEqual(self.peaklist.anchors, ())
+        version = self.peaklist._cache_key()
+        self.peaklist.set_peak_column('commented', [None, True])
+        self.assertNotEqual(self.peaklist._cache_key(), version)
+        self.assertFalse(hasattr(self.peaklist[0], 'commented'))
+
+    def test_empty(self):
+        peaklist = ArrayPeakList.empty(3, 2)
+        self.assertEqual(len(peaklist), 3)
+        self.assertEqual(peaklist[2][1].res_type, None)
+
+    def test_many_strings(self):
+        atoms = ['H{:d}'.format(i) for i in range(40000)]
+        peaklist = ArrayPeakList.empty(len(atoms), 1)
+        peaklist.set_spin_column('atom', 0, atoms)
+        self.assertEqual(peaklist[-1][0].atom, 'H39999')
+        peaks = PeakList([Peak(spins=[Spin(atom=atom)]) for atom in atoms])
+        self.assertEqual(ArrayPeakList(peaks)[-1][0].atom, 'H39999')
+        arrays = ArrayPeakList(peaks).to_arrays()
+        self.assertNotIn('spin_res_type', arrays)
+
+    def test_columns(self):
+        peak = self.peaklist[0]
+        self.assertEqual(PeakAttrColumn('VOL', '%9.2e', 'volume')
+                         .get_string(peak), ' 1.50e+05')
+        self.assertEqual(SpinAttrColumn('Y_PPM', '%7.3f', 'shift', 1)
+                         .get_string(peak), '121.900')
+        PipeNameColumn(0).set_string(peak, 'K9-HN')
+        self.assertEqual(self.peaklist[0][0].assignment, ('K', 9, 'HN'))
+
+
+class ArrayCachedPropertiesTestCase(test_peaklist.CachedPropertiesTestCase):
+    def setUp(self):
+        super(ArrayCachedPropertiesTestCase, self).setUp()
+        self.peaklist = ArrayPeakList(self.peaklist)
+
+    def test_replace_spins(self):
+        self.peaklist.anchors
+        self.peaklist[0][1] = Spin(res_type='L', res_num=7, atom='CA')
+        self.peaklist[1][0] = Spin(res_type='L', res_num=7, atom='HA')
+        self.assertEqual(self.peaklist.anchors, ())
+
+
+class ArraySortByAssignmentsTestCase(test_peaklist.SortByAssignmentsTestCase):
+    def setUp(self):
+        super(ArraySortByAssignmentsTestCase, self).setUp()
+        self.peaklist = ArrayPeakList(self.peaklist)
+
+    def test_sort_keys(self):
+        keys = self.peaklist.sort_keys([0, 1, 2], commented_at_end=True)
+        tuple_keys = PeakList.sort_keys(self.peaklist, [0, 1, 2], True)
+        for i in range(len(keys)):
+            for j in range(len(keys)):
+                self.assertEqual(list(keys[i]) < list(keys[j]),
+                                 tuple_keys[i] < tuple_keys[j])
+
+
+class AnchorSignaturesTestCase(ut.TestCase):
+    def setUp(self):
+        rand = random.Random(0)
+        atoms = ['H', 'N', 'C', 'HA', 'CA', 'HA2', 'CA2', 'HB', 'CB', 'NE2',
+                 'HE2', 'O', None]
+        self.peaklist = PeakList()
+        for i in range(500):
+            spins = []
+            for d in range(4):
+                res_num = rand.choice([1, 2, None])
+                spins.append(Spin(res_type='A', res_num=res_num,
+                                  atom=rand.choice(atoms)))
+            self.peaklist.append(Peak(spins=spins))
+
+    def test_matches_per_peak(self):
+        signatures, decode = anchor_signatures(
+            *encode_assignments(self.peaklist))
+        for peak, signature in zip(self.peaklist, signatures.tolist()):
+            self.assertEqual(decode[signature], _find_peak_anchors(peak, 4))
+
+    def test_anchors(self):
+        anchors = []
+        for peak in self.peaklist:
+            for poss_anc in _find_peak_anchors(peak, 4):
+                if poss_anc not in anchors:
+                    anchors.append(poss_anc)
+        self.assertEqual(self.peaklist.anchors, tuple(anchors))
+        array_peaklist = ArrayPeakList(self.peaklist)
+        self.assertEqual(array_peaklist.anchors, tuple(anchors))
@@ -0,0 +1,92 @@
+from __future__ import division, absolute_import, print_function
+import os
+import shutil
+import tempfile
+import unittest as ut
+from ..arrays import ArrayPeakList, pack_peaklist, unpack_peaklist
+from ..batch import read_many
+from ..files import PipeFile, XeasyFile
+from ..peaklist import PeakList, Peak, Spin
+from .test_files import PIPE_LINES, XEASY_LINES
+
+
+def peak_values(peaklist):
+    """Return the values of each peak and its spins, in order."""
+    return [(peak.number, peak.commented, getattr(peak, 'volume', None),
+             [(spin.shift, getattr(spin, 'spin_id', None)) for spin in peak])
+            for peak in peaklist]
+
+
+class ReadManyTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.xeasy_paths = []
+        for i in range(3):
+            lines = XEASY_LINES[:4] + XEASY_LINES[4 + i:]
+            self.xeasy_paths.append(self.write_file(
+                'test{}.peaks'.format(i), lines))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, lines):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as plf:
+            plf.writelines(lines)
+        return filename
+
+    def test_separate(self):
+        expected = [XeasyFile().read_peaklist(path)
+                    for path in self.xeasy_paths]
+        for workers in (1, 2):
+            peaklists = read_many(self.xeasy_paths, XeasyFile(), workers)
+            self.assertEqual([type(p) for p in peaklists], [PeakList] * 3)
+            self.assertEqual([peak_values(p) for p in peaklists],
+                             [peak_values(p) for p in expected])
+
+    def test_merge(self):
+        expected = PeakList()
+        for path in self.xeasy_paths:
+            expected.extend(XeasyFile().read_peaklist(path))
+        peaklist = read_many(self.xeasy_paths, XeasyFile(), 2, merge=True)
+        self.assertEqual(len(peaklist), 6)
+        self.assertEqual(peak_values(peaklist), peak_values(expected))
+
+    def test_reader_state(self):
+        xeasy_file = XeasyFile()
+        read_many(self.xeasy_paths, xeasy_file, 2)
+        self.assertEqual(xeasy_file.cyana_format, '#CYANAFORMAT hN\n')
+        self.assertEqual(len(xeasy_file.inames), 2)
+
+    def test_columnar(self):
+        paths = [self.write_file('test{}.tab'.format(i), PIPE_LINES)
+                 for i in range(2)]
+        peaklist = read_many(paths, PipeFile(columnar=True), 2, merge=True)
+        self.assertIsInstance(peaklist, ArrayPeakList)
+        self.assertEqual(len(peaklist), 10)
+        expected = PipeFile().read_peaklist(paths[1])
+        self.assertEqual(list(peaklist[5:]), list(expected))
+        self.assertEqual(peak_values(peaklist[5:]), peak_values(expected))
+
+    def test_empty(self):
+        self.assertEqual(read_many([], XeasyFile()), [])
+        self.assertEqual(read_many([], XeasyFile(), merge=True), PeakList())
+
+
+class PackPeakListTestCase(ut.TestCase):
+    def test_round_trip(self):
+        peaklist = PeakList([Peak(spins=[Spin(res_type='A', res_num=1,
+                                              atom='H', shift=8.0, _1=4)],
+                                  number=1, profile=[1.0, 0.5])])
+        unpacked = unpack_peaklist(pack_peaklist(peaklist))
+        self.assertIs(type(unpacked), PeakList)
+        self.assertEqual(unpacked, peaklist)
+        self.assertEqual(unpacked[0].profile, [1.0, 0.5])
+        array_peaklist = ArrayPeakList(peaklist)
+        unpacked = unpack_peaklist(pack_peaklist(array_peaklist))
+        self.assertIsInstance(unpacked, ArrayPeakList)
+        self.assertEqual(unpacked, peaklist)
+
+    def test_ragged(self):
+        peaklist = PeakList([Peak(spins=[Spin()]), Peak(spins=[])])
+        self.assertIsNone(pack_peaklist(peaklist))
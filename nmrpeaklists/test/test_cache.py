@@ -0,0 +1,175 @@
+from __future__ import division, absolute_import, print_function
+import os
+import shutil
+import tempfile
+import unittest as ut
+import numpy as np
+from ..arrays import ArrayPeakList
+from ..cache import PeakListCache, CACHE_ENV
+from ..columns import PeakAttrColumn
+from ..files import PipeFile, XeasyFile
+from .test_files import PIPE_LINES, XEASY_LINES
+
+
+UNPICKLED = []
+
+
+class Tripwire(object):
+    def __setstate__(self, state):
+        UNPICKLED.append(state)
+
+
+class PeakListCacheTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = PeakListCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, lines):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as plf:
+            plf.writelines(lines)
+        return filename
+
+    def entries(self):
+        return sorted(name for name in os.listdir(self.cache.directory)
+                      if name.endswith('.npz'))
+
+    def test_hit(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        expected = PipeFile().read_peaklist(filename, cache=False)
+        self.assertEqual(PipeFile().read_peaklist(filename, cache=self.cache),
+                         expected)
+        self.assertEqual(len(self.entries()), 1)
+        key = self.cache.key(PipeFile(), filename)
+        cached = self.cache.load(key, PipeFile())
+        self.assertIs(type(cached), type(expected))
+        self.assertEqual(cached, expected)
+
+    def test_columnar(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        for _ in range(2):
+            peaklist = PipeFile(columnar=True).read_peaklist(
+                filename, cache=self.cache)
+            self.assertIsInstance(peaklist, ArrayPeakList)
+        self.assertEqual(peaklist, PipeFile().read_peaklist(filename))
+        # The reader settings are part of the key
+        PipeFile().read_peaklist(filename, cache=self.cache)
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_columns(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        PipeFile().read_peaklist(filename, cache=self.cache)
+        for _ in range(2):
+            peaklist = PipeFile().read_peaklist(filename, cache=self.cache,
+                                                columns=['VOL'])
+            self.assertFalse(hasattr(peaklist[0], 'number'))
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_modified_file(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        PipeFile().read_peaklist(filename, cache=self.cache)
+        self.write_file('test.tab', PIPE_LINES[:-1])
+        peaklist = PipeFile().read_peaklist(filename, cache=self.cache)
+        self.assertEqual(len(peaklist), 4)
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_reader_state(self):
+        filename = self.write_file('test.peaks', XEASY_LINES)
+        expected = XeasyFile().read_peaklist(filename, cache=self.cache)
+        xeasy_file = XeasyFile()
+        peaklist = xeasy_file.read_peaklist(filename, cache=self.cache)
+        self.assertEqual(peaklist, expected)
+        self.assertEqual(xeasy_file.cyana_format, '#CYANAFORMAT hN\n')
+        self.assertEqual(len(xeasy_file.inames), 2)
+        lines = xeasy_file.write_peaklist_lines(peaklist)
+        self.assertEqual(lines[:4], XEASY_LINES[:4])
+
+    def test_template(self):
+        filename = self.write_file('test.peaks', XEASY_LINES)
+        custom = XeasyFile()
+        volume = [getattr(col, 'attr', None)
+                  for col in custom.template].index('volume')
+        custom.template[volume] = PeakAttrColumn('Volume', '%10.3e',
+                                                 'intensity')
+        self.assertNotEqual(self.cache.key(custom, filename),
+                            self.cache.key(XeasyFile(), filename))
+        custom.read_peaklist(filename, cache=self.cache)
+        xeasy_file = XeasyFile()
+        peaklist = xeasy_file.read_peaklist(filename, cache=self.cache)
+        self.assertEqual(peaklist[0].volume, 1.5e5)
+        self.assertFalse(hasattr(peaklist[0], 'intensity'))
+        attrs = [getattr(col, 'attr', None) for col in xeasy_file.template]
+        self.assertNotIn('intensity', attrs)
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_damaged_entry(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        key = self.cache.key(PipeFile(), filename)
+        PipeFile().read_peaklist(filename, cache=self.cache)
+        with open(self.cache.entry(key), 'wb') as npz:
+            npz.write(b'not an npz file')
+        self.assertIsNone(self.cache.load(key, PipeFile()))
+        self.assertEqual(self.entries(), [])
+        self.assertEqual(PipeFile().read_peaklist(filename, cache=self.cache),
+                         PipeFile().read_peaklist(filename))
+
+    def test_pickled_entry(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        key = self.cache.key(PipeFile(), filename)
+        PipeFile().read_peaklist(filename, cache=self.cache)
+        with np.load(self.cache.entry(key)) as npz:
+            arrays = dict(npz.items())
+        tripwire = Tripwire()
+        tripwire.armed = True
+        arrays['state'] = np.array([tripwire], dtype=object)
+        with open(self.cache.entry(key), 'wb') as npz:
+            np.savez(npz, **arrays)
+        self.assertIsNone(self.cache.load(key, PipeFile()))
+        self.assertEqual(UNPICKLED, [])
+        self.assertEqual(self.entries(), [])
+
+    def test_recent_file(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        stat = os.stat(filename)
+        key = self.cache.key(PipeFile(), filename)
+        lines = list(PIPE_LINES)
+        lines[-1] = lines[-1].replace('1', '2')
+        self.assertNotEqual(lines, PIPE_LINES)
+        self.write_file('test.tab', lines)
+        os.utime(filename, (stat.st_atime, stat.st_mtime))
+        self.assertNotEqual(self.cache.key(PipeFile(), filename), key)
+
+    def test_evict(self):
+        filenames = [self.write_file('test{}.tab'.format(i), PIPE_LINES[:-i])
+                     for i in range(1, 4)]
+        PipeFile().read_peaklist(filenames[0], cache=self.cache)
+        size = os.path.getsize(os.path.join(self.cache.directory,
+                                            self.entries()[0]))
+        self.cache.max_size = 2 * size + size // 2
+        first = self.cache.entry(self.cache.key(PipeFile(), filenames[0]))
+        os.utime(first, (0, 0))
+        for filename in filenames[1:]:
+            PipeFile().read_peaklist(filename, cache=self.cache)
+        self.assertEqual(len(self.entries()), 2)
+        self.assertFalse(os.path.exists(first))
+
+    def test_clear(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        PipeFile().read_peaklist(filename, cache=self.cache)
+        self.cache.clear()
+        self.assertEqual(self.entries(), [])
+
+    def test_environment(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        os.environ[CACHE_ENV] = self.cache.directory
+        try:
+            PipeFile().read_peaklist(filename)
+            self.assertEqual(len(self.entries()), 1)
+            self.cache.clear()
+            PipeFile().read_peaklist(filename, cache=False)
+            self.assertEqual(self.entries(), [])
+        finally:
+            del os.environ[CACHE_ENV]
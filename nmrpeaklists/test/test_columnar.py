@@ -0,0 +1,63 @@
+from __future__ import division, absolute_import, print_function
+import unittest as ut
+import numpy as np
+from ..columnar import format_dtype, parse_table, read_columnar
+from ..columns import PipeTemplate
+from ..arrays import ArrayPeakList
+from .test_files import PIPE_LINES
+
+
+NAMES = ('INDEX', 'X_NAME', 'Y_NAME', 'X_PPM', 'Y_PPM', 'VOL')
+FORMATS = ('%4d', '%7s', '%7s', '%7.3f', '%7.3f', '%9.2e')
+
+
+class FormatDtypeTestCase(ut.TestCase):
+    def test_dtype(self):
+        dtype = format_dtype(NAMES, FORMATS)
+        self.assertEqual(dtype.names, NAMES)
+        self.assertEqual(dtype['INDEX'], np.int64)
+        self.assertEqual(dtype['X_NAME'], object)
+        self.assertEqual(dtype['VOL'], np.float64)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, format_dtype, ['A'], ['%4g'])
+
+
+class ParseTableTestCase(ut.TestCase):
+    def setUp(self):
+        self.lines = PIPE_LINES[5:]
+
+    def test_parse(self):
+        commented, data = parse_table(self.lines, NAMES, FORMATS)
+        self.assertEqual(list(commented), [False, True, False, False, False])
+        self.assertEqual(list(data['INDEX']), [1, 2, 3, 4, 5])
+        self.assertEqual(data['Y_NAME'][1], 'L16-N')
+        self.assertEqual(data['X_PPM'][4], 7.9)
+
+    def test_short_row(self):
+        lines = self.lines + ['   6  S20-H   S20-N   8.200\n']
+        self.assertRaises(ValueError, parse_table, lines, NAMES, FORMATS)
+
+
+class ReadColumnarTestCase(ut.TestCase):
+    def test_read(self):
+        resolved = PipeTemplate().resolve_from_header(NAMES, FORMATS)
+        peaklist = read_columnar(PIPE_LINES[5:], 2, NAMES, FORMATS, resolved)
+        self.assertIsInstance(peaklist, ArrayPeakList)
+        self.assertEqual(list(peaklist.peak_array('number')), [1, 2, 3, 4, 5])
+        self.assertEqual(peaklist.spin_array('shift')[2, 1], 109.1)
+        self.assertEqual(peaklist[0][1].name, 'I15-N')
+        self.assertEqual(peaklist[3].VOL, 4.5e5)
+        self.assertIs(type(peaklist[3].VOL), float)
+        self.assertTrue(peaklist[1].commented)
+
+    def test_partial_names(self):
+        lines = ['   6    ??-?  +12-N   7.900 120.800  5.50e+05\n',
+                 '   7    G?-H   G?-N   7.900 120.800  5.50e+05\n',
+                 '   8    G?-H  +12-N   7.900 120.800  5.50e+05\n']
+        resolved = PipeTemplate().resolve_from_header(NAMES, FORMATS)
+        peaklist = read_columnar(lines, 2, NAMES, FORMATS, resolved)
+        self.assertEqual(peaklist[0][0].assignment, (None, None, None))
+        self.assertEqual(peaklist[0][1].assignment, ('+', 12, 'N'))
+        self.assertEqual(peaklist[1][0].assignment, ('G', None, 'H'))
+        self.assertEqual(peaklist[2][1].name, '+12-N')
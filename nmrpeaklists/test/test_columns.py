@@ -4,12 +4,198 @@ from ..columns import (
     Column, IgnoreColumn, PeakAttrColumn, PeakAttrListColumn, SpinAttrColumn,
     Res3LetterColumn, PipeNameColumn, PipeAnchorColumn, SparkyNameColumn,
     ColumnGroup, PeakAttrListGroup, SpinAttrGroup, PipeNameGroup,
-    ColumnTemplate, PipeTemplate, SparkyTemplate, UplTemplate, XeasyTemplate)
+    ColumnTemplate, PipeTemplate, SparkyTemplate, UplTemplate, XeasyTemplate,
+    RowCodec, format_values)
+from ..arrays import ArrayPeakList
 from ..peaklist import PeakList, Peak, Spin
 
 
 class ColumnTestCase(ut.TestCase):
-    pass
+    def test_clone(self):
+        column = PeakAttrListColumn('Z_A1', '%6.4f', 'profile', 1, 4)
+        clone = column.clone(fmt='%7.3f')
+        self.assertIs(type(clone), PeakAttrListColumn)
+        self.assertEqual(clone.fmt, '%7.3f')
+        self.assertEqual(column.fmt, '%6.4f')
+        self.assertEqual((clone.name, clone.attr, clone.index, clone.length),
+                         ('Z_A1', 'profile', 1, 4))
+
+    def test_resolve_copies_columns(self):
+        column = PeakAttrColumn('VOL', '%9.2e', 'volume')
+        template = ColumnTemplate([column, PipeNameColumn(0, 6, 8)])
+        resolved = template.resolve_from_header(['VOL', 'X_NAME'],
+                                                ['%9.2e', '%7s'])
+        self.assertEqual(resolved[0], column)
+        self.assertIsNot(resolved[0], column)
+        resolved[0].fmt = '%9.3e'
+        self.assertEqual(column.fmt, '%9.2e')
+        self.assertNotEqual(resolved[0], column)
+        resolved = template.resolve_from_header(['VOL'], ['%10.3e'])
+        self.assertEqual(resolved[0].fmt, '%10.3e')
+        self.assertEqual(column.fmt, '%9.2e')
+        peaklist = PeakList([Peak(spins=[Spin('L', 103, 'HD22')],
+                                  volume=1.0)])
+        resolved = template.resolve_from_peaklist(peaklist)
+        self.assertEqual(resolved[1].atom_width, 4)
+        self.assertEqual(template[1].atom_width, 8)
+
+
+class ResolutionCacheTestCase(ut.TestCase):
+    names = ('INDEX', 'X_PPM', 'Y_PPM', 'VOL', 'X_NAME', 'Y_NAME')
+    formats = ('%4d', '%7.3f', '%7.3f', '%9.2e', '%7s', '%7s')
+
+    def test_shared(self):
+        resolved, codec = PipeTemplate().compile_header(self.names,
+                                                        self.formats)
+        again, codec_again = PipeTemplate().compile_header(self.names,
+                                                           self.formats)
+        self.assertIs(codec_again, codec)
+        self.assertIsNot(again, resolved)
+        self.assertEqual(again, resolved)
+        self.assertFalse(any(a is b for a, b in zip(again, resolved)))
+        resolved[3].fmt = '%10.3e'
+        again, _ = PipeTemplate().compile_header(self.names, self.formats)
+        self.assertEqual(again[3].fmt, '%9.2e')
+        self.assertEqual(codec.columns[3].fmt, '%9.2e')
+        self.assertEqual(PipeTemplate().resolve_from_header(
+            self.names, self.formats), again)
+        self.assertEqual([column.name for column in resolved],
+                         list(self.names))
+
+    def test_key(self):
+        template = PipeTemplate()
+        resolved, codec = template.compile_header(self.names, self.formats)
+        _, other = template.compile_header(self.names, self.formats, False)
+        self.assertIsNot(other, codec)
+        template.append(PeakAttrColumn('VOL', '%9.2e', 'volume'))
+        changed, other = template.compile_header(self.names, self.formats)
+        self.assertIsNot(other, codec)
+        self.assertEqual(changed[3].attr, 'volume')
+        self.assertEqual(resolved[3].attr, 'VOL')
+
+    def test_columns(self):
+        resolved, codec = PipeTemplate().compile_header(
+            self.names, self.formats, columns=['VOL', 'X_NAME'])
+        self.assertEqual([column is not None for column in resolved],
+                         [False, False, False, True, True, False])
+        self.assertEqual(codec.columns, resolved)
+        self.assertRaises(ValueError, PipeTemplate().compile_header,
+                          self.names, self.formats, columns=['HEIGHT'])
+
+    def test_unhashable(self):
+        column = PeakAttrColumn('VOL', '%9.2e', 'volume')
+        column.extra = []
+        template = ColumnTemplate([column])
+        _, codec = template.compile_header(['VOL'], ['%9.2e'])
+        _, other = template.compile_header(['VOL'], ['%9.2e'])
+        self.assertIsNot(other, codec)
+        self.assertEqual(other.columns[0], column)
+
+
+class FormatValuesTestCase(ut.TestCase):
+    def test_numeric(self):
+        values = [1.23456, -7.5, 1e5, 0.0]
+        for fmt in ['%7.3f', '%-8.2f', '%9.2e', '%4d', '%f']:
+            expected = [fmt % value for value in values]
+            self.assertEqual(format_values(fmt, values), expected)
+
+    def test_strings(self):
+        values = ['a\nb', 'c']
+        expected = ['%4s' % value for value in values]
+        self.assertEqual(format_values('%4s', values), expected)
+
+    def test_empty(self):
+        self.assertEqual(format_values('%4d', []), [])
+
+
+class GetStringsTestCase(ut.TestCase):
+    def setUp(self):
+        self.peaklist = PeakList([
+            Peak(spins=[Spin(name='G5-HA2', shift=4.1),
+                        Spin(name='G5-CA', shift=45.2)],
+                 number=1, volume=1.5e5, profile=[0.5, 0.25]),
+            Peak(spins=[Spin(name='L12-HD11', shift=0.85),
+                        Spin(name='L12-CD1', shift=24.9)],
+                 number=2, volume=-3.5e4, profile=[1.0, 0.75])])
+        self.columns = [
+            IgnoreColumn('name', 'value'),
+            PeakAttrColumn('INDEX', '%4d', 'number'),
+            PeakAttrColumn('VOL', '%9.2e', 'volume'),
+            PeakAttrListColumn('Z_A1', '%6.3f', 'profile', 1),
+            SpinAttrColumn('Y_PPM', '%7.3f', 'shift', 1),
+            SpinAttrColumn('X_atom', '%-4s', 'atom', 0),
+            Res3LetterColumn('X_res', 0),
+            PipeNameColumn(0).update_from_peaklist(self.peaklist),
+            PipeAnchorColumn((0, 1)).update_from_peaklist(self.peaklist)]
+
+    def check(self, peaklist):
+        for column in self.columns:
+            expected = [column.get_string(peak) for peak in peaklist]
+            self.assertEqual(column.get_strings(peaklist), expected)
+
+    def test_peaklist(self):
+        self.check(self.peaklist)
+
+    def test_array_peaklist(self):
+        self.check(ArrayPeakList(self.peaklist))
+
+    def test_missing(self):
+        column = PeakAttrColumn('HEIGHT', '%9.2e', 'height')
+        self.assertRaises(AttributeError, column.get_strings, self.peaklist)
+        peaklist = ArrayPeakList(self.peaklist)
+        self.assertRaises(AttributeError, column.get_strings, peaklist)
+
+
+class RowCodecTestCase(ut.TestCase):
+    def setUp(self):
+        self.columns = [
+            PeakAttrColumn('INDEX', '%4d', 'number'),
+            PipeNameColumn(0),
+            None,
+            SpinAttrColumn('Y_PPM', '%7.3f', 'shift', 1),
+            Res3LetterColumn('Y_res', 1),
+            PeakAttrListColumn('Z_A1', '%6.3f', 'profile', 1, 3),
+            PeakAttrListColumn('Z_A2', '%6.3f', 'profile', 2, 3),
+            IgnoreColumn('Ignore', '100%')]
+        self.codec = ColumnTemplate(self.columns).compile()
+        self.fields = ['7', 'G5-HA2', 'x', '45.200', 'LEU', '0.500', '0.250',
+                       '100%']
+
+    def get_peak(self):
+        return Peak(spins=[Spin(), Spin()])
+
+    def test_parse(self):
+        expected = self.get_peak()
+        for column, string in zip(self.columns, self.fields):
+            if column is not None:
+                column.set_string(expected, string)
+        peak = self.get_peak()
+        self.codec.parse(peak, self.fields)
+        self.assertEqual(peak, expected)
+        self.assertEqual(peak.profile, [None, 0.5, 0.25])
+
+    def test_short_row(self):
+        peak = self.get_peak()
+        self.codec.parse(peak, self.fields[:4])
+        self.assertEqual(peak[1].shift, 45.2)
+        self.assertFalse(hasattr(peak, 'profile'))
+
+    def test_format_rows(self):
+        peaks = [self.get_peak(), self.get_peak()]
+        for peak in peaks:
+            self.codec.parse(peak, self.fields)
+        peaks[1].number = 12
+        columns = [column.update_from_peaklist(peaks)
+                   for column in self.columns if column is not None]
+        codec = ColumnTemplate(columns).compile()
+        expected = ['#' + ' '.join(c.get_string(p) for c in columns) + '\n'
+                    for p in peaks]
+        expected[1] = ' ' + expected[1][1:]
+        self.assertEqual(codec.format_rows(peaks, [True, False]), expected)
+
+    def test_unresolved(self):
+        template = PipeTemplate()
+        self.assertRaises(TypeError, template.compile)
 
 
 class IgnoreTestCase(ut.TestCase):
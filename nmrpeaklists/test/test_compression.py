@@ -0,0 +1,76 @@
+from __future__ import division, absolute_import, print_function
+import os
+import gzip
+import shutil
+import tempfile
+import unittest as ut
+from .. import compression
+from ..compression import open_file, compression_of
+from ..files import PipeFile, CaraSpinsFile
+from ..formats import read_any, sniff_format
+from .test_files import PIPE_LINES
+
+
+class CompressedFileTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'test.tab')
+        with open(self.filename, 'w') as plf:
+            plf.writelines(PIPE_LINES)
+        self.peaklist = PipeFile().read_peaklist(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_round_trip(self, extension, name):
+        filename = self.filename + extension
+        PipeFile().write_peaklist(self.peaklist, filename, chunksize=2)
+        self.assertEqual(compression_of(filename), name)
+        with open(filename, 'rb') as plf:
+            self.assertNotEqual(plf.read(4), b'REMA')
+        self.assertEqual(PipeFile().read_peaklist(filename), self.peaklist)
+        peaks = list(PipeFile().iter_peaklist(filename))
+        self.assertEqual(peaks, list(self.peaklist))
+        self.assertEqual(read_any(filename), self.peaklist)
+
+    def test_gzip(self):
+        self.check_round_trip('.gz', 'gzip')
+
+    def test_bzip2(self):
+        self.check_round_trip('.bz2', 'bzip2')
+
+    @ut.skipIf(compression.lzma is None, 'lzma is not available')
+    def test_xz(self):
+        self.check_round_trip('.xz', 'xz')
+
+    @ut.skipIf(compression.zstd is None, 'zstandard is not available')
+    def test_zstd(self):
+        self.check_round_trip('.zst', 'zstd')
+
+    def test_magic_bytes(self):
+        filename = os.path.join(self.directory, 'archived')
+        with gzip.GzipFile(filename, 'wb') as plf:
+            plf.write(''.join(PIPE_LINES).encode('ascii'))
+        self.assertEqual(compression_of(filename), 'gzip')
+        self.assertEqual(compression_of(filename, 'w'), None)
+        self.assertEqual(sniff_format(filename), 'pipe')
+        self.assertEqual(PipeFile().read_peaklist(filename), self.peaklist)
+
+    def test_uncompressed(self):
+        self.assertEqual(compression_of(self.filename), None)
+        with open_file(self.filename) as plf:
+            self.assertEqual(plf.readlines(), PIPE_LINES)
+
+    def test_extension_fallback(self):
+        filename = os.path.join(self.directory, 'empty.peaks.gz')
+        with open_file(filename, 'w'):
+            pass
+        self.assertEqual(sniff_format(filename), 'xeasy')
+
+    def test_spin_ids(self):
+        filename = os.path.join(self.directory, 'cara.spins.gz')
+        with open_file(filename, 'w') as spins:
+            spins.write('# Spin IDs\n')
+            spins.write('3 I 15 H\n')
+        assignments = CaraSpinsFile().read_file(filename)
+        self.assertEqual(len(assignments), 1)
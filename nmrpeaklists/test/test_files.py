@@ -0,0 +1,363 @@
+from __future__ import division, absolute_import, print_function
+import os
+import shutil
+import tempfile
+import unittest as ut
+from copy import deepcopy
+from ..files import (PipeFile, SparkyFile, UplFile, XeasyFile,
+                     CaraAnchorFile, CaraSpinsFile)
+from ..arrays import ArrayPeakList
+from ..peaklist import PeakList
+
+
+PIPE_LINES = [
+    'REMARK Test peak list\n',
+    '\n',
+    'VARS INDEX X_NAME Y_NAME X_PPM Y_PPM VOL\n',
+    'FORMAT %4d %7s %7s %7.3f %7.3f %9.2e\n',
+    '\n',
+    '   1  I15-H   I15-N   8.100 121.900  1.50e+05\n',
+    '#  2  L16-H   L16-N   7.500 117.300  2.50e+05\n',
+    '   3  G17-H   G17-N   8.300 109.100  3.50e+05\n',
+    '   4  A18-H   A18-N   8.000 123.400  4.50e+05\n',
+    '   5  K19-H   K19-N   7.900 120.800  5.50e+05\n']
+
+SPARKY_LINES = [
+    '      Assignment         w1         w2\n',
+    '\n',
+    '     I15N-H    121.900      8.100\n',
+    '     L16N-H    117.300      7.500\n',
+    '     G17N-H    109.100      8.300\n']
+
+UPL_LINES = [
+    '  15 ILE  H      16 LEU  H      4.50      #peak    1\n',
+    '  16 LEU  HA     17 GLY  H      3.20      #peak    2\n',
+    '  17 GLY  H      18 ALA  HB     5.00      #peak    3\n']
+
+XEASY_LINES = [
+    '# Number of dimensions 2\n',
+    '#CYANAFORMAT hN\n',
+    '#INAME 1 H1\n',
+    '#INAME 2 N15\n',
+    '   1   8.100 121.900 0 U     1.500e+05  0.00e+00 -   0    3    4 0\n',
+    '#  2   7.500 117.300 0 U     2.500e+05  0.00e+00 -   0    7    8 0\n',
+    '   3   8.300 109.100 0 U     3.500e+05  0.00e+00 -   0   11   12 0\n']
+
+
+class StreamingReaderTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, lines):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as plf:
+            plf.writelines(lines)
+        return filename
+
+    def check_format(self, file_type, name, lines):
+        filename = self.write_file(name, lines)
+        expected = file_type().read_peaklist(filename)
+        peaks = list(file_type().iter_peaklist(filename))
+        self.assertEqual(PeakList(peaks=peaks), expected)
+        chunks = list(file_type().iter_peaklist(filename, chunksize=2))
+        self.assertTrue(all(len(chunk) <= 2 for chunk in chunks))
+        self.assertEqual([p for chunk in chunks for p in chunk], peaks)
+
+    def test_pipe(self):
+        self.check_format(PipeFile, 'test.tab', PIPE_LINES)
+
+    def test_sparky(self):
+        self.check_format(SparkyFile, 'test.list', SPARKY_LINES)
+
+    def test_upl(self):
+        self.check_format(UplFile, 'test.upl', UPL_LINES)
+
+    def test_xeasy(self):
+        self.check_format(XeasyFile, 'test.peaks', XEASY_LINES)
+
+    def test_pipe_values(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        peaks = list(PipeFile().iter_peaklist(filename))
+        self.assertEqual([p.number for p in peaks], [1, 2, 3, 4, 5])
+        self.assertEqual([p.commented for p in peaks],
+                         [False, True, False, False, False])
+        self.assertEqual(peaks[2][0].name, 'G17-H')
+        self.assertEqual(peaks[4][1].shift, 120.8)
+
+    def test_xeasy_header(self):
+        filename = self.write_file('test.peaks', XEASY_LINES)
+        xeasy_file = XeasyFile()
+        peaks = list(xeasy_file.iter_peaklist(filename))
+        self.assertEqual(xeasy_file.cyana_format, '#CYANAFORMAT hN\n')
+        self.assertEqual(len(xeasy_file.inames), 2)
+        self.assertEqual([p[1].spin_id for p in peaks], [4, 8, 12])
+
+    def test_bad_chunksize(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        itr = PipeFile().iter_peaklist(filename, chunksize=0)
+        self.assertRaises(ValueError, list, itr)
+
+
+class StreamingWriterTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        filename = os.path.join(self.directory, 'test.tab')
+        with open(filename, 'w') as plf:
+            plf.writelines(PIPE_LINES)
+        self.peaklist = PipeFile().read_peaklist(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_chunks(self):
+        lines = PipeFile().write_peaklist_lines(self.peaklist)
+        chunks = list(PipeFile().iter_peaklist_lines(self.peaklist, 2))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 2, 2, 1])
+        self.assertEqual([l for chunk in chunks for l in chunk], lines)
+
+    def test_stream(self):
+        filename = os.path.join(self.directory, 'out.tab')
+        with open(filename, 'w') as stream:
+            stream.write('REMARK Streamed\n')
+            PipeFile().write_peaklist_stream(self.peaklist, stream, 3)
+        with open(filename, 'r') as stream:
+            written = stream.readlines()
+        lines = PipeFile().write_peaklist_lines(self.peaklist)
+        self.assertEqual(written, ['REMARK Streamed\n'] + lines)
+
+    def test_round_trip(self):
+        filename = os.path.join(self.directory, 'out.tab')
+        PipeFile().write_peaklist(self.peaklist, filename, chunksize=2)
+        self.assertEqual(PipeFile().read_peaklist(filename), self.peaklist)
+
+    def test_failed_write(self):
+        filename = os.path.join(self.directory, 'test.tab')
+        self.assertRaises(AttributeError, PipeFile().write_peaklist,
+                          PeakList(), filename)
+        self.peaklist[3][0].shift = 'bad'
+        self.assertRaises(TypeError, PipeFile().write_peaklist,
+                          self.peaklist, filename, chunksize=2)
+        with open(filename, 'r') as plf:
+            self.assertEqual(plf.readlines(), PIPE_LINES)
+        self.assertEqual(os.listdir(self.directory), ['test.tab'])
+
+    def test_file_mode(self):
+        filename = os.path.join(self.directory, 'test.tab')
+        os.chmod(filename, 0o640)
+        PipeFile().write_peaklist(self.peaklist, filename)
+        self.assertEqual(os.stat(filename).st_mode & 0o777, 0o640)
+
+    def test_view(self):
+        peaklist = XeasyFile().read_peaklist_lines(XEASY_LINES)
+        for peaklist in (peaklist, ArrayPeakList(peaklist)):
+            accepted, rejected = peaklist.split('not commented', ['volume'])
+            rejected.override('volume', 1.0)
+            expected = deepcopy(peaklist).select('commented')
+            for peak in expected:
+                peak.volume = 1.0
+            chunks = list(XeasyFile().iter_peaklist_lines(rejected, 1))
+            lines = [line for chunk in chunks for line in chunk]
+            self.assertEqual(lines, XeasyFile().write_peaklist_lines(expected))
+            self.assertIn(' 1.000e+00 ', lines[-1])
+            self.assertEqual(peaklist[1].volume, 2.5e5)
+            lines = XeasyFile().write_peaklist_lines(accepted[::-1])
+            self.assertEqual(lines, XeasyFile().write_peaklist_lines(
+                PeakList(reversed(peaklist.select('not commented')))))
+
+    def test_uncommented(self):
+        for peak in self.peaklist:
+            del peak.commented
+        lines = PipeFile().write_peaklist_lines(self.peaklist)
+        self.assertFalse(any(line.startswith('#') for line in lines))
+
+
+class ColumnarPipeReaderTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, lines, columnar):
+        filename = os.path.join(self.directory, 'test.tab')
+        with open(filename, 'w') as plf:
+            plf.writelines(lines)
+        return PipeFile(columnar=columnar).read_peaklist(filename)
+
+    def test_columnar(self):
+        peaklist = self.read(PIPE_LINES, True)
+        self.assertIsInstance(peaklist, ArrayPeakList)
+        self.assertEqual(peaklist, self.read(PIPE_LINES, False))
+
+    def test_fallback(self):
+        lines = PIPE_LINES + ['   6  S20-H   S20-N   8.200\n']
+        peaklist = self.read(lines, True)
+        self.assertNotIsInstance(peaklist, ArrayPeakList)
+        self.assertEqual(peaklist, self.read(lines, False))
+
+
+class ProjectionTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'test.tab')
+        with open(self.filename, 'w') as plf:
+            plf.writelines(PIPE_LINES)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same_header(self):
+        pipe_file = PipeFile()
+        expected = pipe_file.read_peaklist(self.filename)
+        pipe_file.read_peaklist(self.filename)
+        columns = list(pipe_file.template)
+        self.assertEqual(pipe_file.read_peaklist(self.filename), expected)
+        self.assertTrue(all(a is b for a, b
+                            in zip(pipe_file.template, columns)))
+        self.assertEqual(PipeFile().read_peaklist(self.filename), expected)
+
+    def test_template_not_shared(self):
+        first = PipeFile()
+        first.read_peaklist(self.filename)
+        first.template[1].fmt = '%9.5f'
+        second = PipeFile()
+        second.read_peaklist(self.filename)
+        self.assertNotEqual(second.template[1].fmt, '%9.5f')
+        self.assertFalse(any(a is b for a, b
+                             in zip(first.template, second.template)))
+        first.read_peaklist(self.filename)
+        self.assertEqual(list(first.template), list(second.template))
+
+    def test_read_schema(self):
+        num_dims, names, formats = PipeFile().read_schema(self.filename)
+        self.assertEqual(num_dims, 2)
+        self.assertEqual(names, ('INDEX', 'X_NAME', 'Y_NAME', 'X_PPM',
+                                 'Y_PPM', 'VOL'))
+        self.assertEqual(formats[-1], '%9.2e')
+
+    def test_columns(self):
+        full = PipeFile().read_peaklist(self.filename)
+        for columnar in (False, True):
+            pipe_file = PipeFile(columnar=columnar)
+            peaklist = pipe_file.read_peaklist(self.filename,
+                                               columns=['VOL', 'X_PPM'])
+            self.assertEqual(len(peaklist), 5)
+            self.assertEqual([peak.VOL for peak in peaklist],
+                             [peak.VOL for peak in full])
+            self.assertEqual([peak[0].shift for peak in peaklist],
+                             [peak[0].shift for peak in full])
+            self.assertFalse(hasattr(peaklist[0][1], 'shift'))
+            self.assertFalse(hasattr(peaklist[0], 'number'))
+            self.assertEqual(peaklist[0][0].atom, None)
+            self.assertTrue(peaklist[1].commented)
+            self.assertEqual([column.name for column in pipe_file.template],
+                             ['X_PPM', 'VOL'])
+
+    def test_iter_columns(self):
+        peaks = list(PipeFile().iter_peaklist(self.filename,
+                                              columns=['X_NAME']))
+        self.assertEqual([peak[0].name for peak in peaks],
+                         ['I15-H', 'L16-H', 'G17-H', 'A18-H', 'K19-H'])
+        self.assertFalse(hasattr(peaks[0], 'VOL'))
+
+    def test_unknown_column(self):
+        self.assertRaises(ValueError, PipeFile().read_peaklist,
+                          self.filename, columns=['HEIGHT'])
+
+
+CARA_ANCHOR_LINES = [
+    '# Number of dimensions 2\n',
+    '#INAME 1 H1\n',
+    '#INAME 2 N15\n',
+    '   1   8.100 121.900 1 U     1.500e+05  0.00e+00 -   0    3    4 0\n',
+    '# H/N I15\n',
+    '#  2   7.500 117.300 1 U     2.500e+05  0.00e+00 -   0    7    8 0\n',
+    '# H/N L16\n',
+    '   3   8.300 109.100 1 U     3.500e+05  0.00e+00 -   0   11   12 0\n',
+    '   4   8.000 123.400 1 U     4.500e+05  0.00e+00 -   0   15   16 0\n',
+    '# H/N 132\n']
+
+
+class CaraAnchorReaderTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'anchor.peaks')
+        with open(self.filename, 'w') as plf:
+            plf.writelines(CARA_ANCHOR_LINES)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_matches_anchor_file(self):
+        # CaraAnchorFile requires an assignment line after every peak, and
+        # no commented peaks
+        with open(self.filename, 'w') as plf:
+            plf.writelines(CARA_ANCHOR_LINES[:5] + CARA_ANCHOR_LINES[8:])
+        expected = XeasyFile().read_peaklist(self.filename)
+        assignments = CaraAnchorFile().read_file(self.filename)
+        expected = assignments.assign_peaklist(expected, warn=False)
+        peaklist = XeasyFile(cara_anchors=True).read_peaklist(self.filename)
+        self.assertEqual(peaklist, expected)
+
+    def test_single_pass(self):
+        peaklist = XeasyFile(cara_anchors=True).read_peaklist(self.filename)
+        self.assertEqual(len(peaklist), 4)
+        self.assertEqual(peaklist[0][1].assignment, ('I', 15, 'N'))
+        self.assertEqual(peaklist[2][0].assignment, (None, None, None))
+        self.assertEqual(peaklist[3][0].assignment, ('+', 132, 'H'))
+        self.assertTrue(peaklist[1].commented)
+
+    def test_streaming(self):
+        reader = XeasyFile(cara_anchors=True)
+        chunks = list(reader.iter_peaklist(self.filename, chunksize=1))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1, 1, 1])
+        self.assertEqual([chunk[0][0].name for chunk in chunks],
+                         ['I15-H', 'L16-H', '??-?', '+132-H'])
+
+
+class SpinIdAssignmentTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        filename = os.path.join(self.directory, 'test.peaks')
+        with open(filename, 'w') as plf:
+            plf.writelines(CARA_ANCHOR_LINES)
+        self.peaklist = XeasyFile().read_peaklist(filename)
+        self.spins = os.path.join(self.directory, 'test.spins')
+        with open(self.spins, 'w') as spins:
+            spins.write('# Spin IDs\n')
+            for spin_id, res_type, res_num, atom in [
+                    (3, 'I', 15, 'H'), (4, 'I', 15, 'N'), (7, 'L', 16, 'H'),
+                    (8, 'L', 16, 'N'), (16, 'G', 132, 'N')]:
+                spins.write('{} {} {} {}\n'.format(spin_id, res_type,
+                                                   res_num, atom))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assigned(self, peaklist):
+        return [[spin.assignment for spin in peak] for peak in peaklist]
+
+    def test_dense_matches_mapping(self):
+        assignments = CaraSpinsFile().read_file(self.spins)
+        expected = assignments.assign_peaklist(deepcopy(self.peaklist),
+                                               warn=False)
+        self.assertEqual(assignments.missing, [11, 12, 15])
+        dense = CaraSpinsFile(dense=True).read_file(self.spins)
+        self.assertEqual(len(dense.arrays.known), 17)
+        peaklist = dense.assign_peaklist(deepcopy(self.peaklist), warn=False)
+        self.assertEqual(self.assigned(peaklist), self.assigned(expected))
+        self.assertEqual(dense.missing, [11, 12, 15])
+        array_peaklist = dense.assign_peaklist(ArrayPeakList(self.peaklist),
+                                               warn=False)
+        self.assertEqual(self.assigned(array_peaklist),
+                         self.assigned(expected))
+        self.assertEqual(array_peaklist[3][0].assignment, (None, None, None))
+        self.assertEqual(array_peaklist[3][1].assignment, ('G', 132, 'N'))
+        self.assertEqual(dense.missing, [11, 12, 15])
+
+    def test_invalid_ids(self):
+        assignments = CaraSpinsFile({'a': ('A', 1, 'H')})
+        self.assertRaises(ValueError, assignments.build_arrays)
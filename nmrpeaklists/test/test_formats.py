@@ -0,0 +1,66 @@
+from __future__ import division, absolute_import, print_function
+import os
+import shutil
+import tempfile
+import unittest as ut
+from ..files import PipeFile, XeasyFile, SparkyFile, UplFile
+from ..formats import (register_format, sniff_format, get_reader, reader_for,
+                       read_any, _REGISTRY)
+from .test_files import PIPE_LINES, SPARKY_LINES, UPL_LINES, XEASY_LINES
+
+
+class FormatRegistryTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.registry = _REGISTRY.copy()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        _REGISTRY.clear()
+        _REGISTRY.update(self.registry)
+
+    def write_file(self, name, lines):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as plf:
+            plf.writelines(lines)
+        return filename
+
+    def test_sniff_contents(self):
+        samples = [('pipe', PIPE_LINES), ('xeasy', XEASY_LINES),
+                   ('sparky', SPARKY_LINES), ('upl', UPL_LINES)]
+        for name, lines in samples:
+            filename = self.write_file('peaks.txt', lines)
+            self.assertEqual(sniff_format(filename), name)
+
+    def test_sniff_extension(self):
+        filename = self.write_file('empty.peaks', [])
+        self.assertEqual(sniff_format(filename), 'xeasy')
+        filename = self.write_file('empty.txt', [])
+        self.assertRaises(ValueError, sniff_format, filename)
+
+    def test_read_any(self):
+        samples = [(PipeFile, PIPE_LINES), (XeasyFile, XEASY_LINES),
+                   (SparkyFile, SPARKY_LINES), (UplFile, UPL_LINES)]
+        for file_type, lines in samples:
+            filename = self.write_file('peaks.txt', lines)
+            self.assertIsInstance(reader_for(filename), file_type)
+            self.assertEqual(read_any(filename),
+                             file_type().read_peaklist(filename))
+
+    def test_get_reader(self):
+        reader = get_reader('pipe', columnar=True)
+        self.assertIsInstance(reader, PipeFile)
+        self.assertTrue(reader.columnar)
+        self.assertRaises(KeyError, get_reader, 'nmrview')
+
+    def test_register(self):
+        register_format('nmrview', 'nmrpeaklists.files:SparkyFile',
+                        lambda text: text.startswith('label dataset'),
+                        ['.xpk'])
+        filename = self.write_file('test.txt', ['label dataset sw sf\n'])
+        self.assertEqual(sniff_format(filename), 'nmrview')
+        self.assertIsInstance(reader_for(filename), SparkyFile)
+        filename = self.write_file('test.xpk', [])
+        self.assertEqual(sniff_format(filename), 'nmrview')
+        register_format('nmrview', UplFile, extensions=['.xpk'])
+        self.assertIsInstance(reader_for(filename), UplFile)
@@ -0,0 +1,39 @@
+from __future__ import division, absolute_import, print_function
+import os
+import sys
+import importlib
+import subprocess
+import unittest as ut
+import nmrpeaklists
+from .test_files import PIPE_LINES, XEASY_LINES
+
+
+class PackageTestCase(ut.TestCase):
+    def test_submodule_names(self):
+        for module, names in nmrpeaklists._SUBMODULE_NAMES.items():
+            submodule = importlib.import_module('nmrpeaklists.' + module)
+            self.assertEqual(sorted(submodule.__all__), sorted(names))
+
+    def test_names(self):
+        for name in nmrpeaklists.__all__:
+            value = getattr(nmrpeaklists, name)
+            module = nmrpeaklists._NAME_MODULES[name]
+            self.assertIs(value, getattr(getattr(nmrpeaklists, module), name))
+        self.assertRaises(AttributeError, getattr, nmrpeaklists, 'missing')
+
+    def test_lazy_numpy(self):
+        # Reading and writing short peak lists does not import NumPy
+        code = '\n'.join([
+            'import sys',
+            'from nmrpeaklists.files import PipeFile, XeasyFile',
+            'for reader, lines in ((PipeFile(), {!r}), (XeasyFile(), {!r})):',
+            '    peaklist = reader.read_peaklist_lines(lines)',
+            '    reader.write_peaklist_lines(peaklist)',
+            'print("numpy" in sys.modules)']).format(PIPE_LINES, XEASY_LINES)
+        root = os.path.dirname(os.path.dirname(nmrpeaklists.__file__))
+        env = dict(os.environ)
+        paths = [root, env.get('PYTHONPATH')]
+        env['PYTHONPATH'] = os.pathsep.join(path for path in paths if path)
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         env=env)
+        self.assertEqual(output.strip(), b'False')
@@ -0,0 +1,434 @@
+from __future__ import division, absolute_import, print_function
+import unittest as ut
+import pickle
+from copy import deepcopy
+from ..peaklist import (
+    Spin, CompactSpin, Peak, CompactPeak, PeakList, PeakListView, ViewPeak,
+    PeakIndex, get_empty_peaklist, intern_assignment, sort_by_assignments)
+from .. import peaklist as peaklist_module
+
+
+class InternAssignmentTestCase(ut.TestCase):
+    def test_same_object(self):
+        first = intern_assignment('D', 54, 'HB3')
+        second = intern_assignment('D', 54, 'HB3')
+        self.assertIs(first, second)
+        self.assertEqual(first, ('D', 54, 'HB3'))
+
+
+class CompactSpinTestCase(ut.TestCase):
+    def setUp(self):
+        self.spin = CompactSpin(res_type='d', res_num='54', atom='hb3',
+                                shift=3.41, spin_id=1012)
+
+    def test_init(self):
+        self.assertEqual(self.spin.assignment, ('D', 54, 'HB3'))
+        self.assertEqual(self.spin.shift, 3.41)
+        self.assertEqual(self.spin.spin_id, 1012)
+
+    def test_assignment_shared(self):
+        other = CompactSpin(res_type='D', res_num=54, atom='HB3')
+        self.assertIs(self.spin.assignment, other.assignment)
+
+    def test_set_assignment(self):
+        self.spin.name = 'L7-HD1'
+        self.assertEqual(self.spin.assignment, ('L', 7, 'HD1'))
+        self.spin.res_name = None
+        self.assertEqual(self.spin.assignment, (None, None, 'HD1'))
+
+    def test_missing_attr(self):
+        self.assertRaises(AttributeError, getattr, self.spin, 'width')
+
+    def test_no_dict_after_set(self):
+        self.spin.name = 'L7-HD1'
+        self.assertEqual(vars(self.spin), {})
+        self.assertNotIn('_changed', self.spin._attrs())
+
+    def test_overflow(self):
+        self.spin._1 = 40
+        self.assertEqual(self.spin._1, 40)
+        self.assertEqual(self.spin._attrs()['_1'], 40)
+
+    def test_equal_to_spin(self):
+        spin = Spin(res_type='D', res_num=54, atom='HB3')
+        self.assertEqual(self.spin, spin)
+
+    def test_deepcopy(self):
+        copy = deepcopy(self.spin)
+        self.assertEqual(copy.assignment, self.spin.assignment)
+        self.assertEqual(copy.shift, 3.41)
+
+    def test_clone(self):
+        self.spin.profile = [1, 2]
+        clone = self.spin.clone()
+        self.assertIs(type(clone), CompactSpin)
+        self.assertIs(clone.assignment, self.spin.assignment)
+        self.assertEqual(clone.spin_id, 1012)
+        self.assertEqual(clone.profile, [1, 2])
+        self.assertIsNot(clone.profile, self.spin.profile)
+
+
+class CompactPeakTestCase(ut.TestCase):
+    def test_attrs(self):
+        peak = CompactPeak(spins=[CompactSpin(), CompactSpin()], volume=1.0)
+        peak.profile = [1, 2]
+        self.assertEqual(peak._attrs(), {'volume': 1.0, 'profile': [1, 2]})
+        self.assertRaises(AttributeError, getattr, peak, 'height')
+
+    def test_pickle(self):
+        peaklist = get_empty_peaklist(2, 2, compact=True)
+        peaklist = pickle.loads(pickle.dumps(peaklist, 2))
+        self.assertIsInstance(peaklist[0][1], CompactSpin)
+        peaklist.anchors
+        peaklist[0][0].name = 'A3-H'
+        peaklist[0][1].name = 'A3-N'
+        self.assertEqual(peaklist.anchors, ((0, 1),))
+
+    def test_no_dict_after_set(self):
+        peak = CompactPeak(spins=[CompactSpin(), CompactSpin()], volume=1.0)
+        peak[0] = CompactSpin(res_type='I', res_num=3, atom='H')
+        peak.sort()
+        self.assertEqual(vars(peak), {})
+        self.assertEqual(peak._attrs(), {'volume': 1.0})
+
+    def test_empty_peaklist(self):
+        peaklist = get_empty_peaklist(2, 3, compact=True)
+        self.assertIsInstance(peaklist[0], CompactPeak)
+        self.assertIsInstance(peaklist[0][2], CompactSpin)
+
+    def test_equal_to_peak(self):
+        peaklist = PeakList([Peak(spins=[Spin(res_type='I', res_num=3,
+                                              atom='H')])])
+        compact = PeakList([CompactPeak(spins=[CompactSpin(
+            res_type='I', res_num=3, atom='H')])])
+        self.assertEqual(peaklist, compact)
+
+
+class CloneTestCase(ut.TestCase):
+    def setUp(self):
+        self.peaklist = PeakList([
+            Peak(spins=[Spin('I', 15, 'H', shift=8.1, profile=[1.0])],
+                 volume=1.5e5, label='a'),
+            CompactPeak(spins=[CompactSpin('L', 16, 'H', shift=7.5)],
+                        volume=2.5e5, commented=True)])
+        self.peaklist.name = 'noesy'
+
+    def test_peak(self):
+        peak = self.peaklist[0]
+        clone = peak.clone()
+        self.assertIs(type(clone), Peak)
+        self.assertEqual(clone._attrs(), peak._attrs())
+        self.assertIsNot(clone[0], peak[0])
+        self.assertEqual(vars(clone[0]), vars(peak[0]))
+        self.assertIsNot(clone[0].profile, peak[0].profile)
+        self.assertIs(clone.label, peak.label)
+        clone = self.peaklist[1].clone()
+        self.assertIs(type(clone), CompactPeak)
+        self.assertTrue(clone.commented)
+        self.assertIs(clone[0].assignment, self.peaklist[1][0].assignment)
+
+    def test_list_attrs(self):
+        selected = self.peaklist.select([True, False])
+        self.assertEqual(selected.name, 'noesy')
+        view = self.peaklist.view()
+        self.assertEqual(view.name, 'noesy')
+        view.name = 'rejected'
+        self.assertEqual(self.peaklist.name, 'noesy')
+        self.assertEqual(view[:1].name, 'rejected')
+        self.assertEqual(view.select([True, False]).name, 'rejected')
+        self.assertEqual(view.clone().name, 'rejected')
+
+    def test_peaklist(self):
+        self.peaklist.anchors
+        clone = self.peaklist.clone()
+        self.assertIs(type(clone), PeakList)
+        self.assertEqual(clone, self.peaklist)
+        self.assertEqual(clone.name, 'noesy')
+        self.assertEqual(clone.dims, 1)
+        clone[0].volume = 1.0
+        clone[1][0].shift = 1.0
+        self.assertEqual(self.peaklist[0].volume, 1.5e5)
+        self.assertEqual(self.peaklist[1][0].shift, 7.5)
+        self.assertEqual(clone.anchors, ())
+
+
+def make_peak(*names):
+    peak = Peak(spins=[Spin() for _ in names])
+    for spin, name in zip(peak, names):
+        spin.name = name
+    return peak
+
+
+class PeakIndexTestCase(ut.TestCase):
+    def setUp(self):
+        self.peaks = PeakList([make_peak('W37-HA', 'W37-CA', 'L87-HD1'),
+                               make_peak('S?-H', 'S?-N', 'D58-C'),
+                               make_peak('I29-HG2', 'I29-CG2', '??-?')])
+
+    def test_contains(self):
+        index = self.peaks.index_by_assignment()
+        self.assertIn(make_peak('L87-HD1', 'W37-HA', 'W37-CA'), index)
+        self.assertNotIn(make_peak('L87-HD2', 'W37-HA', 'W37-CA'), index)
+        self.assertNotIn(make_peak('S12-H', 'S12-N', 'D58-C'), index)
+        self.assertIn(make_peak('S?-H', 'S?-N', 'D58-C'), index)
+
+    def test_matches_peak_eq(self):
+        index = PeakIndex(self.peaks)
+        queries = [make_peak('W37-CA', 'W37-HA', 'L87-HD1'),
+                   make_peak('I29-HG2', 'I29-CG2', 'Y74-HE'),
+                   make_peak('??-?', 'I29-HG2', 'I29-CG2')]
+        for query in queries:
+            self.assertEqual(query in index, query in self.peaks)
+
+    def test_wildcard(self):
+        index = self.peaks.index_by_assignment(wildcard=True)
+        self.assertIn(make_peak('S12-H', 'S12-N', 'D58-C'), index)
+        self.assertIn(make_peak('I29-HG2', 'I29-CG2', 'Y74-HE'), index)
+        self.assertNotIn(make_peak('S12-H', 'S12-N', 'D59-C'), index)
+        self.assertNotIn(make_peak('W37-HA', 'W37-CA', 'L87-HD2'), index)
+
+    def test_values(self):
+        index = PeakIndex()
+        index.add(self.peaks[0], 0)
+        index.add(make_peak('W37-CA', 'L87-HD1', 'W37-HA'), 3)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(sorted(index[self.peaks[0]]), [0, 3])
+        self.assertRaises(KeyError, index.__getitem__, self.peaks[1])
+        self.assertEqual(index.get(self.peaks[1], []), [])
+
+
+class SortByAssignmentsTestCase(ut.TestCase):
+    def setUp(self):
+        self.peaklist = PeakList([
+            make_peak('+12-H', '+12-N', 'L5-HA'),
+            make_peak('L7-HD1', 'L7-CD1', 'A3-H'),
+            make_peak('A3-H', 'A3-N', 'L7-HD1'),
+            make_peak('L7-HA', 'L7-CA', '??-?'),
+            make_peak('L7-H', 'L7-N', 'A3-HB'),
+            make_peak('A3-H', 'A3-N', 'L7-HA')])
+        for i, peak in enumerate(self.peaklist, 1):
+            peak.number = i
+            peak.commented = i in (3, 5)
+
+    def test_sort_key(self):
+        spins = [spin for peak in self.peaklist for spin in peak]
+        for spin1 in spins:
+            for spin2 in spins:
+                self.assertEqual(spin1 < spin2,
+                                 spin1.sort_key < spin2.sort_key)
+
+    def test_sort(self):
+        sort_by_assignments(self.peaklist)
+        numbers = [peak.number for peak in self.peaklist]
+        self.assertEqual(numbers, [6, 3, 5, 4, 2, 1])
+
+    def test_commented_at_end(self):
+        sort_by_assignments(self.peaklist, commented_at_end=True)
+        numbers = [peak.number for peak in self.peaklist]
+        self.assertEqual(numbers, [6, 4, 2, 1, 3, 5])
+
+    def test_order(self):
+        sort_by_assignments(self.peaklist, order=[2, (0, 1)])
+        numbers = [peak.number for peak in self.peaklist]
+        self.assertEqual(numbers, [2, 5, 1, 6, 3, 4])
+
+
+class CachedPropertiesTestCase(ut.TestCase):
+    def setUp(self):
+        self.peaklist = PeakList([make_peak('L7-H', 'L7-N', 'A3-HB'),
+                                  make_peak('A3-H', 'A3-N', 'L7-HA')])
+
+    def test_cached(self):
+        anchors = self.peaklist.anchors
+        self.assertEqual(anchors, ((0, 1),))
+        self.assertIs(self.peaklist.anchors, anchors)
+        self.assertEqual(self.peaklist.dims, 3)
+
+    def test_insert(self):
+        self.peaklist.anchors
+        self.peaklist.append(make_peak('A3-HB', 'L7-HA', 'L7-CA'))
+        self.assertEqual(self.peaklist.anchors, ((0, 1), (1, 2)))
+        del self.peaklist[:2]
+        self.assertEqual(self.peaklist.anchors, ((1, 2),))
+
+    def test_reassign_spin(self):
+        self.peaklist.anchors
+        self.peaklist[0][1].atom = 'CA'
+        self.peaklist[1][1].name = 'A3-CB'
+        self.assertEqual(self.peaklist.anchors, ())
+
+    def test_replace_spins(self):
+        self.peaklist.dims
+        for peak in self.peaklist:
+            del peak[2]
+        self.assertEqual(self.peaklist.dims, 2)
+        self.peaklist[0][1] = Spin(res_type='L', res_num=7, atom='CA')
+        self.peaklist[1][0] = Spin(res_type='L', res_num=7, atom='HA')
+        self.assertEqual(self.peaklist.anchors, ())
+
+
+class ChangedPeaksTestCase(ut.TestCase):
+    def setUp(self):
+        residues = ['A3', 'G5', 'K9', 'T2', 'S4', 'V6', 'I8', 'E10']
+        self.peaklist = PeakList([make_peak('L7-H', 'L7-N', 'A3-HB')] + [
+            make_peak(res + '-H', res + '-N', 'L7-HA') for res in residues])
+        self.peaklist.anchors
+        self.examined = []
+        find_peak_anchors = peaklist_module._find_peak_anchors
+
+        def examine(peak, dims):
+            self.examined.append(peak)
+            return find_peak_anchors(peak, dims)
+
+        peaklist_module._find_peak_anchors = examine
+        self.addCleanup(setattr, peaklist_module, '_find_peak_anchors',
+                        find_peak_anchors)
+
+    def test_unrelated_change(self):
+        key = self.peaklist._cache_key()
+        other = PeakList([make_peak('A3-H', 'A3-N')])
+        other.anchors
+        other[0][1].atom = 'CA'
+        other[0].append(Spin())
+        del self.examined[:]
+        self.assertEqual(self.peaklist._cache_key(), key)
+        self.assertEqual(self.peaklist.anchors, ((0, 1),))
+        self.assertEqual(self.examined, [])
+
+    def test_dims_kept(self):
+        dims = self.peaklist._cache['dims']
+        self.peaklist[2][1].atom = 'CA'
+        self.peaklist[4][0] = Spin()
+        self.assertEqual(self.peaklist.dims, 3)
+        self.assertIs(self.peaklist._cache['dims'], dims)
+        self.peaklist[2].append(Spin())
+        self.assertRaises(AttributeError, getattr, self.peaklist, 'dims')
+
+    def test_shared_peak(self):
+        selected = self.peaklist.select([i == 2 for i in range(9)])
+        selected.anchors
+        selected[0][1].atom = 'CA'
+        self.assertEqual(selected.anchors, ())
+        del self.examined[:]
+        self.assertEqual(self.peaklist.anchors, ((0, 1),))
+        self.assertEqual(self.examined, [self.peaklist[2]])
+
+    def test_copied_peaks(self):
+        for copy in (deepcopy(self.peaklist),
+                     pickle.loads(pickle.dumps(self.peaklist, 2))):
+            key = self.peaklist._cache_key()
+            copy.anchors
+            for peak in copy:
+                peak[1].atom = 'CA'
+            self.assertEqual(copy.anchors, ())
+            self.assertEqual(self.peaklist._cache_key(), key)
+        spin = deepcopy(self.peaklist[0][0])
+        self.assertIsNone(getattr(spin, '_owner', None))
+
+    def test_changed_peaks(self):
+        spin = self.peaklist[1][1]
+        spin.atom = 'CB'
+        self.peaklist[3].sort()
+        self.assertEqual(self.peaklist.anchors, ((0, 1), (1, 2)))
+        self.assertEqual(len(self.examined), 2)
+        self.assertIs(self.examined[0], self.peaklist[1])
+        self.assertIs(self.examined[1], self.peaklist[3])
+        self.assertNotIn('_changed', spin._attrs())
+        self.assertNotIn('_changed', self.peaklist[3]._attrs())
+
+
+class PeakListViewTestCase(ut.TestCase):
+    def setUp(self):
+        self.peaklist = PeakList([make_peak('L7-H', 'L7-N'),
+                                  make_peak('A3-H', 'A3-N'),
+                                  make_peak('G5-H', 'G5-N')])
+        for i, peak in enumerate(self.peaklist):
+            peak.volume = 10.0 ** i
+            peak.commented = False
+
+    def test_shared_peaks(self):
+        view = PeakListView(self.peaklist, [2, 0])
+        self.assertEqual(len(view), 2)
+        self.assertIs(view[0], self.peaklist[2])
+        self.assertIs(view[-1], self.peaklist[0])
+        self.assertEqual(list(view), [self.peaklist[2], self.peaklist[0]])
+        self.assertEqual(view.dims, 2)
+        view[1].volume = 5.0
+        self.assertEqual(self.peaklist[0].volume, 5.0)
+
+    def test_slice_and_select(self):
+        view = self.peaklist.view()
+        sliced = view[1:]
+        self.assertIsInstance(sliced, PeakListView)
+        self.assertIs(sliced.parent, self.peaklist)
+        self.assertEqual(sliced.indices, [1, 2])
+        selected = sliced.select('volume > 50')
+        self.assertEqual(selected.indices, [2])
+        self.assertEqual(PeakListView(sliced, [-1]).indices, [2])
+        self.assertRaises(IndexError, PeakListView, sliced, [2])
+        self.assertRaises(TypeError, PeakListView, sliced, [True, False])
+
+    def test_split(self):
+        accepted, rejected = self.peaklist.split('volume > 5')
+        self.assertEqual(accepted.indices, [1, 2])
+        self.assertEqual(rejected.indices, [0])
+        self.assertRaises(ValueError, self.peaklist.split, [True])
+
+    def test_copy_on_write(self):
+        view = self.peaklist.view('volume < 50', ['volume'])
+        self.assertIsInstance(view[0], ViewPeak)
+        view[0].volume = 2.0
+        view[1].commented = True
+        self.assertEqual([peak.volume for peak in view], [2.0, 10.0])
+        self.assertEqual(self.peaklist[0].volume, 1.0)
+        self.assertTrue(self.peaklist[1].commented)
+        self.assertEqual(view.where('volume < 5').tolist(), [True, False])
+        self.assertEqual(view[1:].indices, [1])
+        self.assertEqual(view[1:][0].volume, 10.0)
+        del view[0].volume
+        self.assertFalse(hasattr(view[0], 'volume'))
+        self.assertTrue(hasattr(self.peaklist[0], 'volume'))
+
+    def test_override(self):
+        view = self.peaklist.view()
+        view.override('commented', True)
+        self.assertTrue(all(peak.commented for peak in view))
+        self.assertFalse(any(peak.commented for peak in self.peaklist))
+        view[0].volume = 3.0
+        self.assertEqual(self.peaklist[0].volume, 3.0)
+        copied = deepcopy(view[0])
+        self.assertIs(type(copied), Peak)
+        self.assertTrue(copied.commented)
+        self.assertEqual(copied, self.peaklist[0])
+        self.assertIsNot(copied[0], self.peaklist[0][0])
+        cloned = view.clone()
+        self.assertIs(type(cloned), PeakList)
+        self.assertEqual(cloned, self.peaklist)
+
+    def test_mutation(self):
+        view = self.peaklist.view(copy_on_write=True)
+        view.override('volume', 0.0)
+        view[2].volume = 7.0
+        view.sort(key=lambda peak: peak[0].res_num)
+        self.assertEqual(view.indices, [1, 2, 0])
+        self.assertEqual([peak.volume for peak in view], [0.0, 7.0, 0.0])
+        del view[0]
+        self.assertEqual(view.indices, [2, 0])
+        self.assertEqual(view[0].volume, 7.0)
+        self.assertEqual(len(self.peaklist), 3)
+        self.assertRaises(TypeError, view.append, make_peak('A3-H', 'A3-N'))
+        self.assertRaises(TypeError, view.__setitem__, 0, self.peaklist[0])
+
+    def test_parent_changes(self):
+        for copy_on_write in (False, True):
+            parent = PeakList(self.peaklist)
+            view = parent.view(copy_on_write=copy_on_write)
+            # Replacements made before the anchors are found
+            peaks = [make_peak('L7-HA', 'L7-CB'), make_peak('A3-HA', 'A3-CB'),
+                     make_peak('G5-HA', 'G5-CB')]
+            self.assertEqual(view.anchors, ((0, 1),))
+            parent[:] = peaks
+            self.assertEqual(parent.anchors, ())
+            self.assertEqual(view.anchors, ())
+            parent[1][0].atom = 'HB'
+            self.assertEqual(view.anchors, ((0, 1),))
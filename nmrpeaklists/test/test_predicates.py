@@ -0,0 +1,184 @@
+from __future__ import division, absolute_import, print_function
+import os
+import shutil
+import tempfile
+import unittest as ut
+import numpy as np
+from ..arrays import ArrayPeakList
+from ..files import PipeFile, XeasyFile
+from ..peaklist import PeakList, Peak, Spin
+from ..predicates import Predicate
+from .test_files import PIPE_LINES, XEASY_LINES
+
+
+NAMES = ['INDEX', 'X_NAME', 'VOL', 'XW']
+FORMATS = ['%4d', '%7s', '%9.2e', '%5.2f']
+ROWS = [(False, ['1', 'I15-H', '1.50e+05', '0.40']),
+        (True, ['2', 'L16-H', '2.50e+03', '2.00']),
+        (False, ['3', 'G17-H', '3.50e+05', '25.00']),
+        (False, ['4', 'A18-H'])]
+
+
+class PredicateTestCase(ut.TestCase):
+    def rows(self, expression):
+        test = Predicate(expression).row_filter(NAMES, FORMATS)
+        return [int(fields[0]) for com, fields in ROWS if test(com, fields)]
+
+    def mask(self, expression):
+        columns = {'INDEX': np.array([1, 2, 3]),
+                   'X_NAME': np.array(['I15-H', 'L16-H', 'G17-H'],
+                                      dtype=object),
+                   'VOL': np.array([1.5e5, 2.5e3, 3.5e5]),
+                   'XW': np.array([0.4, 2.0, 25.0]),
+                   'commented': np.array([False, True, False])}
+        mask = Predicate(expression).mask(columns)
+        return (np.flatnonzero(mask) + 1).tolist()
+
+    def test_compare(self):
+        for evaluate in (self.rows, self.mask):
+            self.assertEqual(evaluate('VOL > 1e4'), [1, 3])
+            self.assertEqual(evaluate('INDEX <= 2'), [1, 2])
+            self.assertEqual(evaluate("X_NAME == 'L16-H'"), [2])
+            self.assertEqual(evaluate('XW != 2'), [1, 3])
+
+    def test_logic(self):
+        for evaluate in (self.rows, self.mask):
+            self.assertEqual(evaluate('XW between 0.5 and 20'), [2])
+            self.assertEqual(evaluate('VOL > 1e4 and not (XW > 20)'), [1])
+            self.assertEqual(evaluate('commented or INDEX == 3'), [2, 3])
+            self.assertEqual(evaluate('not not commented'), [2])
+
+    def test_short_row(self):
+        self.assertEqual(self.rows('not commented'), [1, 3, 4])
+        self.assertEqual(self.rows('not VOL > 1e4'), [2, 4])
+        self.assertEqual(self.rows('VOL'), [1, 2, 3])
+
+    def test_names(self):
+        predicate = Predicate('VOL > 0 and (XW < 2 or not commented)')
+        self.assertEqual(predicate.names, frozenset(['VOL', 'XW']))
+        self.assertEqual(predicate, Predicate(predicate.expression))
+        self.assertRaises(ValueError, predicate.row_filter, ['VOL'], ['%f'])
+
+    def test_invalid(self):
+        for expression in ('', 'VOL >', 'VOL > 1 and', '(VOL > 1',
+                           'VOL between 1', 'VOL > 1 2', 'VOL ~ 1',
+                           "VOL > 'a", '> 1'):
+            self.assertRaises(ValueError, Predicate, expression)
+
+
+class PushdownTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, lines):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as plf:
+            plf.writelines(lines)
+        return filename
+
+    def test_pipe(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        full = PipeFile().read_peaklist(filename)
+        expected = [peak for peak in full
+                    if peak.VOL > 2e5 and not peak.commented]
+        for columnar in (False, True):
+            peaklist = PipeFile(columnar=columnar).read_peaklist(
+                filename, where='VOL > 2e5 and not commented')
+            self.assertEqual(isinstance(peaklist, ArrayPeakList), columnar)
+            self.assertEqual(list(peaklist), expected)
+
+    def test_projected(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        for columnar in (False, True):
+            peaklist = PipeFile(columnar=columnar).read_peaklist(
+                filename, columns=['X_NAME'], where='X_PPM < 8.05')
+            self.assertEqual([peak[0].name for peak in peaklist],
+                             ['L16-H', 'A18-H', 'K19-H'])
+            self.assertFalse(hasattr(peaklist[0][0], 'shift'))
+
+    def test_iter(self):
+        filename = self.write_file('test.peaks', XEASY_LINES)
+        peaks = list(XeasyFile().iter_peaklist(filename, where='commented'))
+        self.assertEqual([peak.number for peak in peaks], [2])
+
+    def test_unknown_column(self):
+        filename = self.write_file('test.tab', PIPE_LINES)
+        for columnar in (False, True):
+            self.assertRaises(ValueError,
+                              PipeFile(columnar=columnar).read_peaklist,
+                              filename, where='HEIGHT > 0')
+
+
+class WhereTestCase(ut.TestCase):
+    def setUp(self):
+        self.peaklist = PeakList([
+            Peak(spins=[Spin('I', 15, 'H', width=1.0),
+                        Spin('I', 15, 'N', width=20.0)],
+                 volume=1.5e5, commented=False),
+            Peak(spins=[Spin('+', 3, 'H', width=0.2),
+                        Spin('+', 3, 'N', width=25.0)],
+                 volume=2.5e3, commented=True),
+            Peak(spins=[Spin('G', 17, 'H', width=2.0), Spin(width=30.0)],
+                 volume=3.5e5, commented=False, extra=4)])
+
+    def where(self, expression):
+        masks = [self.peaklist.where(expression),
+                 ArrayPeakList(self.peaklist).where(expression)]
+        self.assertEqual(masks[0].tolist(), masks[1].tolist())
+        return np.flatnonzero(masks[0]).tolist()
+
+    def test_peak_attributes(self):
+        self.assertEqual(self.where('volume > 1e4'), [0, 2])
+        self.assertEqual(self.where('not commented'), [0, 2])
+        self.assertEqual(self.where('extra == 4'), [2])
+        self.assertEqual(self.where('not extra'), [0, 1])
+
+    def test_spin_attributes(self):
+        self.assertEqual(self.where('width[0] between 0.5 and 2'), [0, 2])
+        self.assertEqual(self.where('all(width > 0.5)'), [0, 2])
+        self.assertEqual(self.where("any(res_type == '+')"), [1])
+        self.assertEqual(self.where("all(res_type != '+')"), [0])
+        self.assertEqual(self.where('any(atom == None)'), [2])
+        self.assertEqual(self.where('res_num[1] != None and volume < 1e6'),
+                         [0, 1])
+        self.assertEqual(self.where('any(height > 1)'), [])
+        self.assertEqual(self.where('all(height == None)'), [0, 1, 2])
+        self.assertEqual(self.where('any(width > 22 and volume > 1e4)'), [2])
+
+    def test_missing_attributes(self):
+        self.assertEqual(self.where('height > 0'), [])
+        self.assertEqual(self.where('height == None'), [0, 1, 2])
+        self.assertEqual(self.where('shift_pts[1] == None'), [0, 1, 2])
+        for peaklist in self.peaklist, ArrayPeakList(self.peaklist):
+            self.assertRaises(ValueError, peaklist.where, 'shift_pts > 0')
+            self.assertRaises(ValueError, peaklist.where, 'R1 > 0')
+            self.assertRaises(ValueError, peaklist.where, 'any(R1 > 0)')
+
+    def test_unindexed(self):
+        self.assertRaises(ValueError, self.peaklist.where, 'width > 0.5')
+        self.assertRaises(ValueError, self.peaklist.where, 'volume[0] > 1')
+        self.assertEqual(PeakList().where('volume > 0').tolist(), [])
+
+    def test_select(self):
+        selected = self.peaklist.select('volume > 1e4')
+        self.assertIs(type(selected), PeakList)
+        self.assertIs(selected[1], self.peaklist[2])
+        mask = self.peaklist.where('volume > 1e4')
+        self.assertEqual(list(self.peaklist.select(~mask)),
+                         [self.peaklist[1]])
+        self.assertRaises(ValueError, self.peaklist.select, [True])
+        array_peaklist = ArrayPeakList(self.peaklist)
+        selected = array_peaklist.select('all(width > 0.5)')
+        self.assertIsInstance(selected, ArrayPeakList)
+        self.assertEqual(list(selected), [self.peaklist[0],
+                                          self.peaklist[2]])
+        self.assertEqual(selected[1].extra, 4)
+        selected[1].extra = 5
+        self.assertEqual(array_peaklist[2].extra, 4)
+
+    def test_file_predicate(self):
+        self.assertRaises(ValueError, Predicate('width[0] > 1').row_filter,
+                          ['width'], ['%f'])
@@ -0,0 +1,184 @@
+from __future__ import division, absolute_import, print_function
+import os
+import shutil
+import tempfile
+import unittest as ut
+import numpy as np
+from ..arrays import ArrayPeakList
+from ..peaklist import PeakList, Peak, Spin
+from ..files import PipeSpectrumHeader
+from ..spectra import PipeSpectrum
+
+
+def pipe_header(sizes, byte_order='<'):
+    """Return a minimal NMRPipe header for real data with sizes in XYZA."""
+    header = np.zeros(512, dtype=byte_order + 'f4')
+    header[2] = 2.345
+    header[9] = len(sizes)
+    header[24:28] = [2, 1, 3, 4]
+    header[106] = 1
+    for loc, size in zip([99, 219, 15, 32], sizes):
+        header[loc] = size
+    # OBS, SW and ORIG for dimensions 2, 1, 3 and 4
+    header[[119, 100, 101]] = [600.0, 6000.0, 2400.0]
+    header[[218, 229, 249]] = [60.0, 1800.0, 6600.0]
+    header[[10, 11, 12]] = [150.0, 4500.0, 15000.0]
+    header[[28, 29, 30]] = [150.0, 4500.0, 15000.0]
+    return header
+
+
+def write_spectrum(filename, data, byte_order='<'):
+    """Write a C order (A, Z, Y, X) array as an NMRPipe spectrum."""
+    with open(filename, 'wb') as ftf:
+        ftf.write(pipe_header(data.shape[::-1], byte_order).tobytes())
+        ftf.write(data.astype(byte_order + 'f4').tobytes())
+
+
+class PipeSpectrumTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        z, y, x = np.mgrid[0:4, 0:5, 0:6]
+        self.data = (100 * z + 10 * y + x).astype(np.float32)
+        self.filename = os.path.join(self.directory, 'test.ft3')
+        write_spectrum(self.filename, self.data)
+        for plane in range(4):
+            name = 'test{:03d}.ft3'.format(plane + 1)
+            write_spectrum(os.path.join(self.directory, name),
+                           self.data[plane])
+        # Plane files carry the header of the full spectrum
+        for plane in range(4):
+            name = os.path.join(self.directory,
+                                'test{:03d}.ft3'.format(plane + 1))
+            with open(name, 'r+b') as ftf:
+                ftf.write(pipe_header((6, 5, 4)).tobytes())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def peaklist(self, points):
+        return PeakList([Peak(spins=[Spin(shift_pts=pts) for pts in peak])
+                         for peak in points])
+
+    def test_monolithic(self):
+        spectrum = PipeSpectrum(self.filename)
+        self.assertEqual(spectrum.dims, 3)
+        self.assertEqual(spectrum.sizes, (6, 5, 4))
+        self.assertIsNone(spectrum.template)
+        self.assertIsInstance(spectrum.data, np.memmap)
+        self.assertEqual(spectrum.values([[5, 4, 3], [0, 1, 2]]).tolist(),
+                         [345.0, 210.0])
+
+    def test_series(self):
+        first = os.path.join(self.directory, 'test001.ft3')
+        spectrum = PipeSpectrum(first)
+        self.assertEqual(spectrum.template,
+                         os.path.join(self.directory, 'test%03d.ft3'))
+        self.assertEqual(spectrum.values([[5, 4, 3], [0, 1, 2]]).tolist(),
+                         [345.0, 210.0])
+        self.assertEqual(sorted(spectrum._planes), [(2,), (3,)])
+        spectrum = PipeSpectrum(os.path.join(self.directory, 'test%03d.ft3'))
+        self.assertEqual(spectrum.plane(1)[2, 3], 123.0)
+
+    def test_nearest(self):
+        spectrum = PipeSpectrum(self.filename)
+        peaklist = self.peaklist([[1.0, 1.0, 1.0], [3.4, 2.6, 4.2],
+                                  [6.4, 1.0, 1.0], [0.2, 1.0, 1.0]])
+        intensities = spectrum.peak_intensities(peaklist)
+        self.assertEqual(intensities[:3].tolist(), [0.0, 322.0, 5.0])
+        self.assertTrue(np.isnan(intensities[3]))
+
+    def test_interpolate(self):
+        spectrum = PipeSpectrum(self.filename)
+        points = [[1.0, 1.0, 1.0], [3.4, 2.6, 3.25], [6.0, 5.0, 4.0]]
+        peaklist = ArrayPeakList(self.peaklist(points))
+        intensities = spectrum.peak_intensities(peaklist, interpolate=True)
+        np.testing.assert_allclose(intensities, [0.0, 243.4, 345.0])
+
+    def test_missing_position(self):
+        spectrum = PipeSpectrum(self.filename)
+        peaklist = self.peaklist([[1.0, 1.0, 1.0]])
+        del peaklist[0][1].shift_pts
+        self.assertTrue(np.isnan(spectrum.peak_intensities(peaklist)[0]))
+
+    def test_wrong_dims(self):
+        spectrum = PipeSpectrum(self.filename)
+        peaklist = self.peaklist([[1.0, 1.0]])
+        self.assertRaises(ValueError, spectrum.peak_intensities, peaklist)
+
+    def test_byte_order(self):
+        filename = os.path.join(self.directory, 'swapped.ft2')
+        write_spectrum(filename, self.data[1], byte_order='>')
+        spectrum = PipeSpectrum(filename)
+        self.assertEqual(spectrum.sizes, (6, 5))
+        self.assertEqual(spectrum.header['Y']['SIZE'], 5)
+        self.assertEqual(spectrum.sample([[2.0, 3.0]]).tolist(), [121.0])
+
+    def test_calc_shift_pts(self):
+        spectrum = PipeSpectrum(self.filename)
+        peaklist = PeakList([Peak(spins=[Spin(shift=4.5), Spin(shift=125.0),
+                                         Spin(shift=110.0)])])
+        spectrum.header.calc_shift_pts(peaklist)
+        np.testing.assert_allclose([spin.shift_pts for spin in peaklist[0]],
+                                   [5.7, 2.5, 4 - 4 / 3])
+
+    def test_not_pipe(self):
+        filename = os.path.join(self.directory, 'bad.ft2')
+        with open(filename, 'wb') as ftf:
+            ftf.write(b'\0' * 4096)
+        self.assertRaises(ValueError, PipeSpectrum, filename)
+
+
+class PipeSpectrumHeaderTestCase(ut.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        filename = os.path.join(self.directory, 'test.ft2')
+        write_spectrum(filename, np.zeros((5, 6)))
+        self.header = PipeSpectrumHeader().read_file(filename)
+        # X window is 4 to 14 ppm and Y window is 110 to 140 ppm
+        self.peaklist = PeakList([
+            Peak(spins=[Spin(shift=4.5), Spin(shift=125.0)]),
+            Peak(spins=[Spin(shift=15.0), Spin(shift=105.0)]),
+            Peak(spins=[Spin(shift=2.5), Spin(shift=150.0)])])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ppm_to_pts(self):
+        pts, folds = self.header.ppm_to_pts([4.5, 15.0, 2.5], 'X')
+        np.testing.assert_allclose(pts, [5.7, 5.4, 0.9])
+        self.assertEqual(folds.tolist(), [0, 1, -1])
+
+    def test_calc_shift_pts(self):
+        peaklist, folds = self.header.calc_shift_pts(self.peaklist, True)
+        self.assertIs(peaklist, self.peaklist)
+        self.assertEqual(folds.tolist(), [[0, 0], [1, -1], [-1, 1]])
+        self.assertAlmostEqual(peaklist[0][1].shift_pts, 2.5)
+        self.assertEqual([peaklist[0][1]._1, peaklist[0][1]._3], [2, 3])
+        array_peaklist = ArrayPeakList(self.peaklist)
+        for spin in array_peaklist[0]:
+            del spin.shift_pts
+        self.header.calc_shift_pts(array_peaklist)
+        self.assertEqual(array_peaklist, self.peaklist)
+
+    def test_round_trip(self):
+        shifts = [[spin.shift for spin in peak] for peak in self.peaklist]
+        for peaklist in (self.peaklist, ArrayPeakList(self.peaklist)):
+            _, folds = self.header.calc_shift_pts(peaklist, True)
+            self.header.calc_shift_ppm(peaklist, folds)
+            np.testing.assert_allclose(
+                [[spin.shift for spin in peak] for peak in peaklist], shifts)
+            self.header.calc_shift_ppm(peaklist)
+            self.assertAlmostEqual(peaklist[1][0].shift, 5.0)
+            self.assertAlmostEqual(peaklist[2][1].shift, 120.0)
+
+    def test_pts_to_hz(self):
+        hz = self.header.pts_to_hz([6.0, 1.0], 'X')
+        np.testing.assert_allclose(hz, [2400.0, 7400.0])
+        np.testing.assert_allclose(self.header.pts_to_ppm(6.0, 'X', 1), 14.0)
+
+    def test_missing_shift(self):
+        del self.peaklist[1][0].shift
+        self.assertRaises(AttributeError, self.header.calc_shift_pts,
+                          self.peaklist)
+        self.assertRaises(AttributeError, self.header.calc_shift_pts,
+                          ArrayPeakList(self.peaklist))
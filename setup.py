@@ -14,5 +14,5 @@ setup(
     license='LICENSE',
     description='',
     long_description=open('README.md').read(),
-    install_requires=[],
+    install_requires=['numpy'],
 )